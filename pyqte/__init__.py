@@ -5,7 +5,17 @@ from .cic import CiCEstimator
 from .mdid import MDiDEstimator
 from .spatt import SpATTEstimator
 from .ddid2 import DDID2Estimator 
+from .joint import JointEstimator
+from .staggered import StaggeredEstimator
 from .helper_functions import compute_ci_qte, compute_panel_qtet, compute_diff_se, plot_qte
+from .timing import configure_timing, add_timing_hook, remove_timing_hook
+from .kernels import configure_kernels
+from .quantreg import quantile_regression_process
+from .formula import design_matrix, clear_design_cache
+from .propensity import propensity_model, clear_propensity_cache
+from .validation import validate_data, DataValidationError
+from .results import EstimationResult
+from .plot import export_plots, save_plot
 
 __all__ = [
     'QTEEstimator',
@@ -15,10 +25,26 @@ __all__ = [
     'MDiDEstimator',
     'SpATTEstimator',
     'DDID2Estimator',  # Incluindo DDID2Estimator
+    'JointEstimator',
+    'StaggeredEstimator',
     'compute_ci_qte',
     'compute_panel_qtet',
     'compute_diff_se',
     'plot_qte',
+    'configure_timing',
+    'add_timing_hook',
+    'remove_timing_hook',
+    'configure_kernels',
+    'quantile_regression_process',
+    'design_matrix',
+    'clear_design_cache',
+    'propensity_model',
+    'clear_propensity_cache',
+    'validate_data',
+    'DataValidationError',
+    'EstimationResult',
+    'export_plots',
+    'save_plot',
 ]
 
 # Metadata
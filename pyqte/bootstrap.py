@@ -0,0 +1,810 @@
+# bootstrap.py
+
+import copy
+import hashlib
+import os
+import time
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from .parallel import SharedMemoryPool
+
+
+BOOT_WEIGHTS = ('multinomial', 'exponential', 'dirichlet')
+
+
+def root_seed(seed=None, rng=None):
+    """
+    Return the root seed of the replicate streams of a fit.
+
+    Parameters:
+    -----------
+    seed : int, optional
+        A fixed seed, returned as is.
+    rng : numpy.random.Generator, optional
+        Without `seed`, the root seed is drawn from `rng`, and otherwise from
+        fresh operating system entropy.
+
+    Returns:
+    --------
+    seed : int
+        The entropy of the `numpy.random.SeedSequence` spawning the streams.
+    """
+    if seed is not None:
+        return np.random.SeedSequence(seed).entropy
+    if rng is not None:
+        return int(rng.integers(0, 2**63))
+    return np.random.SeedSequence().entropy
+
+
+def replicate_rng(seed, index):
+    """
+    The random number generator of one bootstrap replicate.
+
+    Replicate `index` uses the `index`-th child of `SeedSequence(seed)`, i.e.
+    `SeedSequence(seed).spawn(B)[index]` for any B > index. Each stream is
+    statistically independent of the others and only depends on the root
+    seed and the replicate number, never on how replicates are batched or
+    spread over workers.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+
+
+def integer_seeds(seed, size):
+    """
+    Derive 31-bit integer seeds from the first `size` replicate streams.
+
+    Used to seed engines that take one integer per replicate, such as the
+    `seedvec` of R's `ddid2` and `spatt`.
+    """
+    return [int(np.random.SeedSequence(seed, spawn_key=(b,)).generate_state(1)[0] >> 1) for b in range(size)]
+
+
+def _strata_bounds(strata):
+    """Units ordered by stratum, and the range of positions of each unit's stratum."""
+    members = np.argsort(strata, kind='stable')
+    counts = np.bincount(strata)
+    low = np.repeat(np.cumsum(counts) - counts, counts)
+    return members, low, low + np.repeat(counts, counts)
+
+
+def multinomial_weights(rng, n, size, dtype=np.float64, strata=None):
+    """
+    Draw nonparametric bootstrap weights, i.e. resampling frequencies.
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        The random number generator.
+    n : int
+        The number of resampling units.
+    size : int
+        The number of replicates.
+    dtype : numpy.dtype, optional (default=numpy.float64)
+        The type of the weight matrix.
+    strata : numpy.ndarray, optional
+        Integer stratum codes of the units, shape (n,). Every stratum is then
+        resampled separately, keeping its size fixed.
+
+    Returns:
+    --------
+    W : numpy.ndarray
+        A (size, n) matrix whose rows count how often each unit is drawn.
+    """
+    W = np.empty((size, n), dtype=dtype)
+    if strata is None:
+        for b in range(size):
+            W[b] = np.bincount(rng.integers(0, n, n), minlength=n)
+        return W
+    # Every draw picks a position within its own stratum
+    members, low, high = _strata_bounds(strata)
+    for b in range(size):
+        W[b] = np.bincount(members[rng.integers(low, high)], minlength=n)
+    return W
+
+
+def bootstrap_weights(rng, n, size, kind='multinomial', dtype=np.float64, strata=None):
+    """
+    Draw a (size, n) matrix of bootstrap weights.
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        The random number generator.
+    n : int
+        The number of resampling units.
+    size : int
+        The number of replicates.
+    kind : str, optional (default='multinomial')
+        'multinomial' for the nonparametric bootstrap, or 'exponential' and
+        'dirichlet' for the multiplier (Bayesian) bootstrap, which applies
+        i.i.d. Exp(1) weights, respectively their normalization to mean one,
+        to the ECDFs instead of resampling the data.
+    dtype : numpy.dtype, optional (default=numpy.float64)
+        The type of the weight matrix (float32 in low-memory mode).
+    strata : numpy.ndarray, optional
+        Stratum codes for the multinomial weights, see `multinomial_weights`.
+        Multiplier weights are drawn independently per unit either way.
+
+    Returns:
+    --------
+    W : numpy.ndarray
+        The weight matrix, one replicate per row.
+    """
+    if kind == 'multinomial':
+        return multinomial_weights(rng, n, size, dtype, strata)
+    if kind == 'exponential':
+        return rng.standard_exponential((size, n), dtype=dtype)
+    if kind == 'dirichlet':
+        W = rng.standard_exponential((size, n), dtype=dtype)
+        W /= W.mean(axis=1, keepdims=True, dtype=np.float64).astype(dtype)
+        return W
+    raise ValueError(f"`boot_weights` must be one of {BOOT_WEIGHTS}, not '{kind}'.")
+
+
+def replicate_weights(seed, start, size, n, kind='multinomial', dtype=np.float64, strata=None):
+    """
+    Draw the weights of replicates `start` to `start + size - 1` of a fit.
+
+    Every row is drawn from its own stream (see `replicate_rng`), so replicate
+    b gets the same weights whatever batch it is evaluated in.
+
+    Parameters:
+    -----------
+    seed : int
+        The root seed of the fit, see `root_seed`.
+    start : int
+        The number of the first replicate.
+    size : int
+        The number of replicates.
+    n, kind, dtype, strata :
+        As in `bootstrap_weights`.
+
+    Returns:
+    --------
+    W : numpy.ndarray
+        The (size, n) weight matrix.
+    """
+    if kind not in BOOT_WEIGHTS:
+        raise ValueError(f"`boot_weights` must be one of {BOOT_WEIGHTS}, not '{kind}'.")
+    W = np.empty((size, n), dtype=dtype)
+    if kind == 'multinomial' and strata is not None:
+        for row, indices in enumerate(replicate_indices(seed, start, size, n, strata)):
+            W[row] = np.bincount(indices, minlength=n)
+        return W
+    for row in range(size):
+        W[row] = bootstrap_weights(replicate_rng(seed, start + row), n, 1, kind, dtype)[0]
+    return W
+
+
+def count_weights(seed, start, size, counts, kind='multinomial', dtype=np.float64):
+    """
+    Draw the weights of replicates `start` to `start + size - 1` of merged units.
+
+    Category c stands for `counts[c]` interchangeable units. Its weight has
+    the distribution of the sum of its units' weights: the number of draws of
+    its units when resampling all units (multinomial), or a Gamma(counts[c])
+    variable as the sum of i.i.d. Exp(1) weights, normalized to mean one per
+    unit for 'dirichlet'. Each row costs O(len(counts)), whatever the number
+    of units.
+
+    Parameters:
+    -----------
+    seed, start, size, kind, dtype :
+        As in `replicate_weights`.
+    counts : numpy.ndarray
+        The number of units of every category.
+
+    Returns:
+    --------
+    W : numpy.ndarray
+        The (size, len(counts)) weight matrix.
+    """
+    if kind not in BOOT_WEIGHTS:
+        raise ValueError(f"`boot_weights` must be one of {BOOT_WEIGHTS}, not '{kind}'.")
+    n = int(counts.sum())
+    W = np.empty((size, len(counts)), dtype=dtype)
+    for row in range(size):
+        rng = replicate_rng(seed, start + row)
+        if kind == 'multinomial':
+            W[row] = rng.multinomial(n, counts / n)
+        else:
+            gamma = rng.standard_gamma(counts)
+            W[row] = gamma if kind == 'exponential' else gamma * (n / gamma.sum())
+    return W
+
+
+def replicate_indices(seed, start, size, n, strata=None):
+    """
+    Draw the resampled unit indices of replicates `start` to `start + size - 1`.
+
+    These are the draws behind the multinomial weights of `replicate_weights`:
+    the counts of each row's indices equal the weights of the same replicate.
+
+    Returns:
+    --------
+    indices : numpy.ndarray
+        The (size, n) indices of the units drawn by each replicate.
+    """
+    indices = np.empty((size, n), dtype=np.int64)
+    bounds = None if strata is None else _strata_bounds(strata)
+    for row in range(size):
+        rng = replicate_rng(seed, start + row)
+        if bounds is None:
+            indices[row] = rng.integers(0, n, n)
+        else:
+            members, low, high = bounds
+            indices[row] = members[rng.integers(low, high)]
+    return indices
+
+
+def iter_replicates(n, iters=100, batch_size=50, output='weights', boot_weights='multinomial', seed=None,
+                    strata=None, dtype=np.float64):
+    """
+    Lazily generate bootstrap replicates in batches.
+
+    Only one batch exists at a time, so memory stays at O(batch_size * n)
+    however many replicates are drawn. Replicate b comes from the same
+    stream as in `replicate_weights`, so index and weight batches of one seed
+    describe the same resamples.
+
+    Parameters:
+    -----------
+    n : int
+        The number of resampling units.
+    iters : int, optional (default=100)
+        The number of replicates.
+    batch_size : int, optional (default=50)
+        The number of replicates per batch.
+    output : str, optional (default='weights')
+        'weights' for (batch, n) frequency (or multiplier) weights, or
+        'indices' for (batch, n) resampled unit indices (multinomial only).
+    boot_weights, strata, dtype :
+        As in `bootstrap_weights`.
+    seed : int, optional
+        The root seed, see `root_seed`.
+
+    Yields:
+    -------
+    batch : numpy.ndarray
+        The replicates of the next batch, one per row.
+    """
+    if output not in ('weights', 'indices'):
+        raise ValueError(f"`output` must be 'weights' or 'indices', not '{output}'.")
+    if output == 'indices' and boot_weights != 'multinomial':
+        raise ValueError("Index output requires multinomial bootstrap weights.")
+    seed = root_seed(seed)
+    for start in range(0, iters, batch_size):
+        size = min(batch_size, iters - start)
+        if output == 'indices':
+            yield replicate_indices(seed, start, size, n, strata)
+        else:
+            yield replicate_weights(seed, start, size, n, boot_weights, dtype, strata)
+
+
+def uniform_band(estimate, draws, alp=0.05):
+    """
+    Compute a sup-t uniform confidence band over the quantile grid.
+
+    Parameters:
+    -----------
+    estimate : numpy.ndarray
+        The point estimates, shape (k,).
+    draws : numpy.ndarray
+        The bootstrap estimates, shape (B, k).
+    alp : float, optional (default=0.05)
+        The band covers the whole curve with probability 1 - alp.
+
+    Returns:
+    --------
+    lower, upper : numpy.ndarray
+        The band around the estimates.
+    crit : float
+        The critical value applied to the quantile-wise standard errors.
+    """
+    std_err = np.nanstd(draws, axis=0, ddof=1)
+    # Quantiles without bootstrap variation (e.g. mass points) do not enter the sup
+    scale = np.where(std_err > 0, std_err, np.inf)
+    t_max = np.nanmax(np.abs(draws - estimate) / scale, axis=1)
+    crit = float(np.nanquantile(t_max, 1 - alp))
+    return estimate - crit * std_err, estimate + crit * std_err, crit
+
+
+def _summarize(draws, alp):
+    se = np.nanstd(draws, axis=0, ddof=1)
+    ends = np.nanquantile(draws, [alp / 2, 1 - alp / 2], axis=0)
+    return se, ends
+
+
+def _converged(previous, current, tol):
+    """Relative change of the SEs and CI endpoints between two checks."""
+    se_prev, ends_prev = previous
+    se, ends = current
+    scale = np.where(se > 0, se, 1.0)
+    change = max(np.nanmax(np.abs(se - se_prev) / scale),
+                 np.nanmax(np.abs(ends - ends_prev) / scale))
+    return change <= tol
+
+
+class _DrawStore:
+    """The bootstrap draws of a run, held in memory or streamed to a memory-mapped .npy file."""
+
+    def __init__(self, iters, path=None):
+        self.iters = iters
+        self.path = path
+        self.batches = []
+        self.array = None
+        # Row offsets of the batches
+        self.ends = [0]
+
+    def append(self, batch):
+        if self.path is None:
+            self.batches.append(batch)
+        else:
+            if self.array is None:
+                self.array = np.lib.format.open_memmap(self.path, mode='w+', dtype=np.float64,
+                                                       shape=(self.iters, batch.shape[1]))
+            self.array[self.ends[-1]:self.ends[-1] + len(batch)] = batch
+        self.ends.append(self.ends[-1] + len(batch))
+
+    def count(self):
+        return len(self.ends) - 1
+
+    def head(self, batches):
+        """The draws of the first `batches` batches."""
+        if self.path is None:
+            return np.vstack(self.batches[:batches])
+        return self.array[:self.ends[batches]]
+
+    def finish(self, batches):
+        """Keep the first `batches` batches and return their draws."""
+        if self.path is None:
+            return np.vstack(self.batches[:batches])
+        rows = self.ends[batches]
+        self.array.flush()
+        array, self.array = self.array, None
+        if rows < self.iters:
+            # An adaptive run stopped early: copy the rows used to a file of the right shape
+            np.save(self.path + '.tmp.npy', array[:rows])
+            del array
+            os.replace(self.path + '.tmp.npy', self.path)
+        else:
+            del array
+        return load_draws(self.path)
+
+
+def load_draws(path):
+    """
+    Open bootstrap draws written with `draws_path`, without reading them into memory.
+
+    Parameters:
+    -----------
+    path : str
+        The .npy file, whose header records the dtype and (iters, k) shape.
+
+    Returns:
+    --------
+    draws : numpy.memmap
+        The read-only (iters, k) bootstrap estimates.
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def draws_digest(draws, seed):
+    """A fingerprint of the draws of a fit: its root seed, their shape and their first and last replicates."""
+    digest = hashlib.blake2b(repr((int(seed), draws.shape, str(draws.dtype))).encode(), digest_size=16)
+    if len(draws):
+        digest.update(np.ascontiguousarray(draws[0]).tobytes())
+        digest.update(np.ascontiguousarray(draws[-1]).tobytes())
+    return digest.hexdigest()
+
+
+def replicate_chunk(problem, seed, start, size, kind='multinomial'):
+    """
+    Evaluate the bootstrap replicates `start` to `start + size - 1` of a problem.
+
+    Parameters:
+    -----------
+    problem : pyqte.native.NativeProblem
+        Any object with a `statistic(W)` method, a number of units `n`, and
+        the `dtype` and `strata` of its weights.
+    seed : int
+        The root seed of the replicate streams, see `replicate_weights`.
+    start : int
+        The number of the first replicate of the chunk.
+    size : int
+        The number of replicates in the chunk.
+    kind : str, optional (default='multinomial')
+        The kind of bootstrap weights, see `bootstrap_weights`.
+
+    Returns:
+    --------
+    draws : numpy.ndarray
+        The (size, k) bootstrap estimates.
+    """
+    if problem.counts is not None:
+        return problem.statistic(count_weights(seed, start, size, problem.counts, kind, problem.dtype))
+    return problem.statistic(replicate_weights(seed, start, size, problem.n, kind, problem.dtype, problem.strata))
+
+
+def bootstrap_draws(problem, iters=100, batch_size=50, rng=None, adaptive=False, tol=0.01, alp=0.05,
+                    n_jobs=1, boot_weights='multinomial', seed=None, timer=None, draws_path=None):
+    """
+    Evaluate a statistic on bootstrap replicates, drawn in batches.
+
+    Replicate b is drawn from its own stream spawned from `seed` (see
+    `replicate_rng`), so the draws are bit-identical whatever `batch_size`
+    and `n_jobs`. Only the stopping points of the adaptive mode, which are
+    checked after every batch, depend on `batch_size`.
+
+    Parameters:
+    -----------
+    problem : pyqte.native.NativeProblem
+        Any object with a `statistic(W)` method mapping a (B, n) matrix of unit
+        weights to a (B, k) array of estimates, and a number of units `n`.
+    iters : int, optional (default=100)
+        The number of replicates, or the maximum number when `adaptive` is True.
+    batch_size : int, optional (default=50)
+        The number of replicates drawn at once. This bounds the weight matrix
+        held in memory to `batch_size * n` entries.
+    rng : numpy.random.Generator, optional
+        The random number generator drawing the root seed when `seed` is None.
+    adaptive : bool, optional (default=False)
+        Stop once the quantile-wise SEs and percentile CI endpoints change by
+        less than `tol` standard errors between two consecutive checks.
+    tol : float, optional (default=0.01)
+        The convergence tolerance of the adaptive mode.
+    alp : float, optional (default=0.05)
+        The significance level of the monitored CI endpoints.
+    n_jobs : int, optional (default=1)
+        The number of worker processes. With more than one, the problem's arrays
+        are placed in shared memory and the batches are evaluated in parallel.
+    boot_weights : str, optional (default='multinomial')
+        The kind of bootstrap weights, see `bootstrap_weights`.
+    seed : int, optional
+        The root seed of the replicate streams, e.g. `info['boot_seed']` of an
+        earlier fit to replay its replicates. See `root_seed` for the default.
+    timer : FitTimer, optional
+        Timer recording the replicates under the 'bootstrap' phase.
+    draws_path : str, optional
+        Write every batch to this .npy file as soon as it is evaluated,
+        through a memory map, instead of keeping the batches in memory.
+
+    Returns:
+    --------
+    draws : numpy.ndarray
+        The (iters_used, k) bootstrap estimates, as a read-only memory map
+        of `draws_path` when given.
+    converged : bool or None
+        Whether the adaptive mode met the tolerance (None when not adaptive).
+    """
+    if boot_weights not in BOOT_WEIGHTS:
+        raise ValueError(f"`boot_weights` must be one of {BOOT_WEIGHTS}, not '{boot_weights}'.")
+    # No batch would be evaluated, leaving no draws (nor `draws_path` file) to return
+    if iters < 1:
+        raise ValueError(f"`iters` must be at least 1, not {iters}.")
+    seed = root_seed(seed, rng)
+    tasks = [(seed, start, min(batch_size, iters - start), boot_weights) for start in range(0, iters, batch_size)]
+
+    store = _DrawStore(iters, draws_path)
+    used = None
+    previous = None
+    converged = False if adaptive else None
+    wave = max(1, n_jobs)
+
+    with SharedMemoryPool(problem, n_jobs) if n_jobs > 1 else nullcontext() as pool:
+        for start in range(0, len(tasks), wave):
+            chunk = tasks[start:start + wave]
+            if timer is not None:
+                with timer.phase('bootstrap', rows=problem.n):
+                    results = _evaluate(problem, chunk, pool)
+            else:
+                results = _evaluate(problem, chunk, pool)
+            for batch in results:
+                store.append(batch)
+
+            if adaptive:
+                # Check after every batch of the wave, so the stopping point does not depend on n_jobs
+                for end in range(store.count() - len(chunk) + 1, store.count() + 1):
+                    current = _summarize(store.head(end), alp)
+                    if previous is not None and _converged(previous, current, tol):
+                        converged = True
+                        used = end
+                        break
+                    previous = current
+                if converged:
+                    break
+
+    return store.finish(store.count() if used is None else used), converged
+
+
+def _evaluate(problem, tasks, pool):
+    if pool is None:
+        return [replicate_chunk(problem, *task) for task in tasks]
+    return pool.map(tasks)
+
+
+def precision_report(problem, estimate, size=10, boot_weights='multinomial', seed=0):
+    """
+    Measure the effect of the low-memory representation on the estimates.
+
+    The point estimate and a few replicates are recomputed with float64 weights
+    on the same compact problem (collapsing tied outcomes and int32 indices are
+    exact, so this isolates the float32 weights). The replicates use their own
+    `seed`, leaving the random stream of the bootstrap untouched.
+
+    Returns:
+    --------
+    report : dict
+        The weight type, and the largest absolute differences of the point
+        estimate and of the replicates with respect to float64.
+    """
+    reference = copy.copy(problem)
+    reference.dtype = np.float64
+    W = bootstrap_weights(np.random.default_rng(seed), problem.n, size, boot_weights, problem.dtype, problem.strata)
+    return {
+        'dtype': np.dtype(problem.dtype).name,
+        'estimate_max_abs_diff': float(np.nanmax(np.abs(estimate - reference.estimate()))),
+        'replicate_max_abs_diff': float(np.nanmax(np.abs(problem.statistic(W)
+                                                         - reference.statistic(W.astype(np.float64)))))
+    }
+
+
+def binning_report(problem, estimate):
+    """
+    Compare the point estimate of a binned problem with the exact one.
+
+    Returns:
+    --------
+    report : dict
+        The number of bins requested and of resampling categories, the largest
+        share of a cell in a bin holding several values (the largest ECDF
+        error), the largest error bound of `BinnedProblem.error_bounds` and
+        the largest actual difference from the exact point estimate.
+    """
+    cells = [getattr(problem, name) for name in problem.names]
+    return {
+        'bins': problem.bins,
+        'categories': problem.n,
+        'max_bin_share': max(cell.max_share() for cell in cells),
+        'error_bound': float(np.nanmax(problem.error_bounds())),
+        'estimate_max_abs_diff': float(np.nanmax(np.abs(estimate - problem.reference))),
+    }
+
+
+def binning_accuracy(problem, bins=(100, 1000, 10000), iters=100, boot_weights='multinomial', seed=0):
+    """
+    Check binned approximations of a problem against its exact results.
+
+    The exact problem and its binned versions are bootstrapped with the same
+    number of replicates, e.g. on a subsample of a dataset too large for the
+    exact bootstrap, to choose the number of bins.
+
+    Parameters:
+    -----------
+    problem : pyqte.native.NativeProblem
+        An exact problem, e.g. `build_problem('cic', ...)`.
+    bins : tuple of int, optional (default=(100, 1000, 10000))
+        The numbers of bins to check.
+    iters, boot_weights, seed :
+        As in `bootstrap_draws`.
+
+    Returns:
+    --------
+    report : pandas.DataFrame
+        One row per number of bins: the `binning_report` entries, the largest
+        relative difference of the bootstrap standard errors from the exact
+        ones, the bootstrap times of both, and `se_mc_error`, the typical
+        relative difference of the standard errors of two independent
+        bootstraps of `iters` replicates, as a yardstick for `se_max_rel_diff`.
+    """
+    from .native import BinnedProblem
+
+    start = time.perf_counter()
+    exact, _ = bootstrap_draws(problem, iters=iters, boot_weights=boot_weights, seed=seed)
+    exact_s = time.perf_counter() - start
+    exact_se = np.nanstd(exact, axis=0, ddof=1)
+    rows = []
+    for size in bins:
+        binned = BinnedProblem(problem, size)
+        row = binning_report(binned, binned.estimate())
+        start = time.perf_counter()
+        draws, _ = bootstrap_draws(binned, iters=iters, boot_weights=boot_weights, seed=seed)
+        row['binned_s'] = time.perf_counter() - start
+        row['exact_s'] = exact_s
+        with np.errstate(invalid='ignore', divide='ignore'):
+            row['se_max_rel_diff'] = float(np.nanmax(np.abs(np.nanstd(draws, axis=0, ddof=1) / exact_se - 1)))
+        row['se_mc_error'] = 1 / np.sqrt(iters - 1)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def budget_batch_size(problem, batch_size, memory_budget_mb, n_jobs=1):
+    """Largest batch size, up to `batch_size`, whose replicates fit in the memory budget."""
+    if memory_budget_mb is None:
+        return batch_size
+    per_batch = max(1, n_jobs) * problem.replicate_nbytes()
+    return max(1, min(batch_size, int(memory_budget_mb * 2**20 // per_batch)))
+
+
+def fit_native(problem, se=True, iters=100, alp=0.05, adaptive=False, adaptive_tol=0.01, batch_size=50,
+               n_jobs=1, boot_weights='multinomial', uniform=False, se_method='bootstrap', memory_budget_mb=None,
+               seed=None, rng=None, timer=None, draws_path=None):
+    """
+    Estimate a native problem and, if requested, its standard errors.
+
+    Parameters:
+    -----------
+    problem : pyqte.native.NativeProblem
+        The prepared estimator.
+    se, iters, alp :
+        As in the estimator classes.
+    adaptive, adaptive_tol, batch_size, n_jobs, boot_weights, seed, rng, timer, draws_path :
+        Passed to `bootstrap_draws`.
+    uniform : bool, optional (default=False)
+        Also compute a sup-t uniform confidence band over `probs`.
+    se_method : str, optional (default='bootstrap')
+        'bootstrap', or 'analytic' for the problem's asymptotic standard errors
+        (no replicates are drawn, and 'iters' is 0).
+    memory_budget_mb : float, optional
+        Cap `batch_size` so that the replicates held at once (over all workers)
+        fit in this many megabytes. The batch size used is stored in 'batch_size'.
+
+    Returns:
+    --------
+    info : dict
+        The estimates under the keys used by the estimators ('qte', 'probs',
+        'qte.se', 'qte.lower', 'qte.upper'), plus the number of bootstrap
+        iterations actually used ('iters') and the adaptive convergence flag.
+        With `uniform`, the band is stored under 'qte.band.lower',
+        'qte.band.upper' and its critical value under 'band.crit'. A compact
+        (low-memory) problem adds a 'precision' report, see `precision_report`,
+        and a binned problem a 'binning' report, see `binning_report`.
+        A grouped problem stores its group labels under 'groups', and its
+        estimates are laid out group by group.
+        The root seed of the replicate streams is stored in 'boot_seed', so
+        that `requery_native` and `replay_draws` can replay the replicates,
+        and the file of the draws in 'draws_path' when given, with their
+        fingerprint in 'draws_digest' (see `draws_digest`).
+    """
+    if timer is not None:
+        with timer.phase('estimate', rows=problem.n):
+            estimate = problem.estimate()
+    else:
+        estimate = problem.estimate()
+
+    info = _point_info(problem, estimate)
+    if getattr(problem, 'reference', None) is not None:
+        info['binning'] = binning_report(problem, estimate)
+    if problem.dtype != np.float64:
+        info['precision'] = precision_report(problem, estimate, min(10, batch_size), boot_weights)
+    if not se:
+        return info
+
+    if se_method == 'analytic':
+        if timer is not None:
+            with timer.phase('analytic_se', rows=problem.n):
+                std_err = problem.analytic_se()
+        else:
+            std_err = problem.analytic_se()
+        _add_intervals(info, estimate, std_err, alp)
+        info.update({'iters': 0, 'converged': None})
+        return info
+
+    batch_size = budget_batch_size(problem, batch_size, memory_budget_mb, n_jobs)
+    seed = root_seed(seed, rng)
+    draws, converged = bootstrap_draws(problem, iters=iters, batch_size=batch_size, adaptive=adaptive,
+                                       tol=adaptive_tol, alp=alp, n_jobs=n_jobs, boot_weights=boot_weights,
+                                       seed=seed, timer=timer, draws_path=draws_path)
+    info.update({'batch_size': batch_size, 'boot_seed': seed})
+    if draws_path is not None:
+        info.update({'draws_path': draws_path, 'draws_digest': draws_digest(draws, seed)})
+    _add_bootstrap_intervals(info, estimate, draws, alp, uniform)
+    info['converged'] = converged
+    return info
+
+
+def requery_native(problem, info, probs, alp=0.05, n_jobs=1, boot_weights='multinomial', uniform=False,
+                   se_method='bootstrap'):
+    """
+    Re-evaluate a native fit at new quantiles without refitting.
+
+    The problem keeps the sorted samples of the fit and `info` the root seed of
+    its bootstrap replicates, so the point estimates only invert the ECDFs at `probs`
+    and the replicates are replayed from the same weights. The result equals
+    a fit at `probs` with the same random stream.
+
+    Parameters:
+    -----------
+    problem : pyqte.native.NativeProblem
+        The problem passed to `fit_native`.
+    info : dict
+        The results of `fit_native`.
+    probs : array-like
+        The new quantiles.
+    alp, n_jobs, boot_weights, uniform, se_method :
+        As passed to `fit_native`.
+
+    Returns:
+    --------
+    info : dict
+        The keys of `fit_native`, evaluated at `probs`.
+    """
+    problem = copy.copy(problem)
+    problem.probs = np.asarray(probs, dtype=float)
+    estimate = problem.estimate()
+    requeried = _point_info(problem, estimate)
+    if info.get('qte.se') is None:
+        return requeried
+
+    if se_method == 'analytic':
+        _add_intervals(requeried, estimate, problem.analytic_se(), alp)
+        requeried.update({'iters': 0, 'converged': None})
+        return requeried
+
+    # The stored draws belong to the original quantiles, so the replicates are replayed
+    replayed = {key: value for key, value in info.items() if key != 'draws_path'}
+    draws = replay_draws(problem, replayed, n_jobs, boot_weights)
+    requeried.update({'batch_size': info['batch_size'], 'boot_seed': info['boot_seed']})
+    _add_bootstrap_intervals(requeried, estimate, draws, alp, uniform)
+    requeried['converged'] = info['converged']
+    return requeried
+
+
+def replay_draws(problem, info, n_jobs=1, boot_weights='multinomial'):
+    """
+    Recompute the bootstrap replicates of a native fit from its root seed.
+
+    The draws of a fit with `draws_path` are read from its file instead, as
+    long as it still holds them: a file missing or overwritten by another
+    fit (whose fingerprint differs from 'draws_digest') is ignored.
+
+    Parameters:
+    -----------
+    problem : pyqte.native.NativeProblem
+        The problem passed to `fit_native`.
+    info : dict
+        The results of `fit_native`, with bootstrap standard errors.
+    n_jobs, boot_weights :
+        As passed to `fit_native`.
+
+    Returns:
+    --------
+    draws : numpy.ndarray
+        The (iters, k) bootstrap estimates of the fit.
+    """
+    if problem is None or 'boot_seed' not in info:
+        raise ValueError("Bootstrap draws are only available for native fits with bootstrap standard errors.")
+    if info.get('draws_path') is not None and os.path.exists(info['draws_path']):
+        try:
+            draws = load_draws(info['draws_path'])
+        except (OSError, ValueError):
+            draws = None
+        # The file may have been overwritten by another fit since
+        if draws is not None and draws_digest(draws, info['boot_seed']) == info.get('draws_digest'):
+            return draws
+    draws, _ = bootstrap_draws(problem, iters=info['iters'], batch_size=info['batch_size'], n_jobs=n_jobs,
+                               boot_weights=boot_weights, seed=info['boot_seed'])
+    return draws
+
+
+def _point_info(problem, estimate):
+    info = {'qte': estimate, 'probs': problem.probs, 'qte.se': None, 'qte.lower': None, 'qte.upper': None}
+    if problem.labels is not None:
+        info['groups'] = problem.labels
+    return info
+
+
+def _add_intervals(info, estimate, std_err, alp):
+    z = norm.ppf(1 - alp / 2)
+    info.update({'qte.se': std_err, 'qte.lower': estimate - z * std_err, 'qte.upper': estimate + z * std_err})
+
+
+def _add_bootstrap_intervals(info, estimate, draws, alp, uniform):
+    _add_intervals(info, estimate, np.nanstd(draws, axis=0, ddof=1), alp)
+    info['iters'] = len(draws)
+    if uniform:
+        lower, upper, crit = uniform_band(estimate, draws, alp)
+        info.update({'qte.band.lower': lower, 'qte.band.upper': upper, 'band.crit': crit})
@@ -1,3 +1,4 @@
+import copy
 import pandas as pd
 import numpy as np
 import rpy2.robjects as ro
@@ -6,6 +7,13 @@ from rpy2.robjects.packages import importr
 from rpy2.robjects import Formula
 from rpy2.robjects.conversion import localconverter
 import matplotlib.pyplot as plt
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine, grouped_results
+from .bootstrap import fit_native, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
 
 # Activate the automatic conversion of pandas DataFrames to R data.frames
 pandas2ri.activate()
@@ -14,7 +22,11 @@ pandas2ri.activate()
 qte = importr('qte')
 
 class CiCEstimator:
-    def __init__(self, formula, data, t, tmin1, tname, idname=None, xformla=None, probs=[0.05, 0.95, 0.05], se=True, iters=100, alp=0.05, panel=False, pl=False, cores=2, retEachIter=False):
+    def __init__(self, formula, data, t, tmin1, tname, idname=None, xformla=None, probs=[0.05, 0.95, 0.05], se=True, iters=100, alp=0.05, panel=False, pl=False, cores=2, retEachIter=False,
+                 engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False,
+                 low_memory=False, memory_budget_mb=None, by=None, seed=None, draws_path=None,
+                 bins=None):
         self.formula = formula
         self.data = data
         self.t = t
@@ -36,11 +48,54 @@ class CiCEstimator:
         self.pl = pl
         self.cores = cores
         self.retEachIter = retEachIter
+        check_engine(engine, adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, by=by, draws_path=draws_path, bins=bins)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.bins = bins
+        self.by = by
+        self.uniform = uniform
         self.info = {}
+        self._problem = None
 
     def fit(self):
-        with localconverter(ro.default_converter + pandas2ri.converter):
-            r_data = ro.conversion.py2rpy(self.data)
+        timer = FitTimer('CiCEstimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('cic', self.data, self.formula, xformla=self.xformla, t=self.t, tmin1=self.tmin1,
+                          tname=self.tname, idname=self.idname, panel=self.panel, by=self.by,
+                          balanced=self.engine == 'r', engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                problem = build_problem('cic', self.data, self.formula, self.probs, xformla=self.xformla,
+                                        t=self.t, tmin1=self.tmin1, tname=self.tname,
+                                        idname=self.idname, panel=self.panel,
+                                        low_memory=self.low_memory, by=self.by, bins=self.bins)
+            self.result = None
+            self._problem = problem
+            self.info = fit_native(problem, se=self.se, iters=self.iters, alp=self.alp,
+                                   adaptive=self.adaptive, adaptive_tol=self.adaptive_tol,
+                                   batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                   boot_weights=self.boot_weights, uniform=self.uniform,
+                                   memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                   draws_path=self.draws_path, timer=timer)
+            self.info['timings'] = timer.finish()
+            return
+
+        with timer.phase('py2rpy', rows=rows):
+            with localconverter(ro.default_converter + pandas2ri.converter):
+                r_data = ro.conversion.py2rpy(self.data)
 
         r_formula = Formula(self.formula)
         additional_args = {}
@@ -54,23 +109,30 @@ class CiCEstimator:
         if self.panel:
             additional_args['panel'] = self.panel
 
-        # Call the CiC function from the 'qte' package in R
-        self.result = qte.CiC(
-            formla=r_formula,
-            t=self.t,
-            tmin1=self.tmin1,
-            tname=self.tname,
-            data=r_data,
-            probs=self.probs,
-            se=self.se,
-            iters=self.iters,
-            alp=self.alp,
-            pl=self.pl,
-            cores=self.cores,
-            retEachIter=self.retEachIter,
-            **additional_args
-        )
-        self._extract_info()
+        if self.seed is not None:
+            set_r_seed(self.seed)
+
+        # Call the CiC function from the 'qte' package in R (bootstrap included)
+        with timer.phase('r_call', rows=rows):
+            self.result = qte.CiC(
+                formla=r_formula,
+                t=self.t,
+                tmin1=self.tmin1,
+                tname=self.tname,
+                data=r_data,
+                probs=self.probs,
+                se=self.se,
+                iters=self.iters,
+                alp=self.alp,
+                pl=self.pl,
+                cores=self.cores,
+                retEachIter=self.retEachIter,
+                **additional_args
+            )
+
+        with timer.phase('extract_info', rows=len(self.probs)):
+            self._extract_info()
+        self.info['timings'] = timer.finish()
 
     def _extract_info(self):
         self.info['qte'] = np.array(self.result.rx2('qte'))
@@ -84,11 +146,27 @@ class CiCEstimator:
             self.info['qte.upper'] = None
 
     def summary(self):
+        if self.engine == 'native':
+            summary = self.get_results()
+            print(summary)
+            return summary
         summary = ro.r.summary(self.result)
         print(summary)
         return summary
 
-    def plot(self):
+    def plot(self, path=None):
+        """
+        Plot the CiC estimates with confidence intervals, if available.
+
+        Parameters:
+        -----------
+        path : str, optional
+            Save the plot to this file (PNG, SVG, PDF, ...) with a
+            non-interactive backend instead of showing it.
+        """
+        if path is not None:
+            return save_plot(self.to_result(), path, name='CiC', title='Changes-in-Changes (CiC) Estimates')
+
         tau = self.info['probs']
         cic = self.info['qte']
 
@@ -119,8 +197,48 @@ class CiCEstimator:
         plt.grid(True)
         plt.show()
 
+    def at(self, probs):
+        """
+        Re-evaluate a native fit at new quantiles without refitting.
+
+        The fit keeps its sorted samples and bootstrap seeds, so this only
+        inverts the ECDFs at `probs` and replays the same replicates.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : CiCEstimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        if self._problem is None:
+            raise ValueError("`at` requires a fit with engine='native'.")
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, alp=self.alp, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('CiCEstimator', self.info, replicates)
+
     def get_results(self):
         """Creates a pandas DataFrame with the estimated results."""
+        if self.by is not None:
+            return grouped_results(self.info, 'QTE')
         df = pd.DataFrame({
             'Quantile': self.info['probs'],
             'QTE': self.info['qte']
@@ -129,5 +247,9 @@ class CiCEstimator:
         if self.se and self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
             df['QTE Lower Bound'] = self.info['qte.lower']
             df['QTE Upper Bound'] = self.info['qte.upper']
-        
+
+        if 'qte.band.lower' in self.info:
+            df['QTE Uniform Lower Bound'] = self.info['qte.band.lower']
+            df['QTE Uniform Upper Bound'] = self.info['qte.band.upper']
+
         return df
@@ -0,0 +1,269 @@
+# cli.py
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+ESTIMATORS = ('QTEEstimator', 'QTETEstimator', 'QDiDEstimator', 'CiCEstimator', 'MDiDEstimator',
+              'PanelQTETEstimator', 'DDID2Estimator', 'SpATTEstimator', 'StaggeredEstimator')
+MANIFEST = 'manifest.jsonl'
+
+_READERS = {'.csv': pd.read_csv, '.parquet': pd.read_parquet, '.feather': pd.read_feather,
+            '.pkl': pd.read_pickle, '.pickle': pd.read_pickle}
+
+# Datasets already loaded by this (worker) process
+_datasets = {}
+
+
+def load_spec(path):
+    """Read a JSON spec file, resolving dataset paths relative to it."""
+    with open(path) as handle:
+        spec = json.load(handle)
+    base = os.path.dirname(os.path.abspath(path))
+    for dataset in spec.get('datasets', {}).values():
+        dataset['path'] = os.path.join(base, dataset['path'])
+    return spec
+
+
+def expand_spec(spec):
+    """
+    Expand the runs of a spec into one job per point of their parameter grids.
+
+    A spec is a dictionary of the form::
+
+        {
+            "datasets": {"lalonde": {"path": "lalonde_psid.csv"}},
+            "runs": [
+                {"name": "qte", "estimator": "QTEEstimator", "dataset": "lalonde",
+                 "params": {"formula": "re78 ~ treat", "se": true, "engine": "native"},
+                 "grid": {"iters": [100, 500], "probs": [[0.1, 0.9, 0.1], [0.25, 0.75, 0.25]]},
+                 "draws": false}
+            ]
+        }
+
+    Dataset entries take a `path` (CSV, Parquet, Feather or pickle) and optional
+    `read_options` for the pandas reader.
+
+    Returns:
+    --------
+    jobs : list of dict
+        The jobs, each with an `id` derived from a hash of its estimator,
+        dataset and parameters, so that the same job keeps the same id
+        across runs.
+    """
+    datasets = spec.get('datasets', {})
+    jobs = []
+    for index, run in enumerate(spec['runs']):
+        if run['estimator'] not in ESTIMATORS:
+            raise ValueError(f"Unknown estimator '{run['estimator']}', expected one of {ESTIMATORS}.")
+        if run['dataset'] not in datasets:
+            raise ValueError(f"Run '{run.get('name', index)}' refers to the undefined dataset "
+                             f"'{run['dataset']}'.")
+        grid = run.get('grid', {})
+        for values in itertools.product(*grid.values()):
+            params = dict(run.get('params', {}), **dict(zip(grid, values)))
+            key = {'estimator': run['estimator'], 'dataset': datasets[run['dataset']], 'params': params,
+                   'draws': run.get('draws', False)}
+            digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:12]
+            jobs.append(dict(key, id=f"{run.get('name', run['estimator'])}-{digest}"))
+    return jobs
+
+
+def _load_dataset(dataset):
+    key = json.dumps(dataset, sort_keys=True)
+    if key not in _datasets:
+        reader = _READERS.get(os.path.splitext(dataset['path'])[1].lower())
+        if reader is None:
+            raise ValueError(f"Unsupported data file '{dataset['path']}'.")
+        _datasets[key] = reader(dataset['path'], **dataset.get('read_options', {}))
+    return _datasets[key]
+
+
+def run_job(job, output):
+    """
+    Fit one job and write its `EstimationResult` to `<output>/<id>.npz`.
+
+    The file is written under a temporary name and renamed once complete,
+    so an interrupted job never leaves a file that looks finished.
+
+    Returns:
+    --------
+    record : dict
+        The job id, its status ('done' or 'failed'), the wall time and the
+        result path or the error.
+    """
+    import pyqte
+
+    start = time.perf_counter()
+    record = {'id': job['id'], 'estimator': job['estimator'], 'params': job['params']}
+    try:
+        estimator = getattr(pyqte, job['estimator'])(data=_load_dataset(job['dataset']), **job['params'])
+        estimator.fit()
+        result = estimator.to_result(draws=job['draws'])
+        path = os.path.join(output, job['id'] + '.npz')
+        with open(path + '.tmp', 'wb') as handle:
+            result.to_npz(handle)
+        os.replace(path + '.tmp', path)
+        record.update({'status': 'done', 'path': path})
+    except Exception as error:
+        record.update({'status': 'failed', 'error': f"{type(error).__name__}: {error}",
+                       'traceback': traceback.format_exc()})
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def _append(manifest, record):
+    manifest.write(json.dumps(record, default=str) + '\n')
+    manifest.flush()
+    os.fsync(manifest.fileno())
+
+
+def run_spec(spec, output, n_jobs=1, resume=True, mp_context=None, log=None):
+    """
+    Execute every job of a spec, writing each result as soon as it completes.
+
+    Parameters:
+    -----------
+    spec : dict
+        The spec, see `expand_spec`.
+    output : str
+        The output directory. It receives one `.npz` result per job and a
+        `manifest.jsonl` log with one line per finished or failed job.
+    n_jobs : int, optional (default=1)
+        The number of worker processes.
+    resume : bool, optional (default=True)
+        Skip the jobs whose result file already exists.
+    mp_context : str, optional
+        The multiprocessing start method (defaults to the platform's).
+    log : callable, optional
+        Called with a progress message per job.
+
+    Returns:
+    --------
+    summary : dict
+        The number of jobs 'done', 'skipped' and 'failed'. Jobs lost to a
+        crashed worker count as failed and run again on the next resume.
+    """
+    log = log or (lambda message: None)
+    os.makedirs(output, exist_ok=True)
+    jobs = expand_spec(spec)
+    pending = [job for job in jobs
+               if not (resume and os.path.exists(os.path.join(output, job['id'] + '.npz')))]
+    summary = {'done': 0, 'skipped': len(jobs) - len(pending), 'failed': 0}
+
+    with open(os.path.join(output, MANIFEST), 'a') as manifest:
+        def record(result):
+            _append(manifest, result)
+            summary['done' if result['status'] == 'done' else 'failed'] += 1
+            log(f"[{summary['done'] + summary['failed']}/{len(pending)}] {result['id']}: {result['status']}"
+                f" ({result['seconds']:.1f}s)" + (f" {result['error']}" if 'error' in result else ''))
+
+        if n_jobs <= 1:
+            for job in pending:
+                record(run_job(job, output))
+            return summary
+
+        context = multiprocessing.get_context(mp_context)
+        with ProcessPoolExecutor(n_jobs, mp_context=context) as pool:
+            futures = {pool.submit(run_job, job, output): job for job in pending}
+            for future in as_completed(futures):
+                try:
+                    record(future.result())
+                except BrokenProcessPool as error:
+                    record({'id': futures[future]['id'], 'status': 'failed', 'seconds': 0.0,
+                            'error': f"worker died: {error}"})
+    return summary
+
+
+def _parity(args):
+    from .parity import run_parity
+
+    report = run_parity(cases=args.cases, sizes=tuple(args.sizes), iters=args.iters, repeats=args.repeats,
+                        use_r=False if args.no_r else None, log=lambda message: print(message, flush=True))
+    if args.output:
+        report.to_csv(args.output, index=False)
+    counts = report['status'].value_counts()
+    print(', '.join(f"{count} {status}" for status, count in counts.items()))
+    return 1 if (report['status'].isin(['mismatch', 'failed'])).any() else 0
+
+
+def _daemon(args):
+    from .daemon import DaemonClient, EstimationDaemon, default_socket_path
+
+    path = args.socket or default_socket_path()
+    if args.stop or args.status:
+        try:
+            with DaemonClient(path) as client:
+                if args.stop:
+                    client.shutdown()
+                    print(f"Stopped the daemon on {path}")
+                else:
+                    print(json.dumps(client.ping()))
+        except OSError:
+            print(f"No daemon is listening on {path}")
+            return 1
+        return 0
+    daemon = EstimationDaemon(path, max_datasets=args.max_datasets)
+    print(f"Listening on {path}", flush=True)
+    daemon.serve_forever()
+    return 0
+
+
+def main(argv=None):
+    """Entry point of the `pyqte` command."""
+    parser = argparse.ArgumentParser(prog='pyqte', description="Batch quantile treatment effect estimation.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="Run the jobs of a JSON spec file.")
+    run.add_argument('spec', help="The spec file.")
+    run.add_argument('-o', '--output', help="The output directory (default: the spec's 'output', or "
+                                            "'pyqte-results').")
+    run.add_argument('-j', '--jobs', type=int, default=1, help="The number of worker processes.")
+    run.add_argument('--no-resume', action='store_true', help="Rerun the jobs whose result already exists.")
+    run.add_argument('--dry-run', action='store_true', help="List the jobs without running them.")
+    parity = commands.add_parser('parity', help="Compare the native and R engines on the Lalonde and "
+                                                "synthetic data.")
+    parity.add_argument('-o', '--output', help="Write the report to this CSV file.")
+    parity.add_argument('--cases', nargs='+', help="The cases to run (default: all).")
+    parity.add_argument('--sizes', nargs='*', type=int, default=[1000, 10000],
+                        help="The numbers of units of the synthetic datasets.")
+    parity.add_argument('--iters', type=int, default=200, help="The bootstrap replicates of each fit.")
+    parity.add_argument('--repeats', type=int, default=1, help="Keep the fastest of this many fits.")
+    parity.add_argument('--no-r', action='store_true', help="Only time the native engine.")
+    daemon = commands.add_parser('daemon', help="Serve fit requests over a Unix socket, keeping R loaded.")
+    daemon.add_argument('--socket', help="The socket path (default: $PYQTE_SOCKET or a per-user temporary file).")
+    daemon.add_argument('--max-datasets', type=int, default=8, help="The number of datasets kept in memory.")
+    daemon.add_argument('--stop', action='store_true', help="Stop the running daemon.")
+    daemon.add_argument('--status', action='store_true', help="Print the status of the running daemon.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'parity':
+        return _parity(args)
+    if args.command == 'daemon':
+        return _daemon(args)
+
+    spec = load_spec(args.spec)
+    output = args.output or spec.get('output', 'pyqte-results')
+    if args.dry_run:
+        for job in expand_spec(spec):
+            done = os.path.exists(os.path.join(output, job['id'] + '.npz'))
+            print(f"{job['id']}\t{'done' if done else 'pending'}\t{json.dumps(job['params'])}")
+        return 0
+
+    summary = run_spec(spec, output, n_jobs=args.jobs, resume=not args.no_resume,
+                       log=lambda message: print(message, flush=True))
+    print(f"{summary['done']} done, {summary['skipped']} skipped, {summary['failed']} failed")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,520 @@
+# daemon.py
+
+import hashlib
+import importlib
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from .results import EstimationResult
+
+# The JSON header of a message is preceded by its length
+_LENGTH = struct.Struct('!I')
+
+# Column dtypes sent as raw buffers: bool, integers, floats, complex and datetimes
+_BINARY_KINDS = 'biufcmM'
+
+
+class DaemonError(RuntimeError):
+    """
+    Raised by `DaemonClient` when the daemon fails a request.
+
+    Attributes:
+    -----------
+    error_type : str
+        The class name of the exception raised in the daemon, e.g. 'DataValidationError'.
+    """
+
+    def __init__(self, message, error_type=None):
+        self.error_type = error_type
+        super().__init__(message if error_type is None else f"{error_type}: {message}")
+
+
+def default_socket_path():
+    """
+    The socket of the daemon: `$PYQTE_SOCKET`, or `pyqte.sock` in the
+    per-user `$XDG_RUNTIME_DIR`, or else in a `pyqte-<uid>` directory of the
+    temporary directory that only the current user can access.
+
+    A shared temporary directory would let another local user create the
+    socket first and receive the clients' data, so the fallback directory is
+    created with mode 0700 and rejected when another user owns or can open it.
+    """
+    if os.environ.get('PYQTE_SOCKET'):
+        return os.environ['PYQTE_SOCKET']
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, 'pyqte.sock')
+    directory = os.path.join(tempfile.gettempdir(), f'pyqte-{os.getuid()}')
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise DaemonError(f"'{directory}' is not a private directory of the current user; "
+                          "set $PYQTE_SOCKET to a socket path in a directory only you can access.")
+    return os.path.join(directory, 'pyqte.sock')
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (np.ndarray, pd.Index)):
+        return value.tolist()
+    return str(value)
+
+
+def _encode_array(values, meta):
+    values = np.ascontiguousarray(values)
+    meta['dtype'] = values.dtype.str
+    return memoryview(values.reshape(-1).view(np.uint8))
+
+
+def encode_frame(data):
+    """
+    Split a DataFrame into a JSON-serializable description and raw column buffers.
+
+    Numeric, boolean and datetime columns are sent as their bytes, categorical
+    columns as their integer codes and categories, and other columns as JSON
+    lists of strings. The index is not sent.
+
+    Returns:
+    --------
+    columns : list of dict
+        The name and dtype (or values) of every column.
+    buffers : list of memoryview
+        The bytes of the binary columns, in order.
+    """
+    columns, buffers = [], []
+    for name, column in data.items():
+        meta = {'name': name if isinstance(name, (str, int, float)) else str(name)}
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            meta['categories'] = column.cat.categories.tolist()
+            buffers.append(_encode_array(column.cat.codes.to_numpy(), meta))
+        elif column.dtype.kind in _BINARY_KINDS:
+            buffers.append(_encode_array(column.to_numpy(), meta))
+        else:
+            meta['values'] = [None if pd.isna(value) else str(value) for value in column.to_numpy()]
+        columns.append(meta)
+    return columns, buffers
+
+
+def decode_frame(columns, buffers):
+    """Rebuild the DataFrame described by `encode_frame`, without copying the binary columns."""
+    buffers = iter(buffers)
+    data = {}
+    for meta in columns:
+        if 'values' in meta:
+            data[meta['name']] = meta['values']
+            continue
+        values = np.frombuffer(next(buffers), dtype=np.dtype(meta['dtype']))
+        if 'categories' in meta:
+            values = pd.Categorical.from_codes(values, meta['categories'])
+        data[meta['name']] = values
+    return pd.DataFrame(data)
+
+
+def frame_key(columns, buffers):
+    """A digest of an encoded DataFrame, naming it in the daemon's cache."""
+    digest = hashlib.blake2b(json.dumps(columns, sort_keys=True, default=_json_default).encode(),
+                             digest_size=16)
+    for buffer in buffers:
+        digest.update(buffer)
+    return digest.hexdigest()
+
+
+def send_message(sock, header, buffers=()):
+    """Send a JSON header followed by raw buffers, whose lengths are listed in the header."""
+    header = dict(header, buffers=[memoryview(buffer).nbytes for buffer in buffers])
+    raw = json.dumps(header, default=_json_default).encode()
+    sock.sendall(_LENGTH.pack(len(raw)) + raw)
+    for buffer in buffers:
+        sock.sendall(buffer)
+
+
+def _receive(sock, size):
+    buffer = bytearray(size)
+    view, received = memoryview(buffer), 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("The connection was closed in the middle of a message.")
+        received += count
+    return buffer
+
+
+def receive_message(sock):
+    """
+    Receive a message sent by `send_message`.
+
+    Returns:
+    --------
+    header : dict or None
+        The JSON header, or None if the peer closed the connection.
+    buffers : list of bytearray
+        The raw buffers.
+    """
+    first = sock.recv(_LENGTH.size, socket.MSG_WAITALL)
+    if not first:
+        return None, []
+    if len(first) < _LENGTH.size:
+        first += _receive(sock, _LENGTH.size - len(first))
+    header = json.loads(_receive(sock, _LENGTH.unpack(first)[0]))
+    return header, [_receive(sock, size) for size in header.pop('buffers', [])]
+
+
+def _estimator_class(name):
+    from .parity import _MODULES
+
+    if name not in _MODULES:
+        raise ValueError(f"Unknown estimator '{name}', expected one of {tuple(_MODULES)}.")
+    return getattr(importlib.import_module(f'.{_MODULES[name]}', __package__), name)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        daemon = self.server.owner
+        while True:
+            try:
+                header, buffers = receive_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            if header is None:
+                return
+            try:
+                response, payload = daemon.handle(header, buffers)
+            except Exception as error:
+                response, payload = {'ok': False, 'error': str(error), 'type': type(error).__name__,
+                                     'traceback': traceback.format_exc()}, []
+            try:
+                send_message(self.request, response, payload)
+            except OSError:
+                return
+            if header.get('op') == 'shutdown':
+                # Only stop once the client has its answer
+                daemon.shutdown()
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class EstimationDaemon:
+    """
+    A long-lived process keeping R, the estimators and recently used data loaded.
+
+    Clients connect over a Unix domain socket and send fit requests with
+    their data as raw column buffers (see `DaemonClient`). Every connection
+    is served by its own thread, so several client processes are served at
+    once. Fits with `engine='r'` run one at a time on the thread that called
+    `serve_forever`, since embedded R is single-threaded; native fits run on
+    the connection threads.
+
+    Parameters:
+    -----------
+    path : str, optional
+        The socket path; `default_socket_path()` by default. A stale socket
+        file left by a previous daemon is replaced.
+    max_datasets : int, optional (default=8)
+        The number of datasets kept in memory, least recently used first out.
+    preload : bool, optional (default=True)
+        Import every estimator module at start, which starts R and loads its
+        `qte` package once for all requests.
+    """
+
+    def __init__(self, path=None, max_datasets=8, preload=True):
+        self.path = path or default_socket_path()
+        self.max_datasets = max_datasets
+        self.started = time.time()
+        self.fits = 0
+        self._datasets = OrderedDict()
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._server = None
+        if preload:
+            from .parity import _MODULES
+
+            for name in _MODULES:
+                _estimator_class(name)
+
+    def _bind(self):
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)
+            else:
+                raise RuntimeError(f"A daemon is already listening on '{self.path}'.")
+            finally:
+                probe.close()
+        self._server = _Server(self.path, _Handler)
+        self._server.owner = self
+
+    def serve_forever(self):
+        """Serve requests until a client sends 'shutdown' or `shutdown()` is called."""
+        self._bind()
+        listener = threading.Thread(target=self._server.serve_forever, name='pyqte-daemon', daemon=True)
+        listener.start()
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                function, done, outcome = job
+                try:
+                    outcome['value'] = function()
+                except BaseException as error:
+                    outcome['error'] = error
+                done.set()
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
+            listener.join()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def shutdown(self):
+        """Stop `serve_forever` once the running request completes."""
+        self._jobs.put(None)
+
+    def _on_main_thread(self, function):
+        done, outcome = threading.Event(), {}
+        self._jobs.put((function, done, outcome))
+        done.wait()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['value']
+
+    def _dataset(self, key):
+        with self._lock:
+            data = self._datasets.get(key)
+            if data is not None:
+                self._datasets.move_to_end(key)
+            return data
+
+    def _store(self, key, data):
+        with self._lock:
+            self._datasets[key] = data
+            self._datasets.move_to_end(key)
+            while len(self._datasets) > self.max_datasets:
+                self._datasets.popitem(last=False)
+
+    def handle(self, header, buffers):
+        """Answer one request, returning the response header and its buffers."""
+        op = header.get('op')
+        if op == 'ping':
+            with self._lock:
+                datasets = list(self._datasets)
+            return {'ok': True, 'pid': os.getpid(), 'uptime_s': time.time() - self.started, 'fits': self.fits,
+                    'datasets': datasets}, []
+        if op == 'put':
+            self._store(header['key'], decode_frame(header['columns'], buffers))
+            return {'ok': True, 'key': header['key']}, []
+        if op == 'drop':
+            with self._lock:
+                dropped = self._datasets.pop(header['key'], None) is not None
+            return {'ok': True, 'dropped': dropped}, []
+        if op == 'fit':
+            return self._fit(header, buffers)
+        if op == 'shutdown':
+            return {'ok': True}, []
+        raise ValueError(f"Unknown request '{op}'.")
+
+    def _fit(self, header, buffers):
+        data = self._dataset(header['key'])
+        if data is None:
+            return {'ok': False, 'missing': True, 'error': "The dataset is not loaded."}, []
+        params = dict(header['params'])
+        for meta, buffer in zip(header.get('arrays', []), buffers):
+            params[meta['param']] = np.frombuffer(buffer, dtype=np.dtype(meta['dtype']))
+        cls = _estimator_class(header['estimator'])
+
+        def fit():
+            estimator = cls(data=data, **params)
+            estimator.fit()
+            handle = io.BytesIO()
+            estimator.to_result(draws=header.get('draws', False)).to_npz(handle)
+            return handle.getbuffer()
+
+        start = time.perf_counter()
+        payload = self._on_main_thread(fit) if params.get('engine', 'r') == 'r' else fit()
+        with self._lock:
+            self.fits += 1
+        return {'ok': True, 'seconds': time.perf_counter() - start}, [payload]
+
+
+def start_daemon(path=None, max_datasets=8, timeout=60, log_path=None):
+    """
+    Start `pyqte daemon` in the background, unless one is already listening.
+
+    Parameters:
+    -----------
+    path : str, optional
+        The socket path; `default_socket_path()` by default.
+    max_datasets : int, optional (default=8)
+        See `EstimationDaemon`.
+    timeout : float, optional (default=60)
+        The seconds to wait for the daemon to accept connections.
+    log_path : str, optional
+        A file receiving the output of the daemon; discarded by default.
+
+    Returns:
+    --------
+    pid : int
+        The process id of the daemon.
+    """
+    path = path or default_socket_path()
+    try:
+        with DaemonClient(path) as client:
+            return client.ping()['pid']
+    except OSError:
+        pass
+    log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+    try:
+        process = subprocess.Popen([sys.executable, '-m', 'pyqte', 'daemon', '--socket', path,
+                                    '--max-datasets', str(max_datasets)],
+                                   stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+    finally:
+        if log_path:
+            log.close()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise DaemonError(f"The daemon exited with status {process.returncode}.")
+        try:
+            with DaemonClient(path) as client:
+                return client.ping()['pid']
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise DaemonError(f"The daemon did not start listening on '{path}' within {timeout}s.")
+
+
+class DaemonClient:
+    """
+    A connection to an `EstimationDaemon`.
+
+    Parameters:
+    -----------
+    path : str, optional
+        The socket path; `default_socket_path()` by default.
+    timeout : float, optional
+        The timeout of the socket operations in seconds; none by default.
+
+    Examples:
+    ---------
+    >>> with DaemonClient() as client:
+    ...     result = client.fit('QTETEstimator', data, formula='re78 ~ treat', probs=[0.1, 0.5, 0.9, 0.95])
+    """
+
+    def __init__(self, path=None, timeout=None):
+        self.path = path or default_socket_path()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(self.path)
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, header, buffers=()):
+        send_message(self._sock, header, buffers)
+        response, payload = receive_message(self._sock)
+        if response is None:
+            raise DaemonError("The daemon closed the connection.")
+        if not response.get('ok') and not response.get('missing'):
+            raise DaemonError(response.get('error'), response.get('type'))
+        return response, payload
+
+    def ping(self):
+        """Return the daemon's process id, uptime, number of fits and cached dataset keys."""
+        return self._request({'op': 'ping'})[0]
+
+    def put(self, data):
+        """
+        Send a DataFrame to the daemon, which keeps it for later fits.
+
+        Returns:
+        --------
+        key : str
+            The digest of the data, under which the daemon stores it.
+        """
+        columns, buffers = encode_frame(data)
+        key = frame_key(columns, buffers)
+        self._request({'op': 'put', 'key': key, 'columns': columns}, buffers)
+        return key
+
+    def drop(self, data):
+        """Remove a DataFrame (or a key returned by `put`) from the daemon's memory."""
+        key = data if isinstance(data, str) else frame_key(*encode_frame(data))
+        return self._request({'op': 'drop', 'key': key})[0]['dropped']
+
+    def fit(self, estimator, data, draws=False, **params):
+        """
+        Fit an estimator in the daemon.
+
+        The data is only sent when the daemon does not hold it already, e.g.
+        from an earlier request of another process.
+
+        Parameters:
+        -----------
+        estimator : str
+            The class name, e.g. 'CiCEstimator'.
+        data : pandas.DataFrame or str
+            The data, or the key returned by `put`.
+        draws : bool, optional (default=False)
+            Also return the bootstrap replicates, see `to_result`.
+        **params :
+            The arguments of the estimator class, other than `data`. Arrays
+            (e.g. `weights`) are sent as raw buffers.
+
+        Returns:
+        --------
+        result : EstimationResult
+            The results, with `timings` of the fit in the daemon.
+        """
+        key = data if isinstance(data, str) else frame_key(*encode_frame(data))
+        arrays, buffers = [], []
+        for name in list(params):
+            if isinstance(params[name], (np.ndarray, pd.Series)):
+                meta = {'param': name}
+                buffers.append(_encode_array(np.asarray(params.pop(name)), meta))
+                arrays.append(meta)
+        header = {'op': 'fit', 'estimator': estimator, 'key': key, 'params': params, 'arrays': arrays,
+                  'draws': draws}
+        response, payload = self._request(header, buffers)
+        if response.get('missing'):
+            if isinstance(data, str):
+                raise DaemonError(f"The daemon does not hold the dataset '{key}'.")
+            self.put(data)
+            response, payload = self._request(header, buffers)
+            if response.get('missing'):
+                raise DaemonError("The daemon dropped the dataset before fitting it.")
+        return EstimationResult.from_npz(io.BytesIO(payload[0]))
+
+    def shutdown(self):
+        """Stop the daemon."""
+        self._request({'op': 'shutdown'})
@@ -1,10 +1,18 @@
+import copy
 import pandas as pd
 import numpy as np
-from rpy2.robjects import r, Formula
+from rpy2.robjects import r, Formula, FloatVector
 from rpy2.robjects.packages import importr
 from rpy2.robjects import pandas2ri
 from rpy2.robjects.conversion import localconverter
 import matplotlib.pyplot as plt
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine
+from .bootstrap import fit_native, integer_seeds, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
 
 # Activate automatic conversion of pandas DataFrames to R data.frames
 pandas2ri.activate()
@@ -15,7 +23,9 @@ qte = importr('qte')
 class DDID2Estimator:
     def __init__(self, formula, data, t, tmin1, tname, idname=None, xformla=None, probs=[0.05, 0.95, 0.05], 
                  se=True, iters=100, alp=0.05, method='logit', retEachIter=False, panel=True, dropalwaystreated=True, 
-                 seedvec=None, pl=False, cores=None):
+                 seedvec=None, pl=False, cores=None, engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False,
+                 low_memory=False, memory_budget_mb=None, seed=None, draws_path=None):
         self.formula = formula
         self.xformla = xformla
         self.data = data
@@ -40,11 +50,52 @@ class DDID2Estimator:
         self.seedvec = seedvec
         self.pl = pl
         self.cores = cores
+        check_engine(engine, adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, draws_path=draws_path)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.uniform = uniform
         self.result = None
+        self.info = {}
+        self._problem = None
 
     def fit(self):
+        timer = FitTimer('DDID2Estimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('ddid2', self.data, self.formula, xformla=self.xformla, t=self.t, tmin1=self.tmin1,
+                          tname=self.tname, idname=self.idname, panel=self.panel, balanced=self.engine == 'r',
+                          engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                problem = build_problem('ddid2', self.data, self.formula, self.probs, xformla=self.xformla,
+                                        t=self.t, tmin1=self.tmin1, tname=self.tname,
+                                        idname=self.idname, panel=self.panel, method=self.method,
+                                        low_memory=self.low_memory)
+            self._problem = problem
+            self.info = fit_native(problem, se=self.se, iters=self.iters, alp=self.alp,
+                                   adaptive=self.adaptive, adaptive_tol=self.adaptive_tol,
+                                   batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                   boot_weights=self.boot_weights, uniform=self.uniform,
+                                   memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                   draws_path=self.draws_path, timer=timer)
+            self.info['timings'] = timer.finish()
+            return
+
         r_formula = Formula(self.formula)
-        r_data = pandas2ri.py2rpy(self.data)
+        with timer.phase('py2rpy', rows=rows):
+            r_data = pandas2ri.py2rpy(self.data)
         
         additional_args = {
             't': self.t,
@@ -70,38 +121,76 @@ class DDID2Estimator:
         
         if self.seedvec is not None:
             additional_args['seedvec'] = self.seedvec
+        elif self.seed is not None and self.se:
+            # One seed per bootstrap iteration, independent of `pl` and `cores`
+            additional_args['seedvec'] = FloatVector(integer_seeds(self.seed, self.iters))
 
         # Remove keys with None values to avoid errors
         additional_args = {k: v for k, v in additional_args.items() if v is not None}
 
-        self.result = qte.ddid2(
-            formla=r_formula,
-            data=r_data,
-            probs=np.array(self.probs),
-            **additional_args
-        )
+        if self.seed is not None:
+            set_r_seed(self.seed)
+        with timer.phase('r_call', rows=rows):
+            self.result = qte.ddid2(
+                formla=r_formula,
+                data=r_data,
+                probs=np.array(self.probs),
+                **additional_args
+            )
+
+        with timer.phase('extract_info', rows=len(self.probs)):
+            self._extract_info()
+        self.info['timings'] = timer.finish()
+
+    def _extract_info(self):
+        self.info['qte'] = np.array(self.result.rx2('qte'))
+        self.info['probs'] = np.array(self.result.rx2('probs'))
+
+        if self.se and 'qte.lower' in self.result.names and 'qte.upper' in self.result.names:
+            self.info['qte.lower'] = np.array(self.result.rx2('qte.lower'))
+            self.info['qte.upper'] = np.array(self.result.rx2('qte.upper'))
+        else:
+            self.info['qte.lower'] = None
+            self.info['qte.upper'] = None
 
     def summary(self):
-        if self.result is None:
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `summary()`.")
+        if self.engine == 'native':
+            summary = self.get_results()
+            print(summary)
+            return summary
         summary = r.summary(self.result)
         print(summary)
         return summary
 
-    def plot(self):
-        if self.result is None:
+    def plot(self, path=None):
+        """
+        Plot the DDID2 estimates with confidence intervals, if available.
+
+        Parameters:
+        -----------
+        path : str, optional
+            Save the plot to this file (PNG, SVG, PDF, ...) with a
+            non-interactive backend instead of showing it.
+        """
+        if path is not None:
+            return save_plot(self.to_result(), path, name='DDID2',
+                             title='Quantile Treatment Effects on the Treated (DDID2)')
+
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `plot()`.")
         
         tau = np.array(self.probs)
-        qte = np.array(self.result.rx2('qte'))
+        qte = self.info['qte']
 
         plt.figure(figsize=(10, 6))
         plt.plot(tau, qte, 'o-', label="DDID2")
 
         if self.se:
-            if 'qte.lower' in self.result.names and 'qte.upper' in self.result.names:
-                lower_bound = np.array(self.result.rx2('qte.lower'))
-                upper_bound = np.array(self.result.rx2('qte.upper'))
+            if self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
+                lower_bound = self.info['qte.lower']
+                upper_bound = self.info['qte.upper']
                 if np.issubdtype(lower_bound.dtype, np.number) and np.issubdtype(upper_bound.dtype, np.number):
                     plt.fill_between(tau, lower_bound, upper_bound, color='gray', alpha=0.2, label="95% CI")
                 else:
@@ -117,17 +206,55 @@ class DDID2Estimator:
         plt.grid(True)
         plt.show()
 
+    def at(self, probs):
+        """
+        Re-evaluate a native fit at new quantiles without refitting.
+
+        The fit keeps its sorted samples and bootstrap seeds, so this only
+        inverts the ECDFs at `probs` and replays the same replicates.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : DDID2Estimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        if self._problem is None:
+            raise ValueError("`at` requires a fit with engine='native'.")
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, alp=self.alp, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('DDID2Estimator', self.info, replicates)
+
     def get_results(self):
-        if self.result is None:
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `get_results()`.")
 
-        # Extract results and convert to a DataFrame
-        qte = np.array(self.result.rx2('qte'))
-        probs = np.array(self.result.rx2('probs'))
+        # Convert the extracted results to a DataFrame
+        qte = self.info['qte']
+        probs = self.info['probs']
 
-        if self.se and 'qte.lower' in self.result.names and 'qte.upper' in self.result.names:
-            lower_bound = np.array(self.result.rx2('qte.lower'))
-            upper_bound = np.array(self.result.rx2('qte.upper'))
+        if self.se and self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
+            lower_bound = self.info['qte.lower']
+            upper_bound = self.info['qte.upper']
             results_df = pd.DataFrame({
                 'Quantile': probs,
                 'QTE': qte,
@@ -140,5 +267,9 @@ class DDID2Estimator:
                 'QTE': qte
             })
 
+        if 'qte.band.lower' in self.info:
+            results_df['QTE Uniform Lower Bound'] = self.info['qte.band.lower']
+            results_df['QTE Uniform Upper Bound'] = self.info['qte.band.upper']
+
         return results_df
 
@@ -0,0 +1,138 @@
+# density.py
+
+import numpy as np
+
+# Above this many observations the KDE is computed on a binned grid by FFT
+BINNED_MIN_N = 10000
+
+
+def effective_size(w):
+    """Kish's effective sample size of a weight vector."""
+    w = np.asarray(w, dtype=float)
+    return w.sum() ** 2 / np.sum(w ** 2)
+
+
+def silverman_bandwidth(y, w=None):
+    """
+    Silverman's rule-of-thumb bandwidth of a (weighted) sample.
+
+    Parameters:
+    -----------
+    y : numpy.ndarray
+        The sorted sample, shape (n,).
+    w : numpy.ndarray, optional
+        Nonnegative weights of the observations, shape (n,).
+
+    Returns:
+    --------
+    h : float
+        0.9 * min(sd, IQR / 1.34) * n_eff ** (-1/5).
+    """
+    w = np.ones(len(y)) if w is None else np.asarray(w, dtype=float)
+    total = w.sum()
+    mean = w @ y / total
+    sd = np.sqrt(w @ (y - mean) ** 2 / total)
+    cw = np.cumsum(w) / total
+    q25, q75 = y[np.searchsorted(cw, [0.25, 0.75])]
+    spread = min(sd, (q75 - q25) / 1.34) if q75 > q25 else sd
+    if spread <= 0:
+        spread = 1.0
+    return 0.9 * spread * effective_size(w) ** (-0.2)
+
+
+def _kde_direct(y, w, x, h):
+    # (k, n) kernel matrix, evaluated in blocks of points to bound memory
+    out = np.empty(len(x))
+    step = max(1, 2**22 // max(len(y), 1))
+    for start in range(0, len(x), step):
+        z = (x[start:start + step, None] - y[None, :]) / h
+        out[start:start + step] = np.exp(-0.5 * z ** 2) @ w
+    return out / (w.sum() * h * np.sqrt(2 * np.pi))
+
+
+def _kde_binned(y, w, x, h, grid_size):
+    # Linear binning onto a regular grid, then FFT convolution with the kernel
+    lo, hi = y[0] - 4 * h, y[-1] + 4 * h
+    delta = (hi - lo) / (grid_size - 1)
+    pos = (y - lo) / delta
+    left = np.minimum(np.floor(pos).astype(np.int64), grid_size - 2)
+    frac = pos - left
+    mass = (np.bincount(left, w * (1 - frac), minlength=grid_size)
+            + np.bincount(left + 1, w * frac, minlength=grid_size))
+
+    reach = min(grid_size - 1, int(np.ceil(4 * h / delta)))
+    offsets = np.arange(-reach, reach + 1) * delta / h
+    kernel = np.exp(-0.5 * offsets ** 2)
+    size = grid_size + 2 * reach
+    fft_size = 1 << int(np.ceil(np.log2(size)))
+    smoothed = np.fft.irfft(np.fft.rfft(mass, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)
+    density = smoothed[reach:reach + grid_size] / (w.sum() * h * np.sqrt(2 * np.pi))
+    grid = lo + delta * np.arange(grid_size)
+    return np.interp(x, grid, np.maximum(density, 0.0))
+
+
+def kde_at(y, x, w=None, bandwidth=None, binned=None, grid_size=2048):
+    """
+    Evaluate a weighted Gaussian kernel density estimate at the points `x`.
+
+    Parameters:
+    -----------
+    y : numpy.ndarray
+        The sorted sample, shape (n,).
+    x : array-like
+        The evaluation points.
+    w : numpy.ndarray, optional
+        Nonnegative weights of the observations (default: equal weights).
+    bandwidth : float, optional
+        The kernel bandwidth (default: Silverman's rule).
+    binned : bool, optional
+        Use the linearly binned FFT estimator. Defaults to True from
+        `BINNED_MIN_N` observations on, where its cost no longer grows with
+        the number of evaluation points.
+    grid_size : int, optional (default=2048)
+        The number of grid points of the binned estimator.
+
+    Returns:
+    --------
+    density : numpy.ndarray
+        The estimated density at each point of `x`.
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    w = np.ones(len(y)) if w is None else np.asarray(w, dtype=float)
+    h = silverman_bandwidth(y, w) if bandwidth is None else bandwidth
+    if binned is None:
+        binned = len(y) >= BINNED_MIN_N
+    if binned:
+        return _kde_binned(y, w, x, h, grid_size)
+    return _kde_direct(y, w, x, h)
+
+
+def quantile_variance(y, w, quantiles, probs, size=None):
+    """
+    Asymptotic variance of weighted sample quantiles, p(1 - p) / (n f(q)^2).
+
+    Parameters:
+    -----------
+    y : numpy.ndarray
+        The sorted sample of one cell, shape (n,).
+    w : numpy.ndarray
+        The weights of the observations (e.g. inverse propensity scores); the
+        sample size is replaced by their effective size.
+    quantiles : numpy.ndarray
+        The estimated quantiles, shape (k,).
+    probs : numpy.ndarray
+        The quantile levels, shape (k,).
+    size : float, optional
+        The (effective) sample size, when `w` aggregates tied observations.
+
+    Returns:
+    --------
+    variance : numpy.ndarray
+        The variance of each quantile, shape (k,). Quantiles at which the
+        estimated density vanishes get an infinite variance.
+    """
+    density = kde_at(y, quantiles, w)
+    with np.errstate(divide='ignore'):
+        size = effective_size(w) if size is None else size
+        return probs * (1 - probs) / (size * density ** 2)
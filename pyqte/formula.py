@@ -0,0 +1,287 @@
+# formula.py
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Categorical terms with more columns than this make the design matrix sparse
+MAX_DENSE_LEVELS = 50
+
+# Number of design matrices kept by `design_matrix`
+_CACHE_SIZE = 8
+_cache = OrderedDict()
+# Fits may run on several threads, e.g. in the estimation daemon
+_cache_lock = threading.Lock()
+
+_CATEGORICAL = re.compile(r'^(?:C|factor|as\.factor)\(\s*([^()]+?)\s*\)$')
+_NAME = re.compile(r'^[A-Za-z_.][A-Za-z0-9_.]*$')
+
+Factor = namedtuple('Factor', ['name', 'categorical'])
+DesignMatrix = namedtuple('DesignMatrix', ['X', 'columns'])
+
+
+class ParsedFormula:
+    """
+    A parsed formula 'outcome ~ term + term:term + ...'.
+
+    Parameters:
+    -----------
+    outcome : str or None
+        The left-hand side variable (None for one-sided formulas).
+    terms : list of tuple of Factor
+        The right-hand side terms; interactions have several factors.
+    intercept : bool
+        Whether the model includes an intercept.
+    """
+
+    def __init__(self, outcome, terms, intercept):
+        self.outcome = outcome
+        self.terms = terms
+        self.intercept = intercept
+
+    @property
+    def variables(self):
+        """The data columns used by the right-hand side, in order of appearance."""
+        names = []
+        for term in self.terms:
+            for factor in term:
+                if factor.name not in names:
+                    names.append(factor.name)
+        return names
+
+    def __str__(self):
+        rhs = [':'.join(f"C({f.name})" if f.categorical else f.name for f in term) for term in self.terms]
+        rhs = (['1'] if self.intercept else ['0']) + rhs
+        return f"{self.outcome or ''} ~ {' + '.join(rhs)}".strip()
+
+
+def _split_top_level(text, sep):
+    parts, depth, current = [], 0, ''
+    for char in text:
+        depth += (char == '(') - (char == ')')
+        if char in sep and depth == 0:
+            parts.append(current)
+            parts.append(char)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+def _parse_factor(token):
+    token = token.strip()
+    match = _CATEGORICAL.match(token)
+    if match:
+        return Factor(match.group(1), True)
+    if not _NAME.match(token):
+        raise ValueError(f"Unsupported formula term '{token}'.")
+    return Factor(token, False)
+
+
+@lru_cache(maxsize=256)
+def parse_formula(formula):
+    """
+    Parse a formula string.
+
+    Supported terms are column names, categorical factors `C(x)`, `factor(x)`
+    or `as.factor(x)`, interactions `a:b`, crossings `a*b` (= a + b + a:b),
+    and `+ 0` / `- 1` to drop the intercept.
+
+    Parameters:
+    -----------
+    formula : str
+        A formula such as 're ~ treat' or '~ age + C(region) + age:married'.
+
+    Returns:
+    --------
+    parsed : ParsedFormula
+        The outcome, the deduplicated terms and the intercept flag.
+    """
+    formula = str(formula)
+    if formula.count('~') > 1:
+        raise ValueError(f"Invalid formula '{formula}'.")
+    lhs, rhs = formula.split('~') if '~' in formula else ('', formula)
+    outcome = lhs.strip() or None
+
+    terms, intercept, sign = [], True, '+'
+    for part in _split_top_level(rhs, '+-'):
+        if part in ('+', '-'):
+            sign = part
+            continue
+        part = part.strip()
+        if part == '':
+            continue
+        if part in ('0', '1'):
+            intercept = (part == '1') == (sign == '+')
+            continue
+        if sign == '-':
+            raise ValueError(f"Removing the term '{part}' is not supported.")
+        # a*b*c expands to all the interactions of its factors
+        crossed = [[_parse_factor(f) for f in _split_top_level(piece, ':') if f != ':']
+                   for piece in _split_top_level(part, '*') if piece != '*']
+        expanded = [()]
+        for factors in crossed:
+            expanded += [term + tuple(factors) for term in expanded]
+        for term in expanded[1:]:
+            if term not in terms:
+                terms.append(term)
+    return ParsedFormula(outcome, terms, intercept)
+
+
+def formula_string(outcome, terms):
+    """Join an outcome and a list of right-hand side terms into a formula string."""
+    return f"{outcome} ~ {' + '.join(terms)}"
+
+
+def data_fingerprint(data, columns=None):
+    """
+    Hash the values (and row order) of some columns of a DataFrame.
+
+    Parameters:
+    -----------
+    data : pandas.DataFrame
+        The dataset.
+    columns : list of str, optional
+        The columns to hash (default: all).
+
+    Returns:
+    --------
+    fingerprint : str
+        A digest that changes whenever the selected values change.
+    """
+    subset = data if columns is None else data[list(columns)]
+    hashed = pd.util.hash_pandas_object(subset, index=False).to_numpy()
+    digest = hashlib.blake2b(hashed.tobytes(), digest_size=16)
+    digest.update(repr((list(subset.columns), subset.shape)).encode())
+    return digest.hexdigest()
+
+
+def _encode(series, categorical):
+    """Return float values, or sorted category codes and levels."""
+    if series.isna().any():
+        raise ValueError(f"Column '{series.name}' has missing values.")
+    if categorical or not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        codes, levels = pd.factorize(series, sort=True)
+        return codes, [str(level) for level in levels]
+    return series.to_numpy(dtype=float), None
+
+
+def _term_block(data, term, full_rank_first, encoded):
+    """Build the (n, columns) sparse block of one term and its column names."""
+    n = len(data)
+    values = np.ones(n)
+    cells = np.zeros(n, dtype=np.int64)
+    valid = np.ones(n, dtype=bool)
+    names = ['']
+    for factor in term:
+        codes, levels = encoded[factor]
+        if levels is None:
+            values = values * codes
+            names = [f"{prefix}:{factor.name}" if prefix else factor.name for prefix in names]
+            continue
+        label = f"C({factor.name})" if factor.categorical else factor.name
+        # Treatment contrasts: the first level is the reference, unless the term
+        # has to span the intercept
+        kept = levels if full_rank_first else levels[1:]
+        shift = 0 if full_rank_first else 1
+        full_rank_first = False
+        valid &= codes >= shift
+        cells = cells * len(kept) + (codes - shift)
+        names = [f"{prefix}:{label}[{level}]" if prefix else f"{label}[{level}]"
+                 for prefix in names for level in kept]
+    rows = np.flatnonzero(valid)
+    block = sparse.csr_matrix((values[rows], (rows, cells[rows])), shape=(n, len(names)))
+    return block, names
+
+
+def design_matrix(data, formula, sparse_output=None, cache=True):
+    """
+    Build the design matrix of the right-hand side of a formula.
+
+    Numeric columns enter as they are; categorical factors (strings,
+    booleans, pandas categoricals or terms wrapped in `C()`/`factor()`) are
+    dummy coded against their first level. Matrices are cached by formula and
+    data fingerprint, so estimators fitted on the same data, and every
+    bootstrap replicate, reuse one design matrix.
+
+    Parameters:
+    -----------
+    data : pandas.DataFrame
+        The dataset.
+    formula : str
+        The formula, e.g. '~ age + C(region) + age:married'.
+    sparse_output : bool, optional
+        Return a `scipy.sparse.csr_matrix`. By default the matrix is sparse
+        when a categorical term has more than `MAX_DENSE_LEVELS` columns.
+    cache : bool, optional (default=True)
+        Look the matrix up in, and store it in, the design matrix cache.
+
+    Returns:
+    --------
+    design : DesignMatrix
+        The matrix `X` (read-only when dense) and its column names `columns`.
+    """
+    parsed = parse_formula(formula)
+    key = None
+    if cache:
+        key = (str(parsed), sparse_output, data_fingerprint(data, parsed.variables))
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+
+    encoded = {}
+    for term in parsed.terms:
+        for factor in term:
+            if factor not in encoded:
+                encoded[factor] = _encode(data[factor.name], factor.categorical)
+
+    # Columns in term order: dense (n, 1) arrays for numeric terms, sparse blocks for the others
+    parts, columns = [], []
+    if parsed.intercept:
+        parts.append(np.ones((len(data), 1)))
+        columns.append('Intercept')
+    full_rank_first = not parsed.intercept
+    for term in parsed.terms:
+        if all(encoded[factor][1] is None for factor in term):
+            column = np.ones(len(data))
+            for factor in term:
+                column = column * encoded[factor][0]
+            parts.append(column[:, None])
+            columns.append(':'.join(factor.name for factor in term))
+            continue
+        block, names = _term_block(data, term, full_rank_first and len(term) == 1, encoded)
+        full_rank_first = full_rank_first and len(term) != 1
+        parts.append(block)
+        columns.extend(names)
+
+    if sparse_output is None:
+        sparse_output = any(sparse.issparse(part) and part.shape[1] > MAX_DENSE_LEVELS for part in parts)
+    if not parts:
+        X = np.empty((len(data), 0))
+    elif sparse_output:
+        X = sparse.hstack([sparse.csr_matrix(part) for part in parts], format='csr')
+    else:
+        X = np.column_stack([part.toarray() if sparse.issparse(part) else part for part in parts])
+        X.flags.writeable = False
+    design = DesignMatrix(X, columns)
+
+    if cache:
+        with _cache_lock:
+            _cache[key] = design
+            if len(_cache) > _CACHE_SIZE:
+                _cache.popitem(last=False)
+    return design
+
+
+def clear_design_cache():
+    """Drop every cached design matrix."""
+    with _cache_lock:
+        _cache.clear()
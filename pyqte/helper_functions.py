@@ -2,6 +2,9 @@ import pandas as pd
 import numpy as np
 from rpy2.robjects import pandas2ri, Formula
 from rpy2.robjects.packages import importr
+from .formula import formula_string
+from .bootstrap import iter_replicates
+from .quantreg import quantile_regression_process
 
 # Activate the pandas conversion for rpy2
 pandas2ri.activate()
@@ -42,8 +45,21 @@ def create_formula(dependent_var, independent_vars):
     formula : rpy2.robjects.Formula
         The created R formula.
     """
-    formula_str = f"{dependent_var} ~ {' + '.join(independent_vars)}"
-    return Formula(formula_str)
+    return Formula(formula_string(dependent_var, independent_vars))
+
+def set_r_seed(seed):
+    """
+    Seed R's random number generator from a pyqte seed.
+
+    The R seed is a 31-bit integer derived from `numpy.random.SeedSequence(seed)`,
+    so the same seed reproduces the R bootstrap for a fixed `pl`/`cores` setup.
+
+    Parameters:
+    -----------
+    seed : int
+        The seed passed to an estimator.
+    """
+    base.set_seed(int(np.random.SeedSequence(seed).generate_state(1)[0] >> 1))
 
 def calculate_summary_statistics(dataframe):
     """
@@ -62,9 +78,39 @@ def calculate_summary_statistics(dataframe):
     summary = dataframe.describe()
     return summary
 
-def bootstrap_sample(dataframe, n=1000):
+def iter_bootstrap_samples(dataframe, n=1000, batch_size=50, seed=None):
+    """
+    Lazily generate bootstrap samples from a pandas DataFrame.
+
+    Only the resampled row indices of one batch and the current sample are
+    held in memory.
+
+    Parameters:
+    -----------
+    dataframe : pandas.DataFrame
+        The DataFrame to bootstrap.
+    n : int, optional (default=1000)
+        The number of bootstrap samples to generate.
+    batch_size : int, optional (default=50)
+        The number of samples whose row indices are drawn at once.
+    seed : int, optional
+        The root seed, see `pyqte.bootstrap.root_seed`.
+
+    Yields:
+    -------
+    sample : pandas.DataFrame
+        A resample of the rows of `dataframe`, with replacement.
+    """
+    for batch in iter_replicates(len(dataframe), n, batch_size, output='indices', seed=seed):
+        for indices in batch:
+            yield dataframe.iloc[indices]
+
+def bootstrap_sample(dataframe, n=1000, seed=None):
     """
     Generate bootstrap samples from a pandas DataFrame.
+
+    This holds all the samples at once; prefer `iter_bootstrap_samples`, or
+    `pyqte.utils.bootstrap_estimation` to bootstrap a statistic.
     
     Parameters:
     -----------
@@ -72,14 +118,15 @@ def bootstrap_sample(dataframe, n=1000):
         The DataFrame to bootstrap.
     n : int, optional (default=1000)
         The number of bootstrap samples to generate.
+    seed : int, optional
+        The root seed, see `pyqte.bootstrap.root_seed`.
     
     Returns:
     --------
     samples : list of pandas.DataFrame
         A list containing the bootstrap samples.
     """
-    samples = [dataframe.sample(frac=1, replace=True) for _ in range(n)]
-    return samples
+    return list(iter_bootstrap_samples(dataframe, n, seed=seed))
 
 def calculate_confidence_intervals(data, alpha=0.05):
     """
@@ -132,28 +179,40 @@ def merge_dataframes(df1, df2, on):
     merged_df = pd.merge(df1, df2, on=on)
     return merged_df
 
-def generate_quantile_regression_results(model, quantiles):
+def generate_quantile_regression_results(model, quantiles, iters=100, alp=0.05, seed=None):
     """
     Generate results from a quantile regression model.
-    
+
+    All quantiles are solved in one warm-started pass with
+    `quantile_regression_process`, instead of one fit per quantile, and the
+    confidence intervals are bootstrap percentile intervals over the whole grid.
+
     Parameters:
     -----------
     model : statsmodels.regression.quantile_regression.QuantReg
-        The fitted quantile regression model.
+        The quantile regression model, whose outcome and design matrix are used.
     quantiles : list of float
         The list of quantiles to estimate.
-    
+    iters : int, optional (default=100)
+        The number of bootstrap replicates of the confidence intervals.
+    alp : float, optional (default=0.05)
+        The significance level of the confidence intervals.
+    seed : int, optional
+        The root seed of the bootstrap.
+
     Returns:
     --------
     results : dict
         A dictionary containing the quantile estimates and confidence intervals.
     """
+    X = pd.DataFrame(model.exog, columns=model.exog_names)
+    process = quantile_regression_process(model.endog, X, quantiles, se=True, iters=iters, alp=alp, seed=seed)
     results = {}
-    for q in quantiles:
-        res = model.fit(q=q)
+    for i, q in enumerate(quantiles):
         results[q] = {
-            'coefficients': res.params,
-            'confidence_intervals': res.conf_int()
+            'coefficients': process['coef'].iloc[i].rename(None),
+            # Laid out like statsmodels' `conf_int()`: one row per coefficient, columns 0 and 1
+            'confidence_intervals': pd.DataFrame({0: process['coef.lower'].iloc[i], 1: process['coef.upper'].iloc[i]})
         }
     return results
 
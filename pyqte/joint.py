@@ -0,0 +1,191 @@
+# joint.py
+
+import copy
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from .timing import FitTimer
+from .native import JointProblem
+from .bootstrap import (BOOT_WEIGHTS, _add_bootstrap_intervals, _point_info, bootstrap_draws, budget_batch_size,
+                        root_seed)
+
+
+class JointEstimator:
+    """
+    Fit several native estimators on the same bootstrap replicates.
+
+    Each estimator is prepared as usual, then every bootstrap weight vector is
+    drawn once and all estimators are evaluated on it. The replicates of the
+    estimators are therefore dependent in the way their estimates are, and
+    the differences between estimators (e.g. CiC against QDiD) get standard
+    errors and confidence intervals from the differences of the replicates.
+
+    Parameters:
+    -----------
+    estimators : dict or list
+        Estimators with engine='native' on the same data, resampling the same
+        units (same periods, `idname`, `panel` and `by`). A dict names them by
+        its keys; a list by their class names without 'Estimator'.
+    se : bool, optional (default=True)
+        Draw the joint bootstrap replicates.
+    iters : int, optional (default=100)
+        The number of replicates, or the maximum number when `adaptive` is True.
+    alp : float, optional (default=0.05)
+        The significance level of the confidence intervals.
+    adaptive, adaptive_tol, batch_size, n_jobs, boot_weights, uniform, memory_budget_mb, seed, draws_path :
+        As in the estimator classes. These replace the bootstrap options of
+        the individual estimators.
+    """
+
+    def __init__(self, estimators, se=True, iters=100, alp=0.05, adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False, memory_budget_mb=None, seed=None,
+                 draws_path=None):
+        if isinstance(estimators, dict):
+            self.estimators = dict(estimators)
+        else:
+            self.estimators = {}
+            for estimator in estimators:
+                name = type(estimator).__name__.replace('Estimator', '')
+                if name in self.estimators:
+                    raise ValueError(f"Two estimators are named '{name}'; pass a dict to name them.")
+                self.estimators[name] = estimator
+        if not self.estimators:
+            raise ValueError("`estimators` must contain at least one estimator.")
+        for name, estimator in self.estimators.items():
+            if getattr(estimator, 'engine', None) != 'native':
+                raise ValueError(f"The joint bootstrap requires engine='native'; '{name}' uses the R engine.")
+            if type(estimator).__name__ == 'SpATTEstimator':
+                raise ValueError("The joint bootstrap combines quantile effects; SpATTEstimator "
+                                 "is not supported.")
+        if boot_weights not in BOOT_WEIGHTS:
+            raise ValueError(f"`boot_weights` must be one of {BOOT_WEIGHTS}, not '{boot_weights}'.")
+        self.se = se
+        self.iters = iters
+        self.alp = alp
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.uniform = uniform
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.draws = None
+        self.info = {}
+        self._problem = None
+
+    def fit(self):
+        """
+        Prepare every estimator and evaluate them on shared bootstrap replicates.
+
+        The results of each estimator are also stored in its own `info`, and
+        the joint bootstrap options replace its own, so its `get_results`,
+        `plot`, `at` and `to_result` reflect the joint fit.
+        """
+        timer = FitTimer('JointEstimator')
+        problems, estimates = [], []
+        with timer.phase('prepare'):
+            for estimator in self.estimators.values():
+                # A point fit validates the data, prepares the problem and gives the point estimates
+                point = copy.copy(estimator)
+                point.se, point.info = False, {}
+                point.fit()
+                problems.append(point._problem)
+                estimates.append(point.info['qte'])
+        problem = JointProblem(problems)
+        self._problem = problem
+        estimate = np.concatenate(estimates)
+
+        self.info = {'estimators': list(self.estimators), 'iters': None, 'converged': None}
+        draws = None
+        if self.se:
+            batch_size = budget_batch_size(problem, self.batch_size, self.memory_budget_mb, self.n_jobs)
+            seed = root_seed(self.seed)
+            draws, converged = bootstrap_draws(problem, iters=self.iters, batch_size=batch_size,
+                                               adaptive=self.adaptive, tol=self.adaptive_tol, alp=self.alp,
+                                               n_jobs=self.n_jobs, boot_weights=self.boot_weights, seed=seed,
+                                               timer=timer, draws_path=self.draws_path)
+            self.info.update({'iters': len(draws), 'converged': converged, 'batch_size': batch_size,
+                              'boot_seed': seed})
+            if self.draws_path is not None:
+                self.info['draws_path'] = self.draws_path
+        self.draws = draws
+
+        offsets = np.cumsum([0] + problem.sizes())
+        for (name, estimator), sub, start, stop in zip(self.estimators.items(), problems, offsets[:-1],
+                                                       offsets[1:]):
+            info = _point_info(sub, estimate[start:stop])
+            if draws is not None:
+                _add_bootstrap_intervals(info, estimate[start:stop], draws[:, start:stop], self.alp, self.uniform)
+                info.update({k: self.info[k] for k in ('converged', 'batch_size', 'boot_seed')})
+            estimator.info = info
+            estimator._problem = sub
+            # `at` and `to_result` replay the replicates with the estimator's own options
+            for option in ('alp', 'n_jobs', 'boot_weights', 'uniform'):
+                if hasattr(estimator, option):
+                    setattr(estimator, option, getattr(self, option))
+        self.info['timings'] = timer.finish()
+
+    def _columns(self, name):
+        if not self.info:
+            raise ValueError("Model has not been fitted yet. Call `fit()` first.")
+        if name not in self.estimators:
+            raise KeyError(f"Unknown estimator '{name}'; the estimators are {list(self.estimators)}.")
+        offsets = np.cumsum([0] + self._problem.sizes())
+        index = list(self.estimators).index(name)
+        return slice(offsets[index], offsets[index + 1])
+
+    def difference(self, first, second):
+        """
+        Estimate the difference between two estimators, with joint bootstrap inference.
+
+        Parameters:
+        -----------
+        first, second : str
+            The names of the estimators; both must be evaluated at the same quantiles.
+
+        Returns:
+        --------
+        difference : pandas.DataFrame
+            The quantiles, the difference `first - second`, its bootstrap
+            standard error, confidence bounds and the two-sided p-value of a
+            zero difference.
+        """
+        a, b = self._columns(first), self._columns(second)
+        info_a, info_b = self.estimators[first].info, self.estimators[second].info
+        if len(info_a['qte']) != len(info_b['qte']) or not np.allclose(info_a['probs'], info_b['probs']):
+            raise ValueError(f"'{first}' and '{second}' must be evaluated at the same quantiles.")
+        estimate = info_a['qte'] - info_b['qte']
+        df = pd.DataFrame({'Quantile': np.resize(info_a['probs'], len(estimate)), 'Difference': estimate})
+        if self.draws is None:
+            return df
+        std_err = np.nanstd(self.draws[:, a] - self.draws[:, b], axis=0, ddof=1)
+        z = norm.ppf(1 - self.alp / 2)
+        df['Std. Error'] = std_err
+        df['Lower Bound'] = estimate - z * std_err
+        df['Upper Bound'] = estimate + z * std_err
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df['p-value'] = 2 * norm.sf(np.abs(estimate / std_err))
+        return df
+
+    def get_results(self):
+        """Creates a long pandas DataFrame with the results of every estimator."""
+        frames = []
+        for name, estimator in self.estimators.items():
+            info = estimator.info
+            df = pd.DataFrame({'Estimator': name, 'Quantile': np.resize(info['probs'], len(info['qte'])),
+                               'QTE': info['qte']})
+            if info['qte.lower'] is not None:
+                df['QTE Lower Bound'] = info['qte.lower']
+                df['QTE Upper Bound'] = info['qte.upper']
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True)
+
+    def summary(self):
+        if not self.info:
+            raise ValueError("Model has not been fitted yet. Call `fit()` before calling `summary()`.")
+        summary = self.get_results()
+        print(summary)
+        return summary
@@ -0,0 +1,223 @@
+# kernels.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # The compiled kernels are optional
+    numba = None
+
+# Shrink quantile targets by a relative epsilon so that p * total landing
+# exactly on a cumulative weight selects that observation (R's type 1 quantile)
+TARGET_EPS = 1e-12
+
+# Row blocks are only spread over threads above this many weights
+MIN_PARALLEL_SIZE = 1 << 16
+
+_config = {'enabled': True, 'n_threads': 1}
+_pool = {}
+
+
+def configure_kernels(enabled=True, n_threads=1):
+    """
+    Configure the compiled kernels of the native engine.
+
+    Parameters:
+    -----------
+    enabled : bool, optional (default=True)
+        Use the Numba kernels when Numba is installed. Otherwise, or when
+        disabled, the NumPy implementations are used; both give identical
+        results.
+    n_threads : int, optional (default=1)
+        The number of threads evaluating blocks of bootstrap replicates. The
+        compiled kernels release the GIL, so threads run in parallel; None uses
+        every CPU. Combine with `n_jobs` > 1 with care, as each worker process
+        starts its own threads.
+    """
+    _config['enabled'] = enabled
+    _config['n_threads'] = (os.cpu_count() or 1) if n_threads is None else max(1, int(n_threads))
+    executor = _pool.pop('executor', None)
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def compiled():
+    """Whether the compiled kernels are available and enabled."""
+    return numba is not None and _config['enabled']
+
+
+def _quantiles_numpy(y, W, probs, out, start, stop):
+    for b in range(start, stop):
+        # Accumulate in float64 one row at a time, also for float32 weights
+        cw = np.cumsum(W[b], dtype=np.float64)
+        total = cw[-1]
+        if total <= 0:
+            continue
+        idx = np.searchsorted(cw, probs[b] * total * (1 - TARGET_EPS), side='left')
+        out[b] = y[np.minimum(idx, len(y) - 1)]
+
+
+def _cdf_numpy(y, W, x, out, start, stop):
+    pos = np.searchsorted(y, x[start:stop], side='right')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for b in range(start, stop):
+            cw = np.concatenate([[0.0], np.cumsum(W[b], dtype=np.float64)])
+            out[b] = cw[pos[b - start]] / cw[-1]
+
+
+def _ranks_numpy(y, W, pos, out, start, stop):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for b in range(start, stop):
+            cw = np.concatenate([[0.0], np.cumsum(W[b], dtype=np.float64)])
+            out[b] = cw[pos] / cw[-1]
+
+
+if numba is not None:
+    @numba.njit(nogil=True, cache=True)
+    def _quantiles_compiled(y, W, probs, out, start, stop):
+        m = W.shape[1]
+        cw = np.empty(m)
+        for b in range(start, stop):
+            # One pass accumulates the weights; each target is then a binary search
+            total = 0.0
+            for i in range(m):
+                total += np.float64(W[b, i])
+                cw[i] = total
+            if total <= 0:
+                continue
+            for j in range(probs.shape[1]):
+                target = probs[b, j] * total * (1 - TARGET_EPS)
+                # NaN targets sort last, as in numpy.searchsorted
+                low, high = (m, m) if np.isnan(target) else (0, m)
+                while low < high:
+                    mid = (low + high) // 2
+                    if cw[mid] < target:
+                        low = mid + 1
+                    else:
+                        high = mid
+                out[b, j] = y[min(low, m - 1)]
+
+    @numba.njit(nogil=True, cache=True)
+    def _cdf_compiled(y, W, x, out, start, stop):
+        m = W.shape[1]
+        cw = np.empty(m + 1)
+        cw[0] = 0.0
+        for b in range(start, stop):
+            total = 0.0
+            for i in range(m):
+                total += np.float64(W[b, i])
+                cw[i + 1] = total
+            for j in range(x.shape[1]):
+                # Number of outcomes less than or equal to x (all of them for NaN)
+                low, high = (m, m) if np.isnan(x[b, j]) else (0, m)
+                while low < high:
+                    mid = (low + high) // 2
+                    if y[mid] <= x[b, j]:
+                        low = mid + 1
+                    else:
+                        high = mid
+                out[b, j] = cw[low] / total if total != 0 else np.nan
+
+    @numba.njit(nogil=True, cache=True)
+    def _ranks_compiled(y, W, pos, out, start, stop):
+        m = W.shape[1]
+        cw = np.empty(m + 1)
+        cw[0] = 0.0
+        for b in range(start, stop):
+            total = 0.0
+            for i in range(m):
+                total += np.float64(W[b, i])
+                cw[i + 1] = total
+            for i in range(m):
+                out[b, i] = cw[pos[i]] / total if total != 0 else np.nan
+else:
+    _quantiles_compiled = _cdf_compiled = _ranks_compiled = None
+
+
+def _run(kernel, y, W, points, out):
+    """Apply a kernel to the rows of W, in blocks spread over the thread pool."""
+    rows = W.shape[0]
+    n_threads = min(_config['n_threads'], rows)
+    if n_threads <= 1 or W.size < MIN_PARALLEL_SIZE:
+        kernel(y, W, points, out, 0, rows)
+        return out
+    if 'executor' not in _pool:
+        _pool['executor'] = ThreadPoolExecutor(_config['n_threads'])
+    bounds = np.linspace(0, rows, n_threads + 1).astype(int)
+    futures = [_pool['executor'].submit(kernel, y, W, points, out, start, stop)
+               for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+    for future in futures:
+        future.result()
+    return out
+
+
+def weighted_quantiles(y, W, probs):
+    """
+    Invert the weighted ECDF of sorted outcomes for every row of a weight matrix.
+
+    Parameters:
+    -----------
+    y : numpy.ndarray
+        The sorted outcomes, shape (m,).
+    W : numpy.ndarray
+        The weights of the outcomes, shape (B, m).
+    probs : numpy.ndarray
+        The quantiles, shape (B, k).
+
+    Returns:
+    --------
+    quantiles : numpy.ndarray
+        The (B, k) quantiles; rows whose weights sum to zero are NaN.
+    """
+    out = np.full(probs.shape, np.nan)
+    if compiled():
+        return _run(_quantiles_compiled, np.ascontiguousarray(y), np.ascontiguousarray(W),
+                    np.ascontiguousarray(probs, dtype=np.float64), out)
+    return _run(_quantiles_numpy, y, W, probs, out)
+
+
+def weighted_cdf(y, W, x):
+    """
+    Evaluate the weighted ECDF of sorted outcomes at the points `x`, row by row.
+
+    Parameters:
+    -----------
+    y : numpy.ndarray
+        The sorted outcomes, shape (m,).
+    W : numpy.ndarray
+        The weights of the outcomes, shape (B, m).
+    x : numpy.ndarray
+        The evaluation points, shape (B, k).
+
+    Returns:
+    --------
+    cdf : numpy.ndarray
+        The (B, k) weighted share of outcomes less than or equal to `x`.
+    """
+    out = np.empty(x.shape)
+    if compiled():
+        return _run(_cdf_compiled, np.ascontiguousarray(y), np.ascontiguousarray(W),
+                    np.ascontiguousarray(x, dtype=np.float64), out)
+    return _run(_cdf_numpy, y, W, x, out)
+
+
+def weighted_ranks(y, W):
+    """
+    Evaluate the weighted ECDF of sorted outcomes at each of the outcomes.
+
+    Equals `weighted_cdf(y, W, y)` for every row, but the positions of the
+    ties are found once, so each row is a single pass over its weights.
+
+    Returns:
+    --------
+    ranks : numpy.ndarray
+        The (B, m) weighted share of outcomes less than or equal to each outcome.
+    """
+    pos = np.searchsorted(y, y, side='right')
+    out = np.empty(W.shape)
+    if compiled():
+        return _run(_ranks_compiled, np.ascontiguousarray(y), np.ascontiguousarray(W), pos, out)
+    return _run(_ranks_numpy, y, W, pos, out)
@@ -1,3 +1,4 @@
+import copy
 import pandas as pd
 import numpy as np
 import rpy2.robjects as ro
@@ -5,6 +6,13 @@ from rpy2.robjects import pandas2ri
 from rpy2.robjects.packages import importr
 from rpy2.robjects import Formula
 import matplotlib.pyplot as plt
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine, grouped_results
+from .bootstrap import fit_native, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
 
 # Activate automatic conversion of pandas DataFrames to R data.frames
 pandas2ri.activate()
@@ -14,7 +22,11 @@ qte = importr('qte')
 
 class MDiDEstimator:
    
-    def __init__(self, formula, data, t, tmin1, idname, tname, probs=[0.05, 0.95, 0.05], se=True, iters=100, xformla=None, panel=False, alp=0.05, retEachIter=False):
+    def __init__(self, formula, data, t, tmin1, idname, tname, probs=[0.05, 0.95, 0.05], se=True, iters=100, xformla=None, panel=False, alp=0.05, retEachIter=False,
+                 engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False,
+                 low_memory=False, memory_budget_mb=None, by=None, seed=None, draws_path=None,
+                 bins=None):
         self.formula = formula
         self.data = data
         self.t = t
@@ -28,11 +40,54 @@ class MDiDEstimator:
         self.panel = panel
         self.alp = alp
         self.retEachIter = retEachIter
+        check_engine(engine, adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, by=by, draws_path=draws_path, bins=bins)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.bins = bins
+        self.by = by
+        self.uniform = uniform
         self.result = None
+        self.info = {}
+        self._problem = None
 
     def fit(self):
+        timer = FitTimer('MDiDEstimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('mdid', self.data, self.formula, xformla=self.xformla, t=self.t, tmin1=self.tmin1,
+                          tname=self.tname, idname=self.idname, panel=self.panel, by=self.by,
+                          balanced=self.engine == 'r', engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                problem = build_problem('mdid', self.data, self.formula, self.probs, xformla=self.xformla,
+                                        t=self.t, tmin1=self.tmin1, tname=self.tname,
+                                        idname=self.idname, panel=self.panel,
+                                        low_memory=self.low_memory, by=self.by, bins=self.bins)
+            self._problem = problem
+            self.info = fit_native(problem, se=self.se, iters=self.iters, alp=self.alp,
+                                   adaptive=self.adaptive, adaptive_tol=self.adaptive_tol,
+                                   batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                   boot_weights=self.boot_weights, uniform=self.uniform,
+                                   memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                   draws_path=self.draws_path, timer=timer)
+            self.info['timings'] = timer.finish()
+            return
+
         r_formula = Formula(self.formula)
-        r_data = pandas2ri.py2rpy(self.data)
+        with timer.phase('py2rpy', rows=rows):
+            r_data = pandas2ri.py2rpy(self.data)
         
         additional_args = {
             't': self.t,
@@ -51,33 +106,68 @@ class MDiDEstimator:
             r_xformla = Formula(self.xformla)
             additional_args['xformla'] = r_xformla
         
-        self.result = qte.MDiD(
-            formla=r_formula,
-            data=r_data,
-            **additional_args
-        )
+        if self.seed is not None:
+            set_r_seed(self.seed)
+        with timer.phase('r_call', rows=rows):
+            self.result = qte.MDiD(
+                formla=r_formula,
+                data=r_data,
+                **additional_args
+            )
+
+        with timer.phase('extract_info', rows=len(self.probs)):
+            self._extract_info()
+        self.info['timings'] = timer.finish()
+
+    def _extract_info(self):
+        self.info['qte'] = np.array(self.result.rx2('qte'))
+        self.info['probs'] = np.array(self.probs)
+
+        if self.se and 'qte.lower' in self.result.names and 'qte.upper' in self.result.names:
+            self.info['qte.lower'] = np.array(self.result.rx2('qte.lower'))
+            self.info['qte.upper'] = np.array(self.result.rx2('qte.upper'))
+        else:
+            self.info['qte.lower'] = None
+            self.info['qte.upper'] = None
 
     def summary(self):
-        if self.result is None:
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `summary()`.")
+        if self.engine == 'native':
+            summary = self.get_results()
+            print(summary)
+            return summary
         summary = ro.r.summary(self.result)
         print(summary)
         return summary
 
-    def plot(self):
-        if self.result is None:
+    def plot(self, path=None):
+        """
+        Plot the MDiD estimates with confidence intervals, if available.
+
+        Parameters:
+        -----------
+        path : str, optional
+            Save the plot to this file (PNG, SVG, PDF, ...) with a
+            non-interactive backend instead of showing it.
+        """
+        if path is not None:
+            return save_plot(self.to_result(), path, name='MDiD',
+                             title='Median Difference-in-Differences (MDiD) Estimates')
+
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `plot()`.")
         
-        tau = np.array(self.probs)
-        mdid = np.array(self.result.rx2('qte'))
+        tau = self.info['probs']
+        mdid = self.info['qte']
 
         plt.figure(figsize=(10, 6))
         plt.plot(tau, mdid, 'o-', label="MDiD")
 
         if self.se:
-            if 'qte.lower' in self.result.names and 'qte.upper' in self.result.names:
-                lower_bound = np.array(self.result.rx2('qte.lower'))
-                upper_bound = np.array(self.result.rx2('qte.upper'))
+            if self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
+                lower_bound = self.info['qte.lower']
+                upper_bound = self.info['qte.upper']
                 if np.issubdtype(lower_bound.dtype, np.number) and np.issubdtype(upper_bound.dtype, np.number):
                     plt.fill_between(tau, lower_bound, upper_bound, color='gray', alpha=0.2, label="95% CI")
                 else:
@@ -93,21 +183,64 @@ class MDiDEstimator:
         plt.grid(True)
         plt.show()
 
+    def at(self, probs):
+        """
+        Re-evaluate a native fit at new quantiles without refitting.
+
+        The fit keeps its sorted samples and bootstrap seeds, so this only
+        inverts the ECDFs at `probs` and replays the same replicates.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : MDiDEstimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        if self._problem is None:
+            raise ValueError("`at` requires a fit with engine='native'.")
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, alp=self.alp, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('MDiDEstimator', self.info, replicates)
+
     def get_results(self):
         """
         Returns the results as a pandas DataFrame for further analysis.
         """
-        if self.result is None:
+        if self.by is not None:
+            return grouped_results(self.info, 'MDiD')
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `get_results()`.")
 
         data = {
-            'Quantile': np.array(self.probs),
-            'MDiD': np.array(self.result.rx2('qte'))
+            'Quantile': self.info['probs'],
+            'MDiD': self.info['qte']
         }
         
-        if self.se and 'qte.lower' in self.result.names and 'qte.upper' in self.result.names:
-            data['MDiD Lower Bound'] = np.array(self.result.rx2('qte.lower'))
-            data['MDiD Upper Bound'] = np.array(self.result.rx2('qte.upper'))
+        if self.se and self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
+            data['MDiD Lower Bound'] = self.info['qte.lower']
+            data['MDiD Upper Bound'] = self.info['qte.upper']
+        if 'qte.band.lower' in self.info:
+            data['MDiD Uniform Lower Bound'] = self.info['qte.band.lower']
+            data['MDiD Uniform Upper Bound'] = self.info['qte.band.upper']
 
         return pd.DataFrame(data)
 
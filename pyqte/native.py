@@ -0,0 +1,1264 @@
+# native.py
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from .bootstrap import BOOT_WEIGHTS
+from .density import effective_size, quantile_variance
+from . import formula as _formula
+from . import kernels as _kernels
+from .propensity import fit_logit, logit_scores, propensity_model
+
+# See `pyqte.kernels.TARGET_EPS`
+_TARGET_EPS = _kernels.TARGET_EPS
+
+
+def check_engine(engine, adaptive=False, boot_weights='multinomial', uniform=False, low_memory=False,
+                 memory_budget_mb=None, by=None, draws_path=None, bins=None):
+    """Validate the `engine` and bootstrap arguments of an estimator."""
+    if engine not in ('r', 'native'):
+        raise ValueError(f"`engine` must be 'r' or 'native', not '{engine}'.")
+    if adaptive and engine != 'native':
+        raise ValueError("The adaptive bootstrap requires engine='native'.")
+    if boot_weights not in BOOT_WEIGHTS:
+        raise ValueError(f"`boot_weights` must be one of {BOOT_WEIGHTS}, not '{boot_weights}'.")
+    if (boot_weights != 'multinomial' or uniform) and engine != 'native':
+        raise ValueError("Multiplier weights and uniform bands require engine='native'.")
+    if (low_memory or memory_budget_mb is not None) and engine != 'native':
+        raise ValueError("The low-memory mode and memory budget require engine='native'.")
+    if by is not None and engine != 'native':
+        raise ValueError("Grouped estimation with `by` requires engine='native'.")
+    if draws_path is not None and engine != 'native':
+        raise ValueError("Storing the bootstrap draws with `draws_path` requires engine='native'.")
+    if bins is not None and engine != 'native':
+        raise ValueError("The binned approximation with `bins` requires engine='native'.")
+
+
+def check_se_method(se_method, engine, uniform=False):
+    """Validate the `se_method` argument of an estimator."""
+    if se_method not in ('bootstrap', 'analytic'):
+        raise ValueError(f"`se_method` must be 'bootstrap' or 'analytic', not '{se_method}'.")
+    if se_method == 'analytic' and engine != 'native':
+        raise ValueError("Analytic standard errors require engine='native'.")
+    if se_method == 'analytic' and uniform:
+        raise ValueError("Uniform bands require se_method='bootstrap'.")
+
+
+def parse_formula(formula):
+    """
+    Split a formula of the form 'y ~ treat' into its outcome and treatment.
+
+    Parameters:
+    -----------
+    formula : str
+        The formula used by the estimators.
+
+    Returns:
+    --------
+    outcome, treatment : str
+        The names of the outcome and treatment columns.
+    """
+    parsed = _formula.parse_formula(str(formula))
+    if parsed.outcome is None or len(parsed.terms) != 1 or len(parsed.terms[0]) != 1:
+        raise ValueError(f"`formula` must have the form 'outcome ~ treatment', not '{formula}'; "
+                         "pass covariates through `xformla`.")
+    return parsed.outcome, parsed.terms[0][0].name
+
+
+def parse_xformla(xformla):
+    """
+    Return the covariate names of a formula of the form '~ x1 + x2'.
+
+    Parameters:
+    -----------
+    xformla : str
+        The covariate formula.
+
+    Returns:
+    --------
+    covariates : list of str
+        The names of the covariate columns.
+    """
+    return _formula.parse_formula(str(xformla)).variables
+
+
+def covariate_matrix(data, xformla):
+    """Return the (cached) covariate design matrix of `xformla`, see `pyqte.formula.design_matrix`."""
+    return _formula.design_matrix(data, str(xformla)).X
+
+
+def cell_quantiles(y, W, probs):
+    """
+    Invert the weighted ECDFs of one cell for every row of a weight matrix.
+
+    Parameters:
+    -----------
+    y : numpy.ndarray
+        The sorted outcomes of the cell, shape (m,).
+    W : numpy.ndarray
+        The weights of the cell's observations in the same order, shape (B, m).
+    probs : numpy.ndarray
+        The quantiles to evaluate, shape (k,) or (B, k).
+
+    Returns:
+    --------
+    quantiles : numpy.ndarray
+        The smallest outcome whose weighted ECDF reaches each prob, shape (B, k).
+        Rows whose weights sum to zero are NaN.
+    """
+    probs = np.broadcast_to(probs, (W.shape[0], np.shape(probs)[-1]))
+    return _kernels.weighted_quantiles(y, W, probs)
+
+
+def cell_cdf(y, W, x):
+    """
+    Evaluate the weighted ECDFs of one cell at the points `x`.
+
+    Parameters:
+    -----------
+    y : numpy.ndarray
+        The sorted outcomes of the cell, shape (m,).
+    W : numpy.ndarray
+        The weights of the cell's observations in the same order, shape (B, m).
+    x : numpy.ndarray
+        The evaluation points, shape (B, k).
+
+    Returns:
+    --------
+    cdf : numpy.ndarray
+        The weighted share of observations less than or equal to `x`, shape (B, k).
+    """
+    return _kernels.weighted_cdf(y, W, np.broadcast_to(x, (W.shape[0], np.shape(x)[-1])))
+
+
+def _cell_means(y, W):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (W @ y.astype(W.dtype)) / W.sum(axis=1, dtype=np.float64)
+
+
+class _Cell:
+    """The observations of one group/period cell, sorted by outcome."""
+
+    def __init__(self, y, mask):
+        index = np.flatnonzero(mask)
+        order = np.argsort(y[index], kind='stable')
+        self.index = index[order]
+        self.y = y[self.index]
+        self.starts = None
+
+    def compact(self, collapse=False):
+        """
+        Store the index as int32 and, with `collapse`, each distinct outcome once.
+
+        Collapsed cells keep the distinct values in `y` and their first positions
+        in `starts`; `weights` then sums the weights of each run of ties, so the
+        ECDFs are evaluated on one column per distinct value with the same result.
+        """
+        self.index = self.index.astype(np.int32)
+        if collapse and len(self.y) and self.starts is None:
+            self.y, self.starts = np.unique(self.y, return_index=True)
+
+    def weights(self, W):
+        W = W[:, self.index]
+        if self.starts is None:
+            return W
+        return np.add.reduceat(W, self.starts, axis=1)
+
+
+class NativeProblem:
+    """
+    The data of a native estimator, prepared once and evaluated per weight vector.
+
+    Every estimator is written in terms of the weighted ECDFs of its cells so that
+    bootstrap replicates only need a new weight vector over the `n` resampling
+    units instead of a resampled copy of the data.
+    """
+
+    # The weights are cast to this type (see `compact`)
+    dtype = np.float64
+    # Stratum code of every unit for the multinomial bootstrap, and the labels
+    # of the groups of a grouped problem
+    strata = None
+    labels = None
+    # Digest of the labels of the resampling units (see `unit_key`), so that
+    # problems sharing their replicates can check they resample the same units
+    units = None
+    # Number of units merged into each resampling unit of a binned problem
+    # (see `BinnedProblem`), whose bootstrap weights are drawn from these counts
+    counts = None
+
+    def __init__(self, probs, n, sample_weights=None, unit_index=None):
+        self.probs = np.asarray(probs, dtype=float)
+        self.n = n
+        self.sample_weights = sample_weights
+        self.unit_index = unit_index
+
+    def statistic(self, W):
+        """Map a (B, n) matrix of unit weights to (B, k) estimates."""
+        W = np.atleast_2d(np.asarray(W, dtype=self.dtype))
+        if self.unit_index is not None:
+            # Cluster bootstrap: every observation inherits the weight of its id
+            W = W[:, self.unit_index]
+        if self.sample_weights is not None:
+            W = W * self.sample_weights.astype(self.dtype)
+        return self._statistic(W)
+
+    def compact(self):
+        """
+        Switch to the low-memory representation.
+
+        Weight matrices are held in float32 (quantiles still accumulate the
+        weights in float64), indices in int32, and cells whose observations
+        are never re-weighted individually store each distinct outcome once.
+        """
+        self.dtype = np.float32
+        for value in vars(self).values():
+            if isinstance(value, _Cell):
+                value.compact(self._collapsible())
+        if self.unit_index is not None:
+            self.unit_index = self.unit_index.astype(np.int32)
+        return self
+
+    def replicate_nbytes(self):
+        """Approximate working memory of one bootstrap replicate, in bytes."""
+        rows = self.n if self.unit_index is None else len(self.unit_index)
+        # The unit weights, their per-observation copy and the per-cell gathers
+        return 3 * rows * np.dtype(self.dtype).itemsize
+
+    def _collapsible(self):
+        return False
+
+    def estimate(self):
+        """Return the point estimate on the original sample."""
+        return self.statistic(np.ones((1, self.n)))[0]
+
+    def analytic_se(self):
+        """Return the asymptotic standard errors of the point estimate."""
+        raise NotImplementedError(f"Analytic standard errors are not available for {type(self).__name__}.")
+
+    def _statistic(self, W):
+        raise NotImplementedError
+
+
+class CrossSectionProblem(NativeProblem):
+    """Unconditional (Firpo) QTE and QTET, with propensity score re-weighting."""
+
+    def __init__(self, kind, y, d, probs, propensity=None, sample_weights=None):
+        super().__init__(probs, len(y), sample_weights)
+        self.kind = kind
+        self.d = d
+        self.propensity = propensity
+        self.treated = _Cell(y, d == 1)
+        self.control = _Cell(y, d == 0)
+
+    def _collapsible(self):
+        return self.propensity is None
+
+    def _arm_weights(self, W):
+        Wt, Wc = self.treated.weights(W), self.control.weights(W)
+        if self.propensity is not None:
+            Wt, Wc = Wt.copy(), Wc.copy()
+            for b in range(len(W)):
+                p = self.propensity.refit_scores(W[b])
+                if self.kind == 'qte':
+                    Wt[b] /= p[self.treated.index]
+                    Wc[b] /= 1 - p[self.control.index]
+                else:
+                    pc = p[self.control.index]
+                    Wc[b] *= pc / (1 - pc)
+        return Wt, Wc
+
+    def _statistic(self, W):
+        Wt, Wc = self._arm_weights(W)
+        return cell_quantiles(self.treated.y, Wt, self.probs) - cell_quantiles(self.control.y, Wc, self.probs)
+
+    def analytic_se(self):
+        """
+        Delta-method standard errors from kernel density estimates.
+
+        The two arms are independent, so the variance is the sum of their
+        quantile variances. With covariates the sample sizes are the effective
+        sizes of the propensity score weights, which ignores the estimation
+        error of the propensity score.
+        """
+        W = np.ones((1, self.n)) if self.sample_weights is None else self.sample_weights[None, :]
+        Wt, Wc = self._arm_weights(W)
+        variance = 0.0
+        for cell, w in ((self.treated, Wt[0]), (self.control, Wc[0])):
+            q = cell_quantiles(cell.y, w[None, :], self.probs)[0]
+            size = effective_size(w if cell.starts is None else W[0, cell.index])
+            variance = variance + quantile_variance(cell.y, w, q, self.probs, size)
+        return np.sqrt(variance)
+
+
+class TwoPeriodProblem(NativeProblem):
+    """
+    CiC, QDiD and MDiD from the treated/control cells of periods t and tmin1.
+
+    The kind 'att' gives the difference-in-differences of the cell means, used
+    by SpATT with repeated cross sections. For panel data, `unit_index` maps
+    each observation to its id, and the ids are the resampling units.
+    """
+
+    def __init__(self, kind, y, d, post, probs, sample_weights=None, unit_index=None):
+        n = len(y) if unit_index is None else int(unit_index.max()) + 1
+        super().__init__(probs, n, sample_weights, unit_index)
+        self.kind = kind
+        self.c11 = _Cell(y, (d == 1) & post)
+        self.c10 = _Cell(y, (d == 1) & ~post)
+        self.c01 = _Cell(y, (d == 0) & post)
+        self.c00 = _Cell(y, (d == 0) & ~post)
+
+    def _collapsible(self):
+        return True
+
+    def _statistic(self, W):
+        W11, W10 = self.c11.weights(W), self.c10.weights(W)
+        W01, W00 = self.c01.weights(W), self.c00.weights(W)
+        if self.kind == 'att':
+            att = (_cell_means(self.c11.y, W11) - _cell_means(self.c10.y, W10)
+                   - _cell_means(self.c01.y, W01) + _cell_means(self.c00.y, W00))
+            return att[:, None]
+
+        q11 = cell_quantiles(self.c11.y, W11, self.probs)
+        q10 = cell_quantiles(self.c10.y, W10, self.probs)
+
+        if self.kind == 'cic':
+            u = cell_cdf(self.c00.y, W00, q10)
+            counterfactual = cell_quantiles(self.c01.y, W01, np.nan_to_num(u))
+        elif self.kind == 'qdid':
+            counterfactual = (q10 + cell_quantiles(self.c01.y, W01, self.probs)
+                              - cell_quantiles(self.c00.y, W00, self.probs))
+        else:
+            shift = _cell_means(self.c01.y, W01) - _cell_means(self.c00.y, W00)
+            counterfactual = q10 + shift[:, None]
+        return q11 - counterfactual
+
+    def analytic_se(self):
+        """
+        Delta-method standard errors of QDiD from kernel density estimates.
+
+        QDiD is a signed sum of the quantiles of four independent cells, so its
+        variance is the sum of their quantile variances.
+        """
+        if self.kind != 'qdid':
+            return super().analytic_se()
+        if self.unit_index is not None:
+            raise NotImplementedError("Analytic standard errors assume independent cells and are not "
+                                      "available for panel data.")
+        W = np.ones((1, self.n)) if self.sample_weights is None else self.sample_weights[None, :]
+        variance = 0.0
+        for cell in (self.c11, self.c10, self.c01, self.c00):
+            w = cell.weights(W)
+            q = cell_quantiles(cell.y, w, self.probs)[0]
+            size = effective_size(W[0, cell.index])
+            variance = variance + quantile_variance(cell.y, w[0], q, self.probs, size)
+        return np.sqrt(variance)
+
+
+class PanelCopulaProblem(NativeProblem):
+    """
+    Panel QTET (Callaway and Li) and DDID2 (Callaway, Li and Oka).
+
+    Both recover the counterfactual distribution of the treated from the
+    distribution of the change in outcomes of the control group and a copula
+    stability assumption, evaluated on the balanced panel of ids.
+    """
+
+    def __init__(self, kind, wide, d, probs, propensity=None, sample_weights=None):
+        super().__init__(probs, len(d), sample_weights)
+        self.kind = kind
+        self.d = d
+        self.propensity = propensity
+        treated, control = d == 1, d == 0
+        dy = wide['t'] - wide['tmin1']
+        self.yt = _Cell(wide['t'], treated)
+        self.dy_control = _Cell(dy, control)
+        self.ytmin1 = _Cell(wide['tmin1'], treated)
+        if kind == 'panel_qtet':
+            self.dy_treated = _Cell(wide['tmin1'] - wide['tmin2'], treated)
+            self.ytmin2 = _Cell(wide['tmin2'], treated)
+        else:
+            self.ytmin1_control = _Cell(wide['tmin1'], control)
+
+    def _ranks(self, cell, W):
+        # Weighted ECDF of a cell at each of its own observations, indexed by unit
+        ranks = np.zeros(W.shape, dtype=W.dtype)
+        Wcell = cell.weights(W)
+        ranks[:, cell.index] = _kernels.weighted_ranks(cell.y, Wcell)
+        return ranks
+
+    def _control_weights(self, W):
+        Wc = self.dy_control.weights(W)
+        if self.propensity is None:
+            return Wc
+        Wc = Wc.copy()
+        for b in range(len(W)):
+            p = self.propensity.refit_scores(W[b])[self.dy_control.index]
+            Wc[b] *= p / (1 - p)
+        return Wc
+
+    def _statistic(self, W):
+        Wc = self._control_weights(W)
+        W1 = self.ytmin1.weights(W)
+        q1 = cell_quantiles(self.yt.y, self.yt.weights(W), self.probs)
+        counterfactual_q = np.empty_like(q1)
+
+        if self.kind == 'panel_qtet':
+            # Copula of (dY_{t-1}, Y_{t-2}) among the treated carries over to period t
+            u_dy = self._ranks(self.dy_treated, W)
+            u_y2 = self._ranks(self.ytmin2, W)
+            units = self.ytmin1.index
+            for b in range(len(W)):
+                counterfactual = (cell_quantiles(self.dy_control.y, Wc[b:b + 1], u_dy[b:b + 1, units])
+                                  + cell_quantiles(self.ytmin1.y, W1[b:b + 1], u_y2[b:b + 1, units]))[0]
+                order = np.argsort(counterfactual, kind='stable')
+                counterfactual_q[b] = cell_quantiles(counterfactual[order], W1[b:b + 1, order], self.probs)[0]
+        else:
+            # Copula of (dY_t, Y_{t-1}) of the control group carries over to the treated
+            u = self._ranks(self.ytmin1_control, W)
+            units = self.dy_control.index
+            for b in range(len(W)):
+                counterfactual = self.dy_control.y + cell_quantiles(
+                    self.ytmin1.y, W1[b:b + 1], u[b:b + 1, units])[0]
+                order = np.argsort(counterfactual, kind='stable')
+                counterfactual_q[b] = cell_quantiles(counterfactual[order], Wc[b:b + 1, order], self.probs)[0]
+        return q1 - counterfactual_q
+
+
+class SpATTProblem(NativeProblem):
+    """The (propensity score re-weighted) difference-in-differences ATT."""
+
+    def __init__(self, dy, d, propensity=None, sample_weights=None):
+        super().__init__([0.5], len(d), sample_weights)
+        self.dy = dy
+        self.d = d
+        self.propensity = propensity
+
+    def _statistic(self, W):
+        treated, control = self.d == 1, self.d == 0
+        Wc = W[:, control].copy()
+        if self.propensity is not None:
+            for b in range(len(W)):
+                p = self.propensity.refit_scores(W[b])[control]
+                Wc[b] *= p / (1 - p)
+        att = _cell_means(self.dy[treated], W[:, treated]) - _cell_means(self.dy[control], Wc)
+        return att[:, None]
+
+
+class GroupedProblem(NativeProblem):
+    """
+    One estimator evaluated for every group of a `by` variable at once.
+
+    The observations are sorted once by (group, cell, outcome), so that every
+    group/cell pair is a contiguous segment. A single cumulative sum of the
+    weights over the whole sample then holds the ECDFs of all segments, and
+    the quantiles of every group are located by one `searchsorted` per
+    replicate. The groups are the bootstrap strata, so each one is resampled
+    separately as if it had been estimated on its own.
+
+    The estimates are laid out group by group, shape (B, groups * k).
+    """
+
+    def __init__(self, kind, y, d, group, labels, probs, post=None, sample_weights=None, unit_index=None):
+        n = len(y) if unit_index is None else int(unit_index.max()) + 1
+        super().__init__(probs, n, sample_weights, unit_index)
+        self.kind = kind
+        self.labels = labels
+        self.groups = len(labels)
+        # Cells: control/treated, or (d, post) pairs 00, 01, 10, 11 for two periods
+        self.cells = 2 if post is None else 4
+        cell = d.astype(np.int64) if post is None else 2 * d.astype(np.int64) + post
+        segment = group.astype(np.int64) * self.cells + cell
+        self.order = np.lexsort((y, segment))
+        self.y = y[self.order]
+        # Integer keys sorted like (segment, outcome) locate a value within a segment exactly
+        self.levels, ranks = np.unique(self.y, return_inverse=True)
+        self.key = segment[self.order] * len(self.levels) + ranks
+        self.bounds = np.searchsorted(segment[self.order], np.arange(self.groups * self.cells + 1))
+        if unit_index is None:
+            self.strata = group.astype(np.int64)
+        else:
+            self.strata = np.zeros(n, dtype=np.int64)
+            self.strata[unit_index] = group
+
+    def compact(self):
+        super().compact()
+        self.order = self.order.astype(np.int32)
+        return self
+
+    def _segments(self, cell):
+        segments = np.arange(self.groups) * self.cells + cell
+        return segments, self.bounds[segments], self.bounds[segments + 1]
+
+    def _quantiles(self, cw, cell, probs):
+        """Type-1 quantiles of one cell in every group, shape (groups, k)."""
+        _, start, end = self._segments(cell)
+        base, total = cw[start], cw[end] - cw[start]
+        targets = base[:, None] + probs * total[:, None] * (1 - _TARGET_EPS)
+        idx = np.searchsorted(cw[1:], targets, side='left')
+        idx = np.clip(idx, start[:, None], np.maximum(end - 1, start)[:, None])
+        out = self.y[np.minimum(idx, len(self.y) - 1)]
+        return np.where((total > 0)[:, None], out, np.nan)
+
+    def _cdf(self, cw, cell, x):
+        """ECDFs of one cell in every group at the points `x`, shape (groups, k)."""
+        segments, start, end = self._segments(cell)
+        below = np.searchsorted(self.levels, x, side='right')
+        pos = np.searchsorted(self.key, segments[:, None] * len(self.levels) + below - 1, side='right')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (cw[pos] - cw[start][:, None]) / (cw[end] - cw[start])[:, None]
+
+    def _means(self, cw, cwy, cell):
+        _, start, end = self._segments(cell)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (cwy[end] - cwy[start]) / (cw[end] - cw[start])
+
+    def _statistic(self, W):
+        out = np.empty((W.shape[0], self.groups, len(self.probs)))
+        cw = np.zeros(len(self.y) + 1)
+        for b in range(W.shape[0]):
+            w = W[b, self.order]
+            np.cumsum(w, dtype=np.float64, out=cw[1:])
+            if self.kind in ('qte', 'qtet'):
+                out[b] = self._quantiles(cw, 1, self.probs) - self._quantiles(cw, 0, self.probs)
+                continue
+            q11, q10 = self._quantiles(cw, 3, self.probs), self._quantiles(cw, 2, self.probs)
+            if self.kind == 'cic':
+                u = np.nan_to_num(self._cdf(cw, 0, q10))
+                counterfactual = self._quantiles(cw, 1, u)
+            elif self.kind == 'qdid':
+                counterfactual = q10 + self._quantiles(cw, 1, self.probs) - self._quantiles(cw, 0, self.probs)
+            else:
+                cwy = np.concatenate([[0.0], np.cumsum(w * self.y, dtype=np.float64)])
+                shift = self._means(cw, cwy, 1) - self._means(cw, cwy, 0)
+                counterfactual = q10 + shift[:, None]
+            out[b] = q11 - counterfactual
+        return out.reshape(W.shape[0], -1)
+
+
+class StaggeredProblem(NativeProblem):
+    """
+    Group-time quantile effects of a staggered adoption, with their aggregations.
+
+    Units adopting the treatment in the same period form a cohort. The effect
+    of cohort g in period t is a two-period estimator ('cic', 'qdid' or
+    'mdid') comparing the cohort with the comparison units between t and the
+    period before adoption. Every period is sorted once by outcome; a
+    replicate then scatters the unit weights into one row per cohort and a
+    cumulative sum gives the ECDFs of all cohorts in that period, and the
+    ECDFs of the comparison groups (sets of cohorts) are suffix sums of these
+    rows. All group-time cells are therefore evaluated in one pass over the
+    periods.
+
+    The estimates are laid out as the group-time cells, then the event-time
+    aggregates and the overall QTT, each with one row of `labels` and `k`
+    quantiles. The aggregates are averages of the cell effects weighted by
+    the (replicate) size of each cohort, so they share the bootstrap of the
+    cells.
+    """
+
+    def __init__(self, kind, Y, adoption, probs, control_group='nevertreated', periods=None, sample_weights=None):
+        n, P = Y.shape
+        super().__init__(probs, n, sample_weights)
+        self.kind = kind
+        # Cohorts are coded 0..G-1 by adoption period; code G marks the never treated
+        self.adoption = np.unique(adoption[adoption < P])
+        G = len(self.adoption)
+        code = np.where(adoption < P, np.searchsorted(self.adoption, np.minimum(adoption, P - 1)), G)
+        self.order = np.argsort(Y, axis=0, kind='stable').T
+        self.ys = np.take_along_axis(Y.T, self.order, axis=1)
+        self.codes = code[self.order]
+
+        counts = np.bincount(code, minlength=G + 1)
+        # Units of the comparison rows j..G, see `_statistic`
+        available = np.cumsum(counts[::-1])[::-1]
+        cells = []
+        for g, a in enumerate(self.adoption):
+            for t in range(P):
+                if t == a - 1:
+                    continue
+                j = G if control_group == 'nevertreated' else int(np.searchsorted(self.adoption, max(t, a), 'right'))
+                if available[j] > 0:
+                    cells.append((g, t, a - 1, j, t - a))
+        if not cells:
+            raise ValueError("No cohort has a comparison group; with control_group='nevertreated' the data "
+                             "must contain never-treated units.")
+        self.cell_g, self.cell_t, self.cell_base, self.cell_j, self.cell_event = (np.array(c) for c in zip(*cells))
+        self.events = np.unique(self.cell_event)
+
+        periods = np.arange(P) if periods is None else np.asarray(periods)
+        gt = pd.DataFrame({'Aggregation': 'group-time', 'Cohort': periods[self.adoption[self.cell_g]],
+                           'Period': periods[self.cell_t], 'Event Time': self.cell_event})
+        event = pd.DataFrame({'Aggregation': 'event-time', 'Event Time': self.events})
+        self.labels = pd.concat([gt, event, pd.DataFrame({'Aggregation': ['overall']})], ignore_index=True)
+
+    def compact(self):
+        self.dtype = np.float32
+        self.order = self.order.astype(np.int32)
+        return self
+
+    def replicate_nbytes(self):
+        # The per-cohort weights, their cumulative sums and the comparison suffix sums of one period
+        return (3 * (len(self.adoption) + 1) + 2) * (self.n + 1) * np.dtype(np.float64).itemsize
+
+    def _ecdfs(self, w, p):
+        """The cumulative weights of every cohort in period `p` and their suffix sums over cohorts."""
+        rows = np.zeros((len(self.adoption) + 1, self.n + 1))
+        rows[self.codes[p], np.arange(1, self.n + 1)] = w[self.order[p]]
+        sums = rows[:, 1:] @ self.ys[p] if self.kind == 'mdid' else None
+        np.cumsum(rows, axis=1, out=rows)
+        suffix = np.cumsum(rows[::-1], axis=0)[::-1]
+        return rows, suffix, sums
+
+    def _quantiles(self, cw, p, probs):
+        """Type-1 quantiles of the units with cumulative weights `cw` in period `p`."""
+        total = cw[-1]
+        if not total > 0:
+            return np.full(np.shape(probs), np.nan)
+        targets = probs * total * (1 - _TARGET_EPS)
+        # A zero target falls on the first unit with weight, which may not be the first sorted unit
+        idx = np.where(targets > 0, np.searchsorted(cw[1:], targets, side='left'),
+                       np.searchsorted(cw[1:], 0.0, side='right'))
+        return self.ys[p][np.minimum(idx, self.n - 1)]
+
+    def _cdf(self, cw, p, x):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return cw[np.searchsorted(self.ys[p], x, side='right')] / cw[-1]
+
+    def _statistic(self, W):
+        G, P, k = len(self.adoption), self.ys.shape[0], len(self.probs)
+        cells = np.arange(len(self.cell_g))
+        out = np.empty((W.shape[0], len(self.labels), k))
+        for b in range(W.shape[0]):
+            w = W[b].astype(np.float64)
+            treated = np.full((G, P, k), np.nan)
+            control = np.full((G + 1, P, k), np.nan)
+            means = np.full((G + 1, P), np.nan)
+            counterfactual = np.full((len(cells), k), np.nan)
+            u = np.zeros((len(cells), k))
+            if self.kind == 'cic':
+                # The ranks of the treated in the control group are taken in the base periods first
+                for p in np.unique(self.cell_base):
+                    rows, suffix, _ = self._ecdfs(w, p)
+                    for c in cells[self.cell_base == p]:
+                        q10 = self._quantiles(rows[self.cell_g[c]], p, self.probs)
+                        u[c] = np.nan_to_num(self._cdf(suffix[self.cell_j[c]], p, q10))
+            for p in range(P):
+                rows, suffix, sums = self._ecdfs(w, p)
+                if p == 0:
+                    mass = rows[:G, -1]
+                for g in range(G):
+                    treated[g, p] = self._quantiles(rows[g], p, self.probs)
+                for j in np.unique(self.cell_j):
+                    if self.kind == 'qdid':
+                        control[j, p] = self._quantiles(suffix[j], p, self.probs)
+                    elif self.kind == 'mdid':
+                        with np.errstate(invalid='ignore', divide='ignore'):
+                            means[j, p] = sums[j:].sum() / suffix[j, -1]
+                if self.kind == 'cic':
+                    for c in cells[self.cell_t == p]:
+                        counterfactual[c] = self._quantiles(suffix[self.cell_j[c]], p, u[c])
+
+            g, t, base, j = self.cell_g, self.cell_t, self.cell_base, self.cell_j
+            if self.kind == 'qdid':
+                counterfactual = treated[g, base] + control[j, t] - control[j, base]
+            elif self.kind == 'mdid':
+                counterfactual = treated[g, base] + (means[j, t] - means[j, base])[:, None]
+            effects = treated[g, t] - counterfactual
+
+            # Cell weights proportional to the size of their cohort in this replicate
+            size = mass[g]
+            aggregate = np.zeros((len(self.events) + 1, len(cells)))
+            aggregate[np.searchsorted(self.events, self.cell_event), cells] = size
+            aggregate[-1] = np.where(self.cell_event >= 0, size, 0.0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                aggregate /= aggregate.sum(axis=1, keepdims=True)
+            out[b, :len(cells)] = effects
+            out[b, len(cells):] = aggregate @ effects
+        return out.reshape(W.shape[0], -1)
+
+
+def _bin_values(y, bins):
+    """
+    Group the sorted outcomes of a cell into at most about `bins` bins.
+
+    Values holding at least `1 / bins` of the observations (mass points, e.g.
+    zero earnings) get a bin of their own; the other values are grouped into
+    bins of about equal counts, never splitting a value. With no more
+    distinct values than `bins`, every value is its own bin.
+
+    Returns:
+    --------
+    code : numpy.ndarray
+        The bin of every observation, shape (m,).
+    lo, hi, mean : numpy.ndarray
+        The smallest, largest and mean outcome of every bin.
+    mass : numpy.ndarray
+        Whether each bin is a mass point.
+    """
+    values, first, counts = np.unique(y, return_index=True, return_counts=True)
+    if len(values) <= bins:
+        starts = np.ones(len(values), dtype=bool)
+        mass = np.zeros(len(values), dtype=bool)
+    else:
+        mass = counts >= len(y) / bins
+        rest = np.where(mass, 0, counts)
+        step = max(rest.sum() / max(bins - mass.sum(), 1), 1)
+        key = np.floor((np.cumsum(rest) - rest) / step)
+        starts = np.ones(len(values), dtype=bool)
+        starts[1:] = mass[1:] | mass[:-1] | (key[1:] != key[:-1])
+    bin_of_value = np.cumsum(starts) - 1
+    bounds = np.flatnonzero(starts)
+    lo = values[bounds]
+    hi = values[np.append(bounds[1:], len(values)) - 1]
+    mean = np.add.reduceat(values * counts, bounds) / np.add.reduceat(counts, bounds)
+    # y is sorted, so the run of each value starts at `first`
+    code = np.repeat(bin_of_value, np.diff(np.append(first, len(y))))
+    return code, lo, hi, mean, mass[bounds]
+
+
+class _BinnedCell:
+    """
+    The bins of one cell, and the categories of units falling in each of them.
+
+    `order` lists the categories with an observation in the cell, sorted by
+    bin, and `starts` the first position of every bin, so the weights of the
+    bins are one `np.add.reduceat` of the category weights.
+    """
+
+    def __init__(self, category_bins, lo, hi, mean, mass, size):
+        present = np.flatnonzero(category_bins >= 0)
+        order = np.argsort(category_bins[present], kind='stable')
+        self.order = present[order]
+        self.starts = np.searchsorted(category_bins[self.order], np.arange(len(lo)))
+        self.lo, self.hi, self.mean, self.mass = lo, hi, mean, mass
+        self.size = size
+
+    def weights(self, W):
+        return np.add.reduceat(W[:, self.order], self.starts, axis=1, dtype=np.float64)
+
+    def max_share(self):
+        """The largest share of the cell's observations in a bin holding several values."""
+        spread = self.hi > self.lo
+        return float(self.size[spread].max() / self.size.sum()) if spread.any() else 0.0
+
+    def bin_of(self, x):
+        """The last bin starting at or below `x` (-1 below the first bin)."""
+        return np.searchsorted(self.lo, x, side='right') - 1
+
+    def locate(self, cw, targets):
+        """The first bin whose cumulative weight `cw` reaches each target, as in `cell_quantiles`."""
+        idx = np.where(targets > 0, np.searchsorted(cw[1:], targets, side='left'),
+                       np.searchsorted(cw[1:], 0.0, side='right'))
+        return np.minimum(idx, len(self.lo) - 1)
+
+    def quantiles(self, Wb, probs):
+        """
+        Quantiles of the binned cell for every row of the bin weights `Wb`.
+
+        The bin reaching each prob is located as in `cell_quantiles`, and the
+        outcome is interpolated linearly between the bin's smallest and
+        largest value by the share of the bin's weight below the target.
+        """
+        probs = np.broadcast_to(probs, (Wb.shape[0], np.shape(probs)[-1]))
+        out = np.empty(probs.shape)
+        cw = np.zeros(Wb.shape[1] + 1)
+        for b in range(Wb.shape[0]):
+            np.cumsum(Wb[b], out=cw[1:])
+            total = cw[-1]
+            if not total > 0:
+                out[b] = np.nan
+                continue
+            targets = probs[b] * total * (1 - _TARGET_EPS)
+            idx = self.locate(cw, targets)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                frac = np.clip(np.nan_to_num((targets - cw[idx]) / Wb[b, idx]), 0, 1)
+            out[b] = self.lo[idx] + frac * (self.hi[idx] - self.lo[idx])
+        return out
+
+    def cdf(self, Wb, x):
+        """The binned ECDFs at the points `x`, interpolated linearly within each bin."""
+        x = np.broadcast_to(x, (Wb.shape[0], np.shape(x)[-1]))
+        cw = np.zeros((Wb.shape[0], Wb.shape[1] + 1))
+        np.cumsum(Wb, axis=1, out=cw[:, 1:])
+        j = self.bin_of(x)
+        inside = np.clip(j, 0, len(self.lo) - 1)
+        width = self.hi[inside] - self.lo[inside]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            part = np.where(width > 0, np.clip((x - self.lo[inside]) / width, 0, 1), 1.0)
+            below = np.take_along_axis(cw, inside, axis=1) + np.take_along_axis(Wb, inside, axis=1) * part
+            return np.where(j >= 0, below, 0.0) / cw[:, -1:]
+
+    def means(self, Wb):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (Wb @ self.mean) / Wb.sum(axis=1)
+
+
+class BinnedProblem(NativeProblem):
+    """
+    An approximation of a problem on binned outcomes, for very large samples.
+
+    The outcomes of every cell are binned once (see `_bin_values`): mass
+    points are kept exactly and the other values are grouped into bins of
+    about equal counts. Resampling units whose observations fall in the same
+    bins are interchangeable, so they are merged into categories, and a
+    bootstrap replicate only draws the weight of every category: multinomial
+    counts of the categories, or the Gamma-distributed sums of the Exp(1)
+    weights of their units. Each replicate therefore costs O(categories +
+    bins) instead of O(n log n), with the same distribution of weights as
+    resampling the units.
+
+    The ECDFs are exact at the bin edges and interpolated linearly within a
+    bin, so a quantile is off by at most the width of the bin holding it, and
+    an ECDF by at most the bin's share of the cell. The outcomes of a bin
+    enter a mean through the bin mean. Cells with no more distinct values
+    than `bins` are exact.
+
+    Supported for the problems without individual re-weighting: QTE and QTET
+    without covariates, and CiC, QDiD and MDiD, without sampling weights.
+    """
+
+    def __init__(self, problem, bins):
+        if (not isinstance(problem, (CrossSectionProblem, TwoPeriodProblem)) or problem.kind == 'att'
+                or getattr(problem, 'propensity', None) is not None):
+            raise NotImplementedError("Binning is only available for QTE and QTET without covariates, and for "
+                                      "CiC, QDiD and MDiD.")
+        if problem.sample_weights is not None:
+            raise NotImplementedError("Binning does not support sampling weights.")
+        if bins < 2:
+            raise ValueError("`bins` must be at least 2.")
+        names = [name for name, value in vars(problem).items() if isinstance(value, _Cell)]
+        units = lambda cell: cell.index if problem.unit_index is None else problem.unit_index[cell.index]
+        # One integer key per unit combining its bins in every cell (0 when it has no observation there)
+        key = np.zeros(problem.n, dtype=np.int64)
+        stride, binned = 1, []
+        for name in names:
+            cell = getattr(problem, name)
+            code, lo, hi, mean, mass = _bin_values(cell.y, bins)
+            key[units(cell)] += (code + 1) * stride
+            binned.append((name, stride, lo, hi, mean, mass, np.bincount(code, minlength=len(lo))))
+            stride *= len(lo) + 1
+            if stride >= 2 ** 62:
+                raise ValueError("Too many bins to combine the cells; lower `bins`.")
+        keys, counts = np.unique(key, return_counts=True)
+        # The exact point estimate, for the accuracy report of `fit_native`
+        self.reference = problem.estimate()
+
+        super().__init__(problem.probs, len(keys))
+        self.kind = problem.kind
+        self.bins = bins
+        self.counts = counts.astype(float)
+        self.names = names
+        for name, stride, lo, hi, mean, mass, size in binned:
+            setattr(self, name, _BinnedCell((keys // stride) % (len(lo) + 1) - 1, lo, hi, mean, mass, size))
+        self.units = None if problem.units is None else problem.units + unit_key(keys)
+
+    def compact(self):
+        self.dtype = np.float32
+        for name in self.names:
+            cell = getattr(self, name)
+            cell.order = cell.order.astype(np.int32)
+        return self
+
+    def estimate(self):
+        return self.statistic(self.counts[None, :])[0]
+
+    def error_bounds(self):
+        """
+        Bound the binning error of the point estimates.
+
+        Each quantile lies in the same bin as the exact quantile, so its error
+        is at most the width of that bin, and the bound of an estimate is the
+        sum over the quantiles entering it. The means of MDiD are exact at the
+        sample weights, since the bin means weighted by the bin sizes sum to
+        the outcomes. CiC composes an ECDF and a quantile, and its bound takes
+        the range of the counterfactual quantile over the ECDF values of the
+        bins holding the treated quantile.
+
+        Returns:
+        --------
+        bounds : numpy.ndarray
+            The largest possible difference from the exact estimate, shape (k,).
+        """
+        W = self.counts[None, :]
+
+        def cumulative(cell):
+            return np.concatenate([[0.0], np.cumsum(cell.weights(W)[0])])
+
+        def located(cell, probs):
+            cw = cumulative(cell)
+            return cell.locate(cw, probs * cw[-1] * (1 - _TARGET_EPS))
+
+        def width(cell, probs):
+            j = located(cell, probs)
+            return cell.hi[j] - cell.lo[j]
+
+        if self.kind in ('qte', 'qtet'):
+            return width(self.treated, self.probs) + width(self.control, self.probs)
+        bound = width(self.c11, self.probs) + width(self.c10, self.probs)
+        if self.kind == 'qdid':
+            return bound + width(self.c01, self.probs) + width(self.c00, self.probs)
+        if self.kind == 'mdid':
+            return bound
+        # CiC: the exact q10 lies in its bin, so F00(q10) lies between the cumulative weights
+        # of c00 before the bin holding its smallest and after the bin holding its largest value
+        j = located(self.c10, self.probs)
+        cw00 = cumulative(self.c00)
+        below, above = self.c00.bin_of(self.c10.lo[j]), self.c00.bin_of(self.c10.hi[j])
+        low = np.where(below >= 0, cw00[np.maximum(below, 0)], 0.0) / cw00[-1]
+        high = np.where(above >= 0, cw00[above + 1], 0.0) / cw00[-1]
+        # and the counterfactual between the quantiles of c01 at these ECDF values
+        first, last = located(self.c01, low), located(self.c01, high)
+        return bound + self.c01.hi[last] - self.c01.lo[first]
+
+    def _statistic(self, W):
+        cells = {name: getattr(self, name).weights(W) for name in self.names}
+        if self.kind in ('qte', 'qtet'):
+            return (self.treated.quantiles(cells['treated'], self.probs)
+                    - self.control.quantiles(cells['control'], self.probs))
+        q11 = self.c11.quantiles(cells['c11'], self.probs)
+        q10 = self.c10.quantiles(cells['c10'], self.probs)
+        if self.kind == 'cic':
+            u = self.c00.cdf(cells['c00'], q10)
+            counterfactual = self.c01.quantiles(cells['c01'], np.nan_to_num(u))
+        elif self.kind == 'qdid':
+            counterfactual = (q10 + self.c01.quantiles(cells['c01'], self.probs)
+                              - self.c00.quantiles(cells['c00'], self.probs))
+        else:
+            shift = self.c01.means(cells['c01']) - self.c00.means(cells['c00'])
+            counterfactual = q10 + shift[:, None]
+        return q11 - counterfactual
+
+
+class JointProblem(NativeProblem):
+    """
+    Several problems evaluated on the same bootstrap weights.
+
+    The problems must resample the same units (same number, labels and
+    strata). Every weight matrix is then drawn once and passed to each of
+    them, and their estimates are concatenated, shape (B, sum of the k).
+    """
+
+    def __init__(self, problems):
+        first = problems[0]
+        for problem in problems[1:]:
+            if (problem.n != first.n or problem.units != first.units
+                    or not _same_strata(problem.strata, first.strata)):
+                raise ValueError("Problems sharing their bootstrap replicates must resample the same units; "
+                                 "fit them on the same data, periods, `idname`, `panel` and `by`.")
+        super().__init__(np.concatenate([problem.probs for problem in problems]), first.n)
+        self.problems = list(problems)
+        self.strata = first.strata
+        self.units = first.units
+        self.counts = first.counts
+        # float32 weights only when every problem is compact
+        self.dtype = np.result_type(*[problem.dtype for problem in problems])
+
+    def compact(self):
+        for problem in self.problems:
+            problem.compact()
+        self.dtype = np.float32
+        return self
+
+    def replicate_nbytes(self):
+        return sum(problem.replicate_nbytes() for problem in self.problems)
+
+    def sizes(self):
+        """The number of estimates of every problem, in order."""
+        return [len(problem.probs) * (1 if problem.labels is None else len(problem.labels))
+                for problem in self.problems]
+
+    def _statistic(self, W):
+        return np.hstack([problem.statistic(W) for problem in self.problems])
+
+
+def _same_strata(a, b):
+    return (a is None and b is None) or (a is not None and b is not None and np.array_equal(a, b))
+
+
+def unit_key(labels):
+    """Digest of the labels of the resampling units (row labels or ids), in order."""
+    hashed = pd.util.hash_array(np.asarray(labels))
+    return hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+
+
+def _with_units(problem, labels):
+    problem.units = unit_key(labels)
+    return problem
+
+
+def grouped_results(info, name='QTE'):
+    """
+    Lay out the estimates of a grouped fit as a long table.
+
+    Parameters:
+    -----------
+    info : dict
+        The `info` of an estimator fitted with `by`.
+    name : str, optional (default='QTE')
+        The name of the estimate column, also prefixing the bound columns.
+
+    Returns:
+    --------
+    results : pandas.DataFrame
+        One row per group and quantile: the `by` columns, 'Quantile', the
+        estimate and, when available, its confidence bounds.
+    """
+    groups, probs = info['groups'], info['probs']
+    df = groups.loc[groups.index.repeat(len(probs))].reset_index(drop=True)
+    df['Quantile'] = np.tile(probs, len(groups))
+    df[name] = info['qte']
+    if info.get('qte.lower') is not None:
+        df[f'{name} Lower Bound'] = info['qte.lower']
+        df[f'{name} Upper Bound'] = info['qte.upper']
+    if 'qte.band.lower' in info:
+        df[f'{name} Uniform Lower Bound'] = info['qte.band.lower']
+        df[f'{name} Uniform Upper Bound'] = info['qte.band.upper']
+    return df
+
+
+def _group_codes(data, by):
+    """Code the groups of `by` (a column or list of columns) as 0..G-1, with their labels."""
+    by = [by] if isinstance(by, str) else list(by)
+    grouped = data.groupby(by, sort=True)
+    labels = grouped.size().index.to_frame(index=False)
+    return grouped.ngroup().to_numpy(), labels
+
+
+def _two_periods(data, formula, t, tmin1, tname):
+    outcome, treatment = parse_formula(formula)
+    data = data[data[tname].isin([t, tmin1])]
+    return data, outcome, treatment
+
+
+def _balanced_wide(data, outcome, treatment, tname, idname, periods, weights=None):
+    """Pivot the outcome to one row per id, keeping ids observed in all periods."""
+    subset = data[data[tname].isin(list(periods.values()))]
+    wide = subset.pivot(index=idname, columns=tname, values=outcome).dropna()
+    first = subset[subset[tname] == periods['t']]
+    if weights is not None:
+        # Ids carry the sampling weight of their period-t observation
+        weights = pd.Series(weights[data.index.get_indexer(first.index)], index=first[idname].to_numpy())
+        weights = weights.loc[wide.index].to_numpy()
+    first = first.set_index(idname).loc[wide.index]
+    arrays = {name: wide[period].to_numpy(dtype=float) for name, period in periods.items()}
+    return arrays, first[treatment].to_numpy(dtype=float), first, weights
+
+
+def _balanced_long(data, tname, idname, periods):
+    """Keep the observations of the ids observed in all periods, with their id codes."""
+    subset = data[data[tname].isin(periods)]
+    counts = subset.groupby(idname)[tname].nunique()
+    subset = subset[subset[idname].isin(counts.index[counts == len(periods)])]
+    return subset, pd.factorize(subset[idname])[0]
+
+
+def build_problem(kind, data, formula, probs, xformla=None, t=None, tmin1=None, tmin2=None,
+                  tname=None, idname=None, panel=False, method='logit', weights=None, low_memory=False, by=None,
+                  bins=None):
+    """
+    Prepare the native version of an estimator.
+
+    Parameters:
+    -----------
+    kind : str
+        One of 'qte', 'qtet', 'cic', 'qdid', 'mdid', 'panel_qtet', 'ddid2' or 'spatt'.
+    data : pandas.DataFrame
+        The dataset, in long format for the panel estimators.
+    formula : str
+        The formula 'outcome ~ treatment'.
+    probs : array-like
+        The quantiles at which to estimate the effects.
+    xformla, t, tmin1, tmin2, tname, idname, panel, method, weights :
+        As in the corresponding estimator class.
+    low_memory : bool, optional (default=False)
+        Use the compact representation of `NativeProblem.compact`.
+    by : str or list of str, optional
+        Estimate the effects of every group of these columns at once, see
+        `GroupedProblem`. Supported for 'qte', 'qtet', 'cic', 'qdid' and 'mdid'
+        without covariates.
+    bins : int, optional
+        Approximate the estimator on about this many bins of the outcomes of
+        every cell, see `BinnedProblem`.
+
+    Returns:
+    --------
+    problem : NativeProblem
+        The prepared problem, whose `estimate()` gives the point estimates.
+    """
+    if by is not None:
+        if bins is not None:
+            raise NotImplementedError("The binned approximation is not available with `by`.")
+        problem = _make_grouped_problem(kind, data, formula, probs, xformla, t, tmin1, tname, idname, panel, weights,
+                                        by)
+    else:
+        problem = _make_problem(kind, data, formula, probs, xformla, t, tmin1, tmin2, tname, idname, panel, method,
+                                weights)
+    if bins is not None:
+        problem = BinnedProblem(problem, bins)
+    return problem.compact() if low_memory else problem
+
+
+def _make_problem(kind, data, formula, probs, xformla, t, tmin1, tmin2, tname, idname, panel, method, weights):
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError("The native engine requires `data` to be a pandas DataFrame.")
+    if xformla is not None and method not in ('logit', 'pscore'):
+        raise NotImplementedError(f"The native engine only supports logit propensity scores, not '{method}'.")
+    # Propensity score models are shared by estimators with the same covariates, see `propensity_model`
+    propensity = lambda units, treatment, weights: (propensity_model(units, xformla, treatment, method, weights)
+                                                    if xformla else None)
+    sample_weights = None if weights is None else np.asarray(weights, dtype=float)
+    # Row positions of a subset of `data`, to align the sampling weights
+    rows = lambda subset: data.index.get_indexer(subset.index)
+
+    if kind in ('qte', 'qtet'):
+        outcome, treatment = parse_formula(formula)
+        problem = CrossSectionProblem(kind, data[outcome].to_numpy(dtype=float),
+                                      data[treatment].to_numpy(dtype=float), probs,
+                                      propensity(data, treatment, sample_weights), sample_weights)
+        return _with_units(problem, data.index)
+
+    if kind in ('cic', 'qdid', 'mdid'):
+        if xformla:
+            raise NotImplementedError("The native engine does not support covariates for CiC, QDiD and MDiD.")
+        subset, outcome, treatment = _two_periods(data, formula, t, tmin1, tname)
+        unit_index = None
+        if panel:
+            if idname is None:
+                raise ValueError("`idname` is required for panel estimators.")
+            subset, unit_index = _balanced_long(subset, tname, idname, [t, tmin1])
+        problem = TwoPeriodProblem(kind, subset[outcome].to_numpy(dtype=float),
+                                   subset[treatment].to_numpy(dtype=float),
+                                   (subset[tname] == t).to_numpy(), probs,
+                                   None if sample_weights is None else sample_weights[rows(subset)], unit_index)
+        return _with_units(problem, subset.index if unit_index is None else pd.unique(subset[idname]))
+
+    if kind in ('panel_qtet', 'ddid2', 'spatt'):
+        outcome, treatment = parse_formula(formula)
+        if kind == 'spatt' and not panel:
+            subset, outcome, treatment = _two_periods(data, formula, t, tmin1, tname)
+            if xformla:
+                raise NotImplementedError("The native engine only supports covariates for SpATT with panel=True.")
+            problem = TwoPeriodProblem('att', subset[outcome].to_numpy(dtype=float),
+                                       subset[treatment].to_numpy(dtype=float),
+                                       (subset[tname] == t).to_numpy(), [0.5],
+                                       None if sample_weights is None else sample_weights[rows(subset)])
+            return _with_units(problem, subset.index)
+        if kind == 'ddid2' and not panel:
+            raise NotImplementedError("The native engine only supports DDID2 with panel=True.")
+        if idname is None:
+            raise ValueError("`idname` is required for panel estimators.")
+        periods = {'t': t, 'tmin1': tmin1}
+        if kind == 'panel_qtet':
+            periods['tmin2'] = tmin2
+        wide, d, first, sample_weights = _balanced_wide(data, outcome, treatment, tname, idname, periods,
+                                                        sample_weights)
+        model = propensity(first, treatment, sample_weights)
+        if kind == 'spatt':
+            problem = SpATTProblem(wide['t'] - wide['tmin1'], d, model, sample_weights)
+        else:
+            problem = PanelCopulaProblem(kind, wide, d, probs, model, sample_weights)
+        return _with_units(problem, first.index)
+
+    raise ValueError(f"Unknown estimator kind '{kind}'.")
+
+
+def _make_grouped_problem(kind, data, formula, probs, xformla, t, tmin1, tname, idname, panel, weights, by):
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError("The native engine requires `data` to be a pandas DataFrame.")
+    if kind not in ('qte', 'qtet', 'cic', 'qdid', 'mdid'):
+        raise NotImplementedError(f"Grouped estimation is not available for '{kind}'.")
+    if xformla:
+        raise NotImplementedError("Grouped estimation does not support covariates.")
+    sample_weights = None if weights is None else np.asarray(weights, dtype=float)
+    rows = lambda subset: data.index.get_indexer(subset.index)
+
+    if kind in ('qte', 'qtet'):
+        # Without covariates the QTET equals the QTE
+        outcome, treatment = parse_formula(formula)
+        group, labels = _group_codes(data, by)
+        problem = GroupedProblem(kind, data[outcome].to_numpy(dtype=float), data[treatment].to_numpy(dtype=float),
+                                 group, labels, probs, sample_weights=sample_weights)
+        return _with_units(problem, data.index)
+
+    subset, outcome, treatment = _two_periods(data, formula, t, tmin1, tname)
+    unit_index = None
+    if panel:
+        if idname is None:
+            raise ValueError("`idname` is required for panel estimators.")
+        subset, unit_index = _balanced_long(subset, tname, idname, [t, tmin1])
+    group, labels = _group_codes(subset, by)
+    problem = GroupedProblem(kind, subset[outcome].to_numpy(dtype=float), subset[treatment].to_numpy(dtype=float),
+                             group, labels, probs, post=(subset[tname] == t).to_numpy(),
+                             sample_weights=None if sample_weights is None else sample_weights[rows(subset)],
+                             unit_index=unit_index)
+    return _with_units(problem, subset.index if unit_index is None else pd.unique(subset[idname]))
+
+
+def build_staggered_problem(kind, data, formula, probs, tname, idname, control_group='nevertreated', weights=None,
+                            low_memory=False):
+    """
+    Prepare the group-time quantile effects of a staggered adoption.
+
+    The cohorts are derived once from the panel: the cohort of a unit is the
+    first period in which its treatment is 1, and units never treated form
+    the comparison group. Units not observed in every period, and units
+    treated from the first period on (which have no pre-treatment period),
+    are dropped.
+
+    Parameters:
+    -----------
+    kind : str
+        The two-period estimator of every cell: 'cic', 'qdid' or 'mdid'.
+    data : pandas.DataFrame
+        The panel in long format.
+    formula : str
+        The formula 'outcome ~ treatment', with a treatment that switches
+        from 0 to 1 at adoption and stays 1.
+    probs : array-like
+        The quantiles at which to estimate the effects.
+    tname, idname : str
+        The period and unit id columns.
+    control_group : str, optional (default='nevertreated')
+        Compare every cohort with the never-treated units, or with
+        'notyettreated' units, i.e. the never treated and the cohorts adopting
+        after both the cell's period and the cohort's adoption.
+    weights : array-like, optional
+        Sampling weights of the rows; a unit carries the weight of its first row.
+    low_memory : bool, optional (default=False)
+        Hold the bootstrap weights in float32 and the sort orders in int32.
+
+    Returns:
+    --------
+    problem : StaggeredProblem
+        The prepared problem, labelled by cell and aggregation in `labels`.
+    """
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError("The native engine requires `data` to be a pandas DataFrame.")
+    if kind not in ('cic', 'qdid', 'mdid'):
+        raise ValueError(f"`estimator` must be one of ('cic', 'qdid', 'mdid'), not '{kind}'.")
+    if control_group not in ('nevertreated', 'notyettreated'):
+        raise ValueError(f"`control_group` must be 'nevertreated' or 'notyettreated', not '{control_group}'.")
+    outcome, treatment = parse_formula(formula)
+    periods = np.sort(pd.unique(data[tname]))
+    unit, ids = pd.factorize(data[idname])
+    period = np.searchsorted(periods, data[tname].to_numpy())
+    Y = np.full((len(ids), len(periods)), np.nan)
+    Y[unit, period] = data[outcome].to_numpy(dtype=float)
+    D = np.zeros(Y.shape, dtype=bool)
+    D[unit, period] = data[treatment].to_numpy(dtype=float) == 1
+    adoption = np.where(D.any(axis=1), D.argmax(axis=1), len(periods))
+    keep = ~np.isnan(Y).any(axis=1) & (adoption > 0)
+
+    sample_weights = None
+    if weights is not None:
+        # Assigning in reverse leaves every unit with the weight of its first row
+        unit_weights = np.empty(len(ids))
+        unit_weights[unit[::-1]] = np.asarray(weights, dtype=float)[::-1]
+        sample_weights = unit_weights[keep]
+    problem = StaggeredProblem(kind, Y[keep], adoption[keep], probs, control_group, periods, sample_weights)
+    problem = _with_units(problem, ids[keep])
+    return problem.compact() if low_memory else problem
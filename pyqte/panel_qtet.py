@@ -1,9 +1,17 @@
+import copy
 from rpy2.robjects import r, Formula
 from rpy2.robjects.packages import importr
 from rpy2.robjects import pandas2ri
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine
+from .bootstrap import fit_native, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
 
 # Activate the conversion of pandas DataFrames to R DataFrame
 pandas2ri.activate()
@@ -12,15 +20,18 @@ pandas2ri.activate()
 qte = importr('qte')
 
 class PanelQTETEstimator:
-    def __init__(self, formula, data, t, tmin1, tmin2, idname, tname, xformla=None, probs=None, se=True, iters=100, method="pscore"):
-        self.formula = Formula(formula)
-        self.data = pandas2ri.py2rpy(data)
+    def __init__(self, formula, data, t, tmin1, tmin2, idname, tname, xformla=None, probs=None, se=True, iters=100, method="pscore",
+                 engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False,
+                 low_memory=False, memory_budget_mb=None, seed=None, draws_path=None):
+        self.formula = formula
+        self.data = data
         self.t = t
         self.tmin1 = tmin1
         self.tmin2 = tmin2
         self.idname = idname
         self.tname = tname
-        self.xformla = Formula(xformla) if xformla else None
+        self.xformla = xformla
         
         # Process 'probs' as a numeric vector in R
         if probs is None:
@@ -34,59 +45,133 @@ class PanelQTETEstimator:
         self.se = se
         self.iters = iters
         self.method = method
+        check_engine(engine, adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, draws_path=draws_path)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.uniform = uniform
+        self.result = None
+        self.info = {}
+        self._problem = None
 
     def fit(self):
         # Ensure all necessary parameters are provided
         if self.formula is None or self.data is None or self.t is None or self.tmin1 is None or self.tmin2 is None or self.idname is None or self.tname is None:
             raise ValueError("All required parameters must be provided and cannot be None.")
 
-        # Call the 'panel_qtet' function from the 'qte' package
-        if self.xformla:
-            self.result = qte.panel_qtet(
-                formla=self.formula,
-                t=self.t,
-                tmin1=self.tmin1,
-                tmin2=self.tmin2,
-                idname=self.idname,
-                tname=self.tname,
-                data=self.data,
-                xformla=self.xformla,
-                probs=self.probs,
-                se=self.se,
-                iters=self.iters,
-                method=self.method
-            )
-        else:
-            self.result = qte.panel_qtet(
-                formla=self.formula,
-                t=self.t,
-                tmin1=self.tmin1,
-                tmin2=self.tmin2,
-                idname=self.idname,
-                tname=self.tname,
-                data=self.data,
-                probs=self.probs,
-                se=self.se,
-                iters=self.iters,
-                method=self.method
-            )
+        timer = FitTimer('PanelQTETEstimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('panel_qtet', self.data, self.formula, xformla=self.xformla, t=self.t, tmin1=self.tmin1,
+                          tmin2=self.tmin2, tname=self.tname, idname=self.idname,
+                          balanced=self.engine == 'r', engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                problem = build_problem('panel_qtet', self.data, self.formula, self.probs, xformla=self.xformla,
+                                        t=self.t, tmin1=self.tmin1, tmin2=self.tmin2, tname=self.tname,
+                                        idname=self.idname, panel=True, method=self.method,
+                                        low_memory=self.low_memory)
+            self._problem = problem
+            self.info = fit_native(problem, se=self.se, iters=self.iters, adaptive=self.adaptive,
+                                   adaptive_tol=self.adaptive_tol, batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                   boot_weights=self.boot_weights, uniform=self.uniform,
+                                   memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                   draws_path=self.draws_path, timer=timer)
+            self.info['timings'] = timer.finish()
+            return self.info
+
+        with timer.phase('py2rpy', rows=rows):
+            r_data = pandas2ri.py2rpy(self.data)
+
+        if self.seed is not None:
+            set_r_seed(self.seed)
+
+        # Call the 'panel_qtet' function from the 'qte' package (bootstrap included)
+        with timer.phase('r_call', rows=rows):
+            if self.xformla:
+                self.result = qte.panel_qtet(
+                    formla=Formula(self.formula),
+                    t=self.t,
+                    tmin1=self.tmin1,
+                    tmin2=self.tmin2,
+                    idname=self.idname,
+                    tname=self.tname,
+                    data=r_data,
+                    xformla=Formula(self.xformla),
+                    probs=self.probs,
+                    se=self.se,
+                    iters=self.iters,
+                    method=self.method
+                )
+            else:
+                self.result = qte.panel_qtet(
+                    formla=Formula(self.formula),
+                    t=self.t,
+                    tmin1=self.tmin1,
+                    tmin2=self.tmin2,
+                    idname=self.idname,
+                    tname=self.tname,
+                    data=r_data,
+                    probs=self.probs,
+                    se=self.se,
+                    iters=self.iters,
+                    method=self.method
+                )
+
+        with timer.phase('extract_info', rows=len(self.probs)):
+            self._extract_info()
+        self.info['timings'] = timer.finish()
         return self.result
 
+    def _extract_info(self):
+        """Extract information from the R result object."""
+        self.info['qte'] = np.array(self.result.rx2('qte'))
+        self.info['probs'] = np.array(self.probs)
+
+        if self.se:
+            self.info['qte.lower'] = np.array(self.result.rx2('qte.lower'))
+            self.info['qte.upper'] = np.array(self.result.rx2('qte.upper'))
+        else:
+            self.info['qte.lower'] = None
+            self.info['qte.upper'] = None
+
     def summary(self):
+        if self.engine == 'native':
+            summary = self.get_results()
+            print(summary)
+            return summary
         summary = r.summary(self.result)
         print(summary)
         return summary
         
-    def plot(self):
+    def plot(self, path=None):
         """
         Plot the QTET estimation results, replacing invalid values with zero.
+
+        Parameters:
+        -----------
+        path : str, optional
+            Save the plot to this file (PNG, SVG, PDF, ...) with a
+            non-interactive backend instead of showing it.
         """
-        qte_results = self.result
+        if path is not None:
+            return save_plot(self.to_result(), path, name='QTE', title='Quantile Treatment Effects (Panel QTET)')
 
-        tau = np.linspace(0.05, 0.95, len(qte_results.rx2('qte')))
-        qte = np.array(qte_results.rx2('qte'))
-        lower_bound = np.array(qte_results.rx2('qte.lower')) if self.se else None
-        upper_bound = np.array(qte_results.rx2('qte.upper')) if self.se else None
+        tau = self.info['probs']
+        qte = self.info['qte']
+        lower_bound = self.info['qte.lower'] if self.se else None
+        upper_bound = self.info['qte.upper'] if self.se else None
 
         # Replace invalid values (NaN) with zero
         qte = np.nan_to_num(qte, nan=0.0)
@@ -108,19 +193,60 @@ class PanelQTETEstimator:
         plt.grid(True)
         plt.show()
 
+    def at(self, probs):
+        """
+        Re-evaluate a native fit at new quantiles without refitting.
+
+        The fit keeps its sorted samples and bootstrap seeds, so this only
+        inverts the ECDFs at `probs` and replays the same replicates.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : PanelQTETEstimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        if self._problem is None:
+            raise ValueError("`at` requires a fit with engine='native'.")
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('PanelQTETEstimator', self.info, replicates)
+
     def get_results(self):
         """
         Return the results as a pandas DataFrame.
         """
         results_data = {
-            'Quantile': np.linspace(0.05, 0.95, len(self.result.rx2('qte'))),
-            'QTE': np.array(self.result.rx2('qte'))
+            'Quantile': self.info['probs'],
+            'QTE': self.info['qte']
         }
         
         # Include confidence intervals only if standard errors were calculated
         if self.se:
-            results_data['QTE Lower Bound'] = np.array(self.result.rx2('qte.lower'))
-            results_data['QTE Upper Bound'] = np.array(self.result.rx2('qte.upper'))
+            results_data['QTE Lower Bound'] = self.info['qte.lower']
+            results_data['QTE Upper Bound'] = self.info['qte.upper']
+        if 'qte.band.lower' in self.info:
+            results_data['QTE Uniform Lower Bound'] = self.info['qte.band.lower']
+            results_data['QTE Uniform Upper Bound'] = self.info['qte.band.upper']
 
         results_df = pd.DataFrame(results_data)
         return results_df
@@ -0,0 +1,132 @@
+# parallel.py
+
+import copy
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# State of a worker process: the problem rebuilt on top of the shared buffers
+_worker = {}
+
+
+class _SharedRef:
+    """Placeholder for an array that lives in a shared memory block."""
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def _is_native_object(value):
+    return hasattr(value, '__dict__') and type(value).__module__.startswith(__package__ + '.')
+
+
+def _is_native_list(value):
+    # The sub-problems of a `pyqte.native.JointProblem`
+    return isinstance(value, list) and len(value) > 0 and all(_is_native_object(item) for item in value)
+
+
+def _export(obj, blocks):
+    """Copy the arrays of `obj` (recursively) to shared memory, returning a light clone."""
+    clone = copy.copy(obj)
+    for key, value in vars(clone).items():
+        if isinstance(value, np.ndarray) and value.nbytes > 0:
+            block = shared_memory.SharedMemory(create=True, size=value.nbytes)
+            np.ndarray(value.shape, dtype=value.dtype, buffer=block.buf)[...] = value
+            blocks.append(block)
+            setattr(clone, key, _SharedRef(block.name, value.shape, value.dtype.str))
+        elif _is_native_object(value):
+            setattr(clone, key, _export(value, blocks))
+        elif _is_native_list(value):
+            setattr(clone, key, [_export(item, blocks) for item in value])
+    return clone
+
+
+def _attach(obj, blocks):
+    """Replace the placeholders of an exported object with views on the shared blocks."""
+    for key, value in vars(obj).items():
+        if isinstance(value, _SharedRef):
+            block = shared_memory.SharedMemory(name=value.name)
+            blocks.append(block)
+            array = np.ndarray(value.shape, dtype=np.dtype(value.dtype), buffer=block.buf)
+            array.flags.writeable = False
+            setattr(obj, key, array)
+        elif _is_native_object(value):
+            _attach(value, blocks)
+        elif _is_native_list(value):
+            for item in value:
+                _attach(item, blocks)
+    return obj
+
+
+def _init_worker(skeleton):
+    blocks = []
+    _worker['problem'] = _attach(skeleton, blocks)
+    # Keep the blocks open for as long as the worker lives
+    _worker['blocks'] = blocks
+
+
+def _run_chunk(task):
+    from .bootstrap import replicate_chunk
+    return replicate_chunk(_worker['problem'], *task)
+
+
+class SharedMemoryPool:
+    """
+    A process pool evaluating bootstrap replicates of a native problem.
+
+    The arrays of the problem (sorted outcomes, cell indices, covariates and
+    weights) are copied to `multiprocessing.shared_memory` once. Workers only
+    receive a small pickled skeleton referencing those buffers, and return
+    the (chunk, len(probs)) estimates of their replicates, so no copy of the
+    data is made per worker or per task.
+
+    Parameters:
+    -----------
+    problem : pyqte.native.NativeProblem
+        The prepared estimator.
+    n_jobs : int
+        The number of worker processes.
+    mp_context : str, optional
+        The multiprocessing start method (defaults to the platform's).
+    """
+
+    def __init__(self, problem, n_jobs, mp_context=None):
+        self.problem = problem
+        self.n_jobs = n_jobs
+        self.mp_context = mp_context
+        self._blocks = []
+        self._pool = None
+
+    def __enter__(self):
+        try:
+            skeleton = _export(self.problem, self._blocks)
+            context = multiprocessing.get_context(self.mp_context)
+            self._pool = context.Pool(self.n_jobs, initializer=_init_worker, initargs=(skeleton,))
+        except BaseException:
+            self._release()
+            raise
+        return self
+
+    def map(self, tasks):
+        """Evaluate a list of (seed, start, size, kind) replicate chunks, preserving their order."""
+        return self._pool.map(_run_chunk, tasks, chunksize=1)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._pool is not None:
+            if exc_type is None:
+                self._pool.close()
+            else:
+                self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._release()
+        return False
+
+    def _release(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
@@ -0,0 +1,188 @@
+# parity.py
+
+import importlib
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+# The bundled Lalonde data, next to the package in a source checkout
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+_MODULES = {'QTEEstimator': 'qte', 'QTETEstimator': 'qtet', 'CiCEstimator': 'cic', 'QDiDEstimator': 'qdid',
+            'MDiDEstimator': 'mdid', 'PanelQTETEstimator': 'panel_qtet', 'DDID2Estimator': 'ddid2',
+            'SpATTEstimator': 'spatt', 'StaggeredEstimator': 'staggered'}
+
+ParityCase = namedtuple('ParityCase', ['name', 'estimator', 'dataset', 'params'])
+
+_PANEL = {'formula': 're ~ treat', 't': 1978, 'tmin1': 1975, 'tname': 'year', 'idname': 'id'}
+
+# One case per estimator; 'cross' and 'panel' name the Lalonde PSID samples
+# (lalonde_psid.csv and lalonde_psid_panel.csv) or their synthetic counterparts
+CASES = [
+    ParityCase('qte', 'QTEEstimator', 'cross', {'formula': 're78 ~ treat'}),
+    ParityCase('qtet', 'QTETEstimator', 'cross', {'formula': 're78 ~ treat', 'xformla': '~ age + education'}),
+    ParityCase('cic', 'CiCEstimator', 'panel', dict(_PANEL, panel=True)),
+    ParityCase('qdid', 'QDiDEstimator', 'panel', dict(_PANEL, panel=True)),
+    ParityCase('mdid', 'MDiDEstimator', 'panel', dict(_PANEL, panel=True)),
+    ParityCase('panel_qtet', 'PanelQTETEstimator', 'panel', dict(_PANEL, tmin2=1974)),
+    ParityCase('ddid2', 'DDID2Estimator', 'panel', dict(_PANEL, panel=True)),
+    ParityCase('spatt', 'SpATTEstimator', 'panel', dict(_PANEL, panel=True)),
+]
+
+
+def r_available():
+    """Whether the R `qte` package can be used through rpy2."""
+    try:
+        from rpy2.robjects.packages import isinstalled
+        return bool(isinstalled('qte'))
+    except Exception:
+        return False
+
+
+def lalonde_data(data_dir=None):
+    """Load the bundled Lalonde PSID samples as the 'cross' and 'panel' datasets."""
+    data_dir = DATA_DIR if data_dir is None else data_dir
+    return {'cross': pd.read_csv(os.path.join(data_dir, 'lalonde_psid.csv')),
+            'panel': pd.read_csv(os.path.join(data_dir, 'lalonde_psid_panel.csv'))}
+
+
+def synthetic_data(n, seed=0):
+    """
+    Simulate 'cross' and 'panel' datasets shaped like the Lalonde samples.
+
+    Parameters:
+    -----------
+    n : int
+        The number of units; the panel has 3 rows per unit (1974, 1975, 1978).
+    seed : int, optional (default=0)
+        The seed of the simulation.
+    """
+    rng = np.random.default_rng(seed)
+    age = rng.integers(18, 55, n)
+    education = rng.integers(6, 17, n)
+    treat = (rng.uniform(size=n) < 1 / (1 + np.exp(2 + 0.03 * (age - 30)))).astype(float)
+    level = 2000 + 150 * (education - 6) + rng.gamma(2.0, 2000, n)
+    years = {1974: 0.0, 1975: 500.0, 1978: 1500.0}
+    panel = pd.concat([pd.DataFrame({'year': float(year), 'id': np.arange(n), 'treat': treat, 'age': age,
+                                     'education': education,
+                                     're': np.maximum(0, level + shift + 1000 * treat * (year == 1978)
+                                                      + rng.normal(0, 1500, n))})
+                       for year, shift in years.items()], ignore_index=True)
+    cross = panel[panel['year'] == 1978].drop(columns='year').rename(columns={'re': 're78'})
+    return {'cross': cross.reset_index(drop=True), 'panel': panel}
+
+
+def _effects(estimator, alp):
+    """The point estimates and standard errors of a fit (from the CI width when only bounds are kept)."""
+    info = estimator.info
+    if 'ate' in info:
+        se = info.get('ate.se')
+        return np.atleast_1d(float(info['ate'])), None if se is None else np.atleast_1d(float(se))
+    if info.get('qte.se') is not None:
+        return np.asarray(info['qte'], dtype=float), np.asarray(info['qte.se'], dtype=float)
+    if info.get('qte.lower') is None:
+        return np.asarray(info['qte'], dtype=float), None
+    width = np.asarray(info['qte.upper'], dtype=float) - np.asarray(info['qte.lower'], dtype=float)
+    return np.asarray(info['qte'], dtype=float), width / (2 * norm.ppf(1 - alp / 2))
+
+
+def _fit(case, data, engine, probs, iters, seed, repeats):
+    cls = getattr(importlib.import_module(f'.{_MODULES[case.estimator]}', __package__), case.estimator)
+    params = dict(case.params, data=data, se=True, iters=iters, engine=engine, seed=seed)
+    if case.estimator != 'SpATTEstimator':
+        params['probs'] = list(probs)
+    best = np.inf
+    for _ in range(max(1, repeats)):
+        estimator = cls(**params)
+        start = time.perf_counter()
+        estimator.fit()
+        best = min(best, time.perf_counter() - start)
+    return estimator, best
+
+
+def run_parity(cases=None, sizes=(1000, 10000), lalonde=True, probs=None, iters=200, point_tol=0.01, se_rtol=0.25,
+               use_r=None, seed=0, repeats=1, data_dir=None, log=None):
+    """
+    Run estimators on both engines and compare their estimates and speed.
+
+    Every case is fitted with `engine='native'` and, when R is available,
+    with `engine='r'`, on the bundled Lalonde data and on synthetic data of
+    each size. The point estimates must agree within `point_tol` standard
+    deviations of the outcome, and the standard errors, which come from
+    different bootstrap draws, within a relative `se_rtol`.
+
+    Parameters:
+    -----------
+    cases : list of ParityCase or str, optional
+        The cases (or their names) to run; all of `CASES` by default.
+    sizes : tuple of int, optional (default=(1000, 10000))
+        The numbers of units of the synthetic datasets.
+    lalonde : bool, optional (default=True)
+        Also run the cases on the Lalonde data.
+    probs : array-like, optional
+        The quantiles; 0.1, 0.2, ..., 0.9 by default.
+    iters : int, optional (default=200)
+        The number of bootstrap replicates of each fit.
+    point_tol : float, optional (default=0.01)
+        The largest difference of the point estimates, in standard deviations of the outcome.
+    se_rtol : float, optional (default=0.25)
+        The largest relative difference of the standard errors.
+    use_r : bool, optional
+        Run the R engine; by default whenever `r_available()`.
+    seed : int, optional (default=0)
+        The seed of the synthetic data and of the bootstrap of both engines.
+    repeats : int, optional (default=1)
+        Fit every case this many times per engine and keep the fastest time,
+        e.g. to leave out the one-off compilation of the Numba kernels.
+    data_dir : str, optional
+        The directory holding the Lalonde CSV files, see `lalonde_data`.
+    log : callable, optional
+        Called with a progress message per fit.
+
+    Returns:
+    --------
+    report : pandas.DataFrame
+        One row per case and dataset: the number of rows, the fit times of
+        both engines and the speedup of the native engine, the largest point
+        estimate and SE differences, and a `status` of 'ok', 'mismatch',
+        'r_skipped' (R is not available) or 'failed' (with the `error`).
+    """
+    log = log or (lambda message: None)
+    probs = np.arange(1, 10) / 10 if probs is None else np.asarray(probs, dtype=float)
+    use_r = r_available() if use_r is None else use_r
+    cases = [case if isinstance(case, ParityCase) else {c.name: c for c in CASES}[case]
+             for case in (CASES if cases is None else cases)]
+    datasets = [('lalonde', lalonde_data(data_dir))] if lalonde else []
+    datasets += [(f'synthetic-{n}', synthetic_data(n, seed)) for n in sizes]
+
+    rows = []
+    for label, data in datasets:
+        for case in cases:
+            frame = data[case.dataset]
+            outcome = case.params['formula'].split('~')[0].strip()
+            row = {'case': case.name, 'estimator': case.estimator, 'data': label, 'rows': len(frame),
+                   'native_s': np.nan, 'r_s': np.nan, 'speedup': np.nan, 'point_diff': np.nan,
+                   'se_diff': np.nan, 'status': 'r_skipped', 'error': None}
+            try:
+                native, row['native_s'] = _fit(case, frame, 'native', probs, iters, seed, repeats)
+                if use_r:
+                    r_fit, row['r_s'] = _fit(case, frame, 'r', probs, iters, seed, repeats)
+                    row['speedup'] = row['r_s'] / row['native_s']
+                    alp = getattr(native, 'alp', 0.05)
+                    (est, se), (r_est, r_se) = _effects(native, alp), _effects(r_fit, alp)
+                    row['point_diff'] = float(np.nanmax(np.abs(est - r_est)) / np.nanstd(frame[outcome]))
+                    if se is not None and r_se is not None:
+                        with np.errstate(invalid='ignore', divide='ignore'):
+                            row['se_diff'] = float(np.nanmax(np.abs(se / r_se - 1)))
+                    ok = row['point_diff'] <= point_tol and not row['se_diff'] > se_rtol
+                    row['status'] = 'ok' if ok else 'mismatch'
+            except Exception as error:
+                row.update({'status': 'failed', 'error': f"{type(error).__name__}: {error}"})
+            log(f"{case.name} on {label} ({row['rows']} rows): {row['status']}"
+                + (f", {row['speedup']:.1f}x" if np.isfinite(row['speedup']) else ''))
+            rows.append(row)
+    return pd.DataFrame(rows)
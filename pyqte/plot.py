@@ -1,7 +1,261 @@
 # plot.py
 
+import multiprocessing
+import os
+import re
+
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# The renderer of a worker process of `export_plots`
+_worker = {}
+
+# zlib level of PNG files: faster to encode than the default 6, slightly larger
+PNG_COMPRESS_LEVEL = 1
+
+
+def _as_result(results):
+    """Accept an `EstimationResult` or a fitted estimator."""
+    return results.to_result() if hasattr(results, 'to_result') else results
+
+
+def _panels(result):
+    """Split a result into one (suffix, arrays) curve per group."""
+    if result.probs is None:
+        raise ValueError(f"{result.estimator} estimates a single effect, which has no quantile curve to plot.")
+    k = len(result.probs)
+    fields = ('estimate', 'lower', 'upper', 'band_lower', 'band_upper')
+    groups = [None] if result.groups is None else list(result.groups.itertuples(index=False))
+    for g, labels in enumerate(groups):
+        arrays = {field: None if getattr(result, field) is None else getattr(result, field)[g * k:(g + 1) * k]
+                  for field in fields}
+        suffix = '' if labels is None else ', '.join(f"{name}={value}"
+                                                     for name, value in zip(result.groups.columns, labels))
+        yield suffix, arrays
+
+
+def _file_suffix(suffix):
+    return '' if not suffix else '_' + re.sub(r'[^\w.=-]+', '_', suffix.replace(', ', '_'))
+
+
+def plot_qte_results(results, ax=None, name='QTE', title=None):
+    """
+    Draw the estimates and confidence bounds of a result on a matplotlib axes.
+
+    Parameters:
+    -----------
+    results : EstimationResult or estimator
+        A result, or a fitted estimator whose `to_result()` is drawn.
+    ax : matplotlib.axes.Axes, optional
+        The axes to draw on (default: the current pyplot axes).
+    name : str, optional (default='QTE')
+        The label of the estimates.
+    title : str, optional
+        The title of the plot.
+
+    Returns:
+    --------
+    ax : matplotlib.axes.Axes
+    """
+    result = _as_result(results)
+    ax = plt.gca() if ax is None else ax
+    for suffix, arrays in _panels(result):
+        label = f"{name} ({suffix})" if suffix else name
+        line, = ax.plot(result.probs, arrays['estimate'], 'o-', label=label)
+        if arrays['lower'] is not None:
+            ax.fill_between(result.probs, arrays['lower'], arrays['upper'], color=line.get_color(), alpha=0.2)
+    ax.axhline(y=0, color='r', linestyle='--', label="No Effect Line")
+    ax.set_xlabel('Quantiles')
+    ax.set_ylabel(f'{name} Estimates')
+    ax.set_title(title or f'{name} Estimates')
+    ax.legend()
+    ax.grid(True)
+    return ax
+
+
+class PlotRenderer:
+    """
+    Render results to files on one reusable figure with the Agg backend.
+
+    The figure is created once, without pyplot, so nothing is registered with
+    an interactive backend and no figure is left open. Each result updates
+    the data of the existing line and replaces the confidence bands, which
+    is much cheaper than building a new figure.
+
+    Parameters:
+    -----------
+    name : str, optional (default='QTE')
+        The label of the estimates.
+    title : str, optional
+        The title of the plots (default: '<name> Estimates').
+    figsize : tuple, optional (default=(10, 6))
+        The figure size in inches.
+    dpi : int, optional (default=100)
+        The resolution of raster formats.
+    """
+
+    def __init__(self, name='QTE', title=None, figsize=(10, 6), dpi=100):
+        self.title = title or f'{name} Estimates'
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.line, = self.ax.plot([], [], 'o-', label=name)
+        self.ax.axhline(y=0, color='r', linestyle='--', label="No Effect Line")
+        self.ax.set_xlabel('Quantiles')
+        self.ax.set_ylabel(f'{name} Estimates')
+        self.ax.grid(True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def draw(self, probs, estimate, lower=None, upper=None, band_lower=None, band_upper=None, title=None):
+        """Replace the curve and bands shown on the figure."""
+        self.line.set_data(probs, estimate)
+        for collection in list(self.ax.collections):
+            collection.remove()
+        if band_lower is not None:
+            self.ax.fill_between(probs, band_lower, band_upper, color='C0', alpha=0.1, label="Uniform band")
+        if lower is not None:
+            self.ax.fill_between(probs, lower, upper, color='gray', alpha=0.2, label="95% CI")
+
+        values = np.concatenate([np.ravel(v) for v in (estimate, lower, upper, band_lower, band_upper, [0.0])
+                                 if v is not None])
+        values = values[np.isfinite(values)]
+        low, high = values.min(), values.max()
+        pad = 0.05 * (high - low) if high > low else 1.0
+        self.ax.set_ylim(low - pad, high + pad)
+        self.ax.set_xlim(np.min(probs) - 0.02, np.max(probs) + 0.02)
+        self.ax.set_title(title or self.title)
+        self.ax.legend(loc='best')
+
+    def render(self, results, path, formats=None):
+        """
+        Save every curve of a result (one file per group).
+
+        Parameters:
+        -----------
+        results : EstimationResult or estimator
+            The result to draw.
+        path : str
+            The output file. Groups of a result fitted with `by` get the group
+            labels appended to the file name.
+        formats : list of str, optional
+            The extensions to write (default: the extension of `path`).
+
+        Returns:
+        --------
+        paths : list of str
+            The files written.
+        """
+        result = _as_result(results)
+        base, extension = os.path.splitext(path)
+        formats = [extension.lstrip('.') or 'png'] if formats is None else formats
+        written = []
+        for suffix, arrays in _panels(result):
+            title = f"{self.title} ({suffix})" if suffix else None
+            self.draw(result.probs, title=title, **arrays)
+            for fmt in formats:
+                target = f"{base}{_file_suffix(suffix)}.{fmt}"
+                options = {'pil_kwargs': {'compress_level': PNG_COMPRESS_LEVEL}} if fmt == 'png' else {}
+                self.figure.savefig(target, format=fmt, **options)
+                written.append(target)
+        return written
+
+    def close(self):
+        """Release the figure."""
+        self.figure.clear()
+        self.figure = self.ax = self.line = None
+
+
+def save_plot(results, path, name='QTE', title=None, figsize=(10, 6), dpi=100):
+    """
+    Render one result to a file (PNG, SVG, PDF, ...) without a display.
+
+    Parameters:
+    -----------
+    results : EstimationResult or estimator
+        The result to draw.
+    path : str
+        The output file; its extension sets the format.
+    name, title, figsize, dpi :
+        See `PlotRenderer`.
+
+    Returns:
+    --------
+    paths : list of str
+        The files written.
+    """
+    with PlotRenderer(name, title, figsize, dpi) as renderer:
+        return renderer.render(results, path)
+
+
+def _init_renderer(options):
+    _worker['renderer'] = PlotRenderer(**options)
+
+
+def _render_task(task):
+    result, path, formats = task
+    return _worker['renderer'].render(result, path, formats)
+
+
+def export_plots(results, directory, names=None, formats=('png',), n_jobs=1, name='QTE', title=None,
+                 figsize=(10, 6), dpi=100, mp_context=None):
+    """
+    Render many results to image files in batch.
+
+    Each process draws on a single reused figure (see `PlotRenderer`), and
+    with `n_jobs` > 1 the results are split over worker processes. Results
+    are sent to the workers as compact `EstimationResult` objects.
+
+    Parameters:
+    -----------
+    results : list of EstimationResult or estimators
+        The results to draw.
+    directory : str
+        The output directory, created if needed.
+    names : list of str, optional
+        The file names without extension (default: '<estimator>_<index>').
+    formats : list of str, optional (default=('png',))
+        The file formats to write, e.g. ('png', 'svg', 'pdf').
+    n_jobs : int, optional (default=1)
+        The number of worker processes.
+    name, title, figsize, dpi :
+        See `PlotRenderer`.
+    mp_context : str, optional
+        The multiprocessing start method (defaults to the platform's).
+
+    Returns:
+    --------
+    paths : list of str
+        The files written, in the order of `results`.
+    """
+    results = [_as_result(result) for result in results]
+    if names is None:
+        names = [f"{result.estimator}_{i}" for i, result in enumerate(results)]
+    if len(names) != len(results):
+        raise ValueError("`names` must have one entry per result.")
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(result, os.path.join(directory, file_name), list(formats)) for result, file_name in zip(results, names)]
+    options = {'name': name, 'title': title, 'figsize': figsize, 'dpi': dpi}
 
-def plot_qte_results(results):
-    # Implementação completa para plotar resultados de QTE
-    pass
+    if n_jobs <= 1 or len(tasks) <= 1:
+        with PlotRenderer(**options) as renderer:
+            batches = [renderer.render(*task) for task in tasks]
+    else:
+        context = multiprocessing.get_context(mp_context)
+        pool = context.Pool(min(n_jobs, len(tasks)), initializer=_init_renderer, initargs=(options,))
+        try:
+            batches = pool.map(_render_task, tasks, chunksize=max(1, len(tasks) // (4 * n_jobs)))
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    return [path for batch in batches for path in batch]
@@ -0,0 +1,162 @@
+# propensity.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+from . import formula as _formula
+
+# Number of fitted models kept by `propensity_model`
+_CACHE_SIZE = 8
+_cache = OrderedDict()
+# Fits may run on several threads, e.g. in the estimation daemon
+_cache_lock = threading.Lock()
+
+# Refits drop the units with a zero weight when they leave fewer than this share
+SUBSET_SHARE = 0.9
+
+
+def fit_logit(X, d, w=None, beta=None, tol=1e-8, max_iter=50):
+    """
+    Fit a weighted logit model by Newton-Raphson.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray or scipy.sparse.csr_matrix
+        The (n, p) design matrix.
+    d : numpy.ndarray
+        The binary treatment indicator.
+    w : numpy.ndarray, optional
+        Observation weights (e.g. bootstrap frequencies).
+    beta : numpy.ndarray, optional
+        Starting values for the coefficients.
+
+    Returns:
+    --------
+    beta : numpy.ndarray
+        The estimated coefficients.
+    """
+    w = np.ones(len(d)) if w is None else w
+    beta = np.zeros(X.shape[1]) if beta is None else np.array(beta, dtype=float)
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-(X @ beta)))
+        grad = X.T @ (w * (d - p))
+        if sparse.issparse(X):
+            hess = (X.T @ X.multiply((w * p * (1 - p))[:, None])).toarray()
+        else:
+            hess = (X * (w * p * (1 - p))[:, None]).T @ X
+        step = np.linalg.lstsq(hess, grad, rcond=None)[0]
+        beta += step
+        if np.max(np.abs(step)) < tol:
+            break
+    return beta
+
+
+def logit_scores(X, beta):
+    """Return the fitted propensity scores, bounded away from 0 and 1."""
+    p = 1.0 / (1.0 + np.exp(-(X @ beta)))
+    return np.clip(p, 1e-6, 1 - 1e-6)
+
+
+class PropensityModel:
+    """
+    A logit propensity score model, fitted once on the full sample.
+
+    The coefficients and scores of the full sample are kept, and every
+    bootstrap replicate refits the model on its own weights starting from
+    those coefficients, which saves Newton iterations. Units with a zero
+    weight (about a third of them under multinomial resampling) are left
+    out of the refit instead of being carried through every iteration.
+
+    Parameters:
+    -----------
+    X : numpy.ndarray or scipy.sparse.csr_matrix
+        The (n, p) covariate design matrix.
+    d : numpy.ndarray
+        The binary treatment indicator.
+    weights : numpy.ndarray, optional
+        The sampling weights of the full-sample fit.
+    """
+
+    def __init__(self, X, d, weights=None):
+        self.X = X
+        self.d = d
+        self.weights = np.ones(len(d)) if weights is None else weights
+        self.coef = fit_logit(X, d, self.weights)
+        self.scores = logit_scores(X, self.coef)
+
+    def refit_scores(self, w):
+        """
+        Return the propensity scores under the observation weights `w`.
+
+        The full-sample scores are returned as they are when `w` equals the
+        weights of the fit.
+        """
+        if np.array_equal(w, self.weights):
+            return self.scores
+        drawn = np.flatnonzero(w)
+        if len(drawn) < SUBSET_SHARE * len(w):
+            coef = fit_logit(self.X[drawn], self.d[drawn], w[drawn], beta=self.coef)
+        else:
+            coef = fit_logit(self.X, self.d, w, beta=self.coef)
+        return logit_scores(self.X, coef)
+
+
+def propensity_model(data, xformla, treatment, method='logit', weights=None, cache=True):
+    """
+    Fit (or fetch from the cache) the propensity score model of a treatment.
+
+    Models are cached by covariate formula, method, the values of the
+    covariate and treatment columns and the sampling weights, so estimators
+    fitted on the same data (e.g. QTET, DDID2 and SpATT with the same
+    `xformla`) share one fit.
+
+    Parameters:
+    -----------
+    data : pandas.DataFrame
+        The covariates and the treatment, one row per resampling unit.
+    xformla : str
+        The covariate formula, e.g. '~ age + C(region)'.
+    treatment : str
+        The name of the treatment column.
+    method : str, optional (default='logit')
+        The propensity score model; only 'logit' is available.
+    weights : numpy.ndarray, optional
+        The sampling weights.
+    cache : bool, optional (default=True)
+        Look the model up in, and store it in, the propensity score cache.
+
+    Returns:
+    --------
+    model : PropensityModel
+    """
+    if method not in ('logit', 'pscore'):
+        raise NotImplementedError(f"Only logit propensity scores are supported, not '{method}'.")
+    key = None
+    if cache:
+        parsed = _formula.parse_formula(str(xformla))
+        digest = None if weights is None else hashlib.blake2b(np.ascontiguousarray(weights).tobytes(),
+                                                                digest_size=16).hexdigest()
+        key = (str(parsed), treatment, 'logit',
+               _formula.data_fingerprint(data, parsed.variables + [treatment]), digest)
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+
+    model = PropensityModel(_formula.design_matrix(data, str(xformla)).X, data[treatment].to_numpy(dtype=float),
+                            weights)
+    if cache:
+        with _cache_lock:
+            _cache[key] = model
+            if len(_cache) > _CACHE_SIZE:
+                _cache.popitem(last=False)
+    return model
+
+
+def clear_propensity_cache():
+    """Drop every cached propensity score model."""
+    with _cache_lock:
+        _cache.clear()
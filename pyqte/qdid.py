@@ -1,9 +1,17 @@
+import copy
 import pandas as pd
 import numpy as np
 import rpy2.robjects as ro
 from rpy2.robjects import pandas2ri, Formula, FloatVector
 from rpy2.robjects.packages import importr
 import matplotlib.pyplot as plt
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine, grouped_results, check_se_method
+from .bootstrap import fit_native, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
 
 # Activating the automatic conversion of pandas DataFrames to R data.frames
 pandas2ri.activate()
@@ -13,14 +21,19 @@ qte = importr('qte')
 r = ro.r  # Directly accessing the R environment
 
 class QDiDEstimator:
-    def __init__(self, formula, data, t, tmin1, tname, idname=None, xformla=None, panel=False, se=True, alp=0.05, probs=None, iters=100, retEachIter=False, pl=False, cores=None):
-        self.formula = Formula(formula)
-        self.data = pandas2ri.py2rpy(data)
+    def __init__(self, formula, data, t, tmin1, tname, idname=None, xformla=None, panel=False, se=True, alp=0.05, probs=None, iters=100, retEachIter=False, pl=False, cores=None,
+                 engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False,
+                 se_method='bootstrap',
+                 low_memory=False, memory_budget_mb=None, by=None, seed=None, draws_path=None,
+                 bins=None):
+        self.formula = formula
+        self.data = data
         self.t = t
         self.tmin1 = tmin1
         self.tname = tname
         self.idname = idname
-        self.xformla = Formula(xformla) if xformla else None
+        self.xformla = xformla
         self.panel = panel
         self.se = se
         self.alp = alp
@@ -28,6 +41,24 @@ class QDiDEstimator:
         self.retEachIter = retEachIter
         self.pl = pl
         self.cores = cores
+        check_engine(engine, adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, by=by, draws_path=draws_path, bins=bins)
+        check_se_method(se_method, engine, uniform)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.bins = bins
+        self.by = by
+        self.uniform = uniform
+        self.se_method = se_method
+        self.result = None
 
         # Process 'probs' as a numeric vector in R
         if probs is None:
@@ -38,14 +69,46 @@ class QDiDEstimator:
             else:
                 self.probs = FloatVector(probs)
 
+        self.info = {}
+        self._problem = None
+
     def fit(self):
+        timer = FitTimer('QDiDEstimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('qdid', self.data, self.formula, xformla=self.xformla, t=self.t, tmin1=self.tmin1,
+                          tname=self.tname, idname=self.idname, panel=self.panel, by=self.by,
+                          balanced=self.engine == 'r', engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                problem = build_problem('qdid', self.data, self.formula, self.probs, xformla=self.xformla,
+                                        t=self.t, tmin1=self.tmin1, tname=self.tname,
+                                        idname=self.idname, panel=self.panel,
+                                        low_memory=self.low_memory, by=self.by, bins=self.bins)
+            self._problem = problem
+            self.info = fit_native(problem, se=self.se, iters=self.iters, alp=self.alp,
+                                   adaptive=self.adaptive, adaptive_tol=self.adaptive_tol,
+                                   batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                   boot_weights=self.boot_weights, uniform=self.uniform,
+                                   se_method=self.se_method,
+                                   memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                   draws_path=self.draws_path, timer=timer)
+            self.info['timings'] = timer.finish()
+            return self.info
+
+        with timer.phase('py2rpy', rows=rows):
+            r_data = pandas2ri.py2rpy(self.data)
+
         # Construct the function arguments, omitting those that are None
         args = {
-            'formla': self.formula,
+            'formla': Formula(self.formula),
             't': self.t,
             'tmin1': self.tmin1,
             'tname': self.tname,
-            'data': self.data,
+            'data': r_data,
             'panel': self.panel,
             'se': self.se,
             'alp': self.alp,
@@ -56,18 +119,41 @@ class QDiDEstimator:
             'cores': self.cores
         }
         if self.xformla:
-            args['xformla'] = self.xformla
+            args['xformla'] = Formula(self.xformla)
         if self.idname:
             args['idname'] = self.idname
 
         try:
-            # Calling the QDiD function from the 'qte' package in R
-            self.result = qte.QDiD(**{k: v for k, v in args.items() if v is not None})
+            if self.seed is not None:
+                set_r_seed(self.seed)
+            # Calling the QDiD function from the 'qte' package in R (bootstrap included)
+            with timer.phase('r_call', rows=rows):
+                self.result = qte.QDiD(**{k: v for k, v in args.items() if v is not None})
         except Exception as e:
             raise RuntimeError(f"Error executing the QDiD estimator: {e}")
+
+        with timer.phase('extract_info', rows=len(self.probs)):
+            self._extract_info()
+        self.info['timings'] = timer.finish()
         return self.result
 
+    def _extract_info(self):
+        """Extract information from the R result object."""
+        self.info['qte'] = np.array(self.result.rx2('qte'))
+        self.info['probs'] = np.array(self.probs)
+
+        if self.se:
+            self.info['qte.lower'] = np.array(self.result.rx2('qte.lower'))
+            self.info['qte.upper'] = np.array(self.result.rx2('qte.upper'))
+        else:
+            self.info['qte.lower'] = None
+            self.info['qte.upper'] = None
+
     def summary(self):
+        if self.engine == 'native':
+            summary = self.get_results()
+            print(summary)
+            return summary
         try:
             summary = r.summary(self.result)
             print(summary)
@@ -75,19 +161,28 @@ class QDiDEstimator:
         except Exception as e:
             raise RuntimeError(f"Error generating the summary: {e}")
 
-    def plot(self):
+    def plot(self, path=None):
         """
         Plots the QDiD estimates with confidence intervals, if available.
+
+        Parameters:
+        -----------
+        path : str, optional
+            Save the plot to this file (PNG, SVG, PDF, ...) with a
+            non-interactive backend instead of showing it.
         """
+        if path is not None:
+            return save_plot(self.to_result(), path, name='QTE', title='Quantile Treatment Effects (QDiD)')
+
         try:
             # Extracting the data from the result
-            tau = np.linspace(0.05, 0.95, len(self.result.rx2('qte')))
-            qte = np.nan_to_num(np.array(self.result.rx2('qte')), nan=0.0)
+            tau = self.info['probs']
+            qte = np.nan_to_num(self.info['qte'], nan=0.0)
             lower_bound = upper_bound = None
             
             if self.se:
-                lower_bound = np.nan_to_num(np.array(self.result.rx2('qte.lower')), nan=0.0)
-                upper_bound = np.nan_to_num(np.array(self.result.rx2('qte.upper')), nan=0.0)
+                lower_bound = np.nan_to_num(self.info['qte.lower'], nan=0.0)
+                upper_bound = np.nan_to_num(self.info['qte.upper'], nan=0.0)
 
             # Create the plot
             plt.figure(figsize=(10, 6))
@@ -106,17 +201,61 @@ class QDiDEstimator:
         except Exception as e:
             raise RuntimeError(f"Error plotting the results: {e}")
 
+    def at(self, probs):
+        """
+        Re-evaluate a native fit at new quantiles without refitting.
+
+        The fit keeps its sorted samples and bootstrap seeds, so this only
+        inverts the ECDFs at `probs` and replays the same replicates.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : QDiDEstimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        if self._problem is None:
+            raise ValueError("`at` requires a fit with engine='native'.")
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, alp=self.alp, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform,
+                                        se_method=self.se_method)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('QDiDEstimator', self.info, replicates)
+
     def get_results(self):
         """
         Returns the results as a pandas DataFrame.
         """
+        if self.by is not None:
+            return grouped_results(self.info, 'QTE')
         try:
             results_df = pd.DataFrame({
-                'Quantile': np.linspace(0.05, 0.95, len(self.result.rx2('qte'))),
-                'QTE': np.nan_to_num(np.array(self.result.rx2('qte')), nan=0.0),
-                'QTE Lower Bound': np.nan_to_num(np.array(self.result.rx2('qte.lower')), nan=0.0) if self.se else np.nan,
-                'QTE Upper Bound': np.nan_to_num(np.array(self.result.rx2('qte.upper')), nan=0.0) if self.se else np.nan
+                'Quantile': self.info['probs'],
+                'QTE': np.nan_to_num(self.info['qte'], nan=0.0),
+                'QTE Lower Bound': np.nan_to_num(self.info['qte.lower'], nan=0.0) if self.se else np.nan,
+                'QTE Upper Bound': np.nan_to_num(self.info['qte.upper'], nan=0.0) if self.se else np.nan
             })
+            if 'qte.band.lower' in self.info:
+                results_df['QTE Uniform Lower Bound'] = self.info['qte.band.lower']
+                results_df['QTE Uniform Upper Bound'] = self.info['qte.band.upper']
             return results_df
         except Exception as e:
             raise RuntimeError(f"Error retrieving the results: {e}")
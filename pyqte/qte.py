@@ -1,3 +1,4 @@
+import copy
 import pandas as pd
 import numpy as np
 import rpy2.robjects as ro
@@ -6,6 +7,13 @@ from rpy2.robjects.packages import importr
 from rpy2.robjects import Formula
 from rpy2.robjects.conversion import localconverter
 import matplotlib.pyplot as plt
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine, grouped_results, check_se_method
+from .bootstrap import fit_native, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
 
 # Activate the automatic conversion of pandas DataFrames to R DataFrames
 pandas2ri.activate()
@@ -14,7 +22,12 @@ pandas2ri.activate()
 qte = importr('qte')
 
 class QTEEstimator:
-    def __init__(self, formula, xformla=None, data=None, probs=[0.05, 0.95, 0.05], se=False, iters=100):
+    def __init__(self, formula, xformla=None, data=None, probs=[0.05, 0.95, 0.05], se=False, iters=100,
+                 engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False,
+                 se_method='bootstrap',
+                 low_memory=False, memory_budget_mb=None, by=None, seed=None, draws_path=None,
+                 bins=None):
         self.formula = formula
         self.xformla = xformla
         self.data = data
@@ -26,32 +39,80 @@ class QTEEstimator:
             
         self.se = se
         self.iters = iters
+        check_engine(engine, adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, by=by, draws_path=draws_path, bins=bins)
+        check_se_method(se_method, engine, uniform)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.bins = bins
+        self.by = by
+        self.uniform = uniform
+        self.se_method = se_method
         self.info = {}
+        self._problem = None
 
     def fit(self):
-        with localconverter(ro.default_converter + pandas2ri.converter):
-            r_data = ro.conversion.py2rpy(self.data)
-
-        # Call the ci_qte function from the R qte package
-        if self.xformla is not None:
-            self.result = qte.ci_qte(
-                formla=ro.Formula(self.formula),
-                xformla=ro.Formula(self.xformla),
-                data=r_data,
-                probs=self.probs,
-                se=self.se,
-                iters=self.iters
-            )
-        else:
-            self.result = qte.ci_qte(
-                formla=ro.Formula(self.formula),
-                data=r_data,
-                probs=self.probs,
-                se=self.se,
-                iters=self.iters
-            )
+        timer = FitTimer('QTEEstimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('qte', self.data, self.formula, xformla=self.xformla, by=self.by,
+                          engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                problem = build_problem('qte', self.data, self.formula, self.probs, xformla=self.xformla,
+                                        low_memory=self.low_memory, by=self.by, bins=self.bins)
+            self.result = None
+            self._problem = problem
+            self.info = fit_native(problem, se=self.se, iters=self.iters, adaptive=self.adaptive,
+                                   adaptive_tol=self.adaptive_tol, batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                   boot_weights=self.boot_weights, uniform=self.uniform,
+                                   se_method=self.se_method,
+                                   memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                   draws_path=self.draws_path, timer=timer)
+            self.info['timings'] = timer.finish()
+            return
+
+        with timer.phase('py2rpy', rows=rows):
+            with localconverter(ro.default_converter + pandas2ri.converter):
+                r_data = ro.conversion.py2rpy(self.data)
+
+        if self.seed is not None:
+            set_r_seed(self.seed)
 
-        self._extract_info()
+        # Call the ci_qte function from the R qte package (bootstrap included)
+        with timer.phase('r_call', rows=rows):
+            if self.xformla is not None:
+                self.result = qte.ci_qte(
+                    formla=ro.Formula(self.formula),
+                    xformla=ro.Formula(self.xformla),
+                    data=r_data,
+                    probs=self.probs,
+                    se=self.se,
+                    iters=self.iters
+                )
+            else:
+                self.result = qte.ci_qte(
+                    formla=ro.Formula(self.formula),
+                    data=r_data,
+                    probs=self.probs,
+                    se=self.se,
+                    iters=self.iters
+                )
+
+        with timer.phase('extract_info', rows=len(self.probs)):
+            self._extract_info()
+        self.info['timings'] = timer.finish()
 
     def _extract_info(self):
         """Extract information from the R result object."""
@@ -67,12 +128,27 @@ class QTEEstimator:
 
     def summary(self):
         """Print a summary of the results."""
+        if self.engine == 'native':
+            summary = self.get_results()
+            print(summary)
+            return summary
         summary = ro.r.summary(self.result)
         print(summary)
         return summary
 
-    def plot(self):
-        """Plot the Quantile Treatment Effects (QTE) with optional confidence intervals."""
+    def plot(self, path=None):
+        """
+        Plot the Quantile Treatment Effects (QTE) with optional confidence intervals.
+
+        Parameters:
+        -----------
+        path : str, optional
+            Save the plot to this file (PNG, SVG, PDF, ...) with a
+            non-interactive backend instead of showing it.
+        """
+        if path is not None:
+            return save_plot(self.to_result(), path, name='QTE', title='Quantile Treatment Effects (QTE)')
+
         tau = self.info['probs']
         qte = self.info['qte']
 
@@ -95,8 +171,49 @@ class QTEEstimator:
         plt.grid(True)
         plt.show()
 
+    def at(self, probs):
+        """
+        Re-evaluate a native fit at new quantiles without refitting.
+
+        The fit keeps its sorted samples and bootstrap seeds, so this only
+        inverts the ECDFs at `probs` and replays the same replicates.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : QTEEstimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        if self._problem is None:
+            raise ValueError("`at` requires a fit with engine='native'.")
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform,
+                                        se_method=self.se_method)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('QTEEstimator', self.info, replicates)
+
     def get_results(self):
         """Create a pandas DataFrame with the estimated results."""
+        if self.by is not None:
+            return grouped_results(self.info, 'QTE')
         df = pd.DataFrame({
             'Quantile': self.info['probs'],
             'QTE': self.info['qte']
@@ -105,6 +222,10 @@ class QTEEstimator:
         if self.se and self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
             df['QTE Lower Bound'] = self.info['qte.lower']
             df['QTE Upper Bound'] = self.info['qte.upper']
-        
+
+        if 'qte.band.lower' in self.info:
+            df['QTE Uniform Lower Bound'] = self.info['qte.band.lower']
+            df['QTE Uniform Upper Bound'] = self.info['qte.band.upper']
+
         return df
 
@@ -1,3 +1,4 @@
+import copy
 import pandas as pd
 import numpy as np
 import rpy2.robjects as ro
@@ -5,6 +6,13 @@ from rpy2.robjects import pandas2ri
 from rpy2.robjects.packages import importr
 from rpy2.robjects import Formula
 import matplotlib.pyplot as plt
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine, grouped_results, check_se_method
+from .bootstrap import fit_native, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
 
 # Ativando a conversão automática de pandas DataFrames para R data.frames
 pandas2ri.activate()
@@ -14,7 +22,12 @@ qte = importr('qte')
 
 class QTETEstimator:
     def __init__(self, formula, data, probs=None, se=True, iters=100, xformla=None, method='logit',
-                 weights=None, alp=0.05, retEachIter=False, indsample=True, printIter=False, pl=False, cores=2):
+                 weights=None, alp=0.05, retEachIter=False, indsample=True, printIter=False, pl=False, cores=2,
+                 engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial', uniform=False,
+                 se_method='bootstrap',
+                 low_memory=False, memory_budget_mb=None, by=None, seed=None, draws_path=None,
+                 bins=None):
         self.formula = formula
         self.data = data
         self.probs = np.arange(probs[0], probs[1] + probs[2], probs[2]) if probs and len(probs) == 3 else (probs if probs else np.arange(0.05, 1, 0.05))
@@ -29,12 +42,55 @@ class QTETEstimator:
         self.printIter = printIter
         self.pl = pl
         self.cores = cores
+        check_engine(engine, adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, by=by, draws_path=draws_path, bins=bins)
+        check_se_method(se_method, engine, uniform)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.bins = bins
+        self.by = by
+        self.uniform = uniform
+        self.se_method = se_method
         self.result = None
         self.info = {}
+        self._problem = None
 
     def fit(self):
+        timer = FitTimer('QTETEstimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('qtet', self.data, self.formula, xformla=self.xformla, weights=self.weights,
+                          by=self.by, engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                problem = build_problem('qtet', self.data, self.formula, self.probs, xformla=self.xformla,
+                                        method=self.method, weights=self.weights,
+                                        low_memory=self.low_memory, by=self.by, bins=self.bins)
+            self._problem = problem
+            self.info = fit_native(problem, se=self.se, iters=self.iters, alp=self.alp,
+                                   adaptive=self.adaptive, adaptive_tol=self.adaptive_tol,
+                                   batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                   boot_weights=self.boot_weights, uniform=self.uniform,
+                                   se_method=self.se_method,
+                                   memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                   draws_path=self.draws_path, timer=timer)
+            self.info['timings'] = timer.finish()
+            return
+
         r_formula = Formula(self.formula)
-        r_data = pandas2ri.py2rpy(self.data)
+        with timer.phase('py2rpy', rows=rows):
+            r_data = pandas2ri.py2rpy(self.data)
         
         additional_args = {
             'se': self.se,
@@ -55,13 +111,19 @@ class QTETEstimator:
         if self.weights is not None:
             additional_args['w'] = ro.FloatVector(self.weights)
 
-        self.result = qte.ci_qtet(
-            formla=r_formula,
-            data=r_data,
-            probs=ro.FloatVector(self.probs),
-            **additional_args
-        )
-        self._extract_info()
+        if self.seed is not None:
+            set_r_seed(self.seed)
+        with timer.phase('r_call', rows=rows):
+            self.result = qte.ci_qtet(
+                formla=r_formula,
+                data=r_data,
+                probs=ro.FloatVector(self.probs),
+                **additional_args
+            )
+
+        with timer.phase('extract_info', rows=len(self.probs)):
+            self._extract_info()
+        self.info['timings'] = timer.finish()
 
     def _extract_info(self):
         self.info['qte'] = np.array(self.result.rx2('qte'))
@@ -75,26 +137,43 @@ class QTETEstimator:
             self.info['qte.upper'] = None
 
     def summary(self):
-        if self.result is None:
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `summary()`.")
+        if self.engine == 'native':
+            summary = self.get_results()
+            print(summary)
+            return summary
         summary = ro.r.summary(self.result)
         print(summary)
         return summary
 
-    def plot(self):
-        if self.result is None:
+    def plot(self, path=None):
+        """
+        Plot the QTET estimates with confidence intervals, if available.
+
+        Parameters:
+        -----------
+        path : str, optional
+            Save the plot to this file (PNG, SVG, PDF, ...) with a
+            non-interactive backend instead of showing it.
+        """
+        if path is not None:
+            return save_plot(self.to_result(), path, name='QTET',
+                             title='Quantile Treatment Effects on the Treated (QTET)')
+
+        if 'qte' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `plot()`.")
         
-        tau = np.array(self.probs)
-        qte = np.array(self.result.rx2('qte'))
+        tau = self.info['probs']
+        qte = self.info['qte']
 
         plt.figure(figsize=(10, 6))
         plt.plot(tau, qte, 'o-', label="QTET")
 
         if self.se:
-            if 'qte.lower' in self.result.names and 'qte.upper' in self.result.names:
-                lower_bound = np.array(self.result.rx2('qte.lower'))
-                upper_bound = np.array(self.result.rx2('qte.upper'))
+            if self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
+                lower_bound = self.info['qte.lower']
+                upper_bound = self.info['qte.upper']
                 if np.issubdtype(lower_bound.dtype, np.number) and np.issubdtype(upper_bound.dtype, np.number):
                     plt.fill_between(tau, lower_bound, upper_bound, color='gray', alpha=0.2, label="95% CI")
                 else:
@@ -110,8 +189,49 @@ class QTETEstimator:
         plt.grid(True)
         plt.show()
 
+    def at(self, probs):
+        """
+        Re-evaluate a native fit at new quantiles without refitting.
+
+        The fit keeps its sorted samples and bootstrap seeds, so this only
+        inverts the ECDFs at `probs` and replays the same replicates.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : QTETEstimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        if self._problem is None:
+            raise ValueError("`at` requires a fit with engine='native'.")
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, alp=self.alp, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform,
+                                        se_method=self.se_method)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('QTETEstimator', self.info, replicates)
+
     def get_results(self):
         """Cria um DataFrame pandas com os resultados estimados."""
+        if self.by is not None:
+            return grouped_results(self.info, 'QTE')
         df = pd.DataFrame({
             'Quantile': self.info['probs'],
             'QTE': self.info['qte']
@@ -120,6 +240,10 @@ class QTETEstimator:
         if self.se and self.info['qte.lower'] is not None and self.info['qte.upper'] is not None:
             df['QTE Lower Bound'] = self.info['qte.lower']
             df['QTE Upper Bound'] = self.info['qte.upper']
-        
+
+        if 'qte.band.lower' in self.info:
+            df['QTE Uniform Lower Bound'] = self.info['qte.band.lower']
+            df['QTE Uniform Upper Bound'] = self.info['qte.band.upper']
+
         return df
 
@@ -0,0 +1,225 @@
+# quantreg.py
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import qr
+from scipy.optimize import linprog
+from .bootstrap import replicate_weights, root_seed
+
+# Tolerances of the optimality check and of zero residuals, relative to the data scale
+_TOL = 1e-9
+
+
+def _linprog_fit(X, y, tau):
+    """Solve one quantile regression as a linear program with HiGHS."""
+    # Dual of the check-loss minimization (Koenker, 2005, sec. 6.2):
+    # max y'a  s.t.  X'a = (1 - tau) X'1,  0 <= a <= 1
+    # Its p constraints are much cheaper than the 2n + p variables of the primal;
+    # the coefficients are (minus) the multipliers of the equality constraints.
+    result = linprog(-y, A_eq=X.T, b_eq=(1 - tau) * X.sum(axis=0), bounds=(0, 1), method='highs-ds')
+    if result.status != 0:
+        raise RuntimeError(f"Quantile regression at tau={tau} failed: {result.message}")
+    return -result.eqlin.marginals
+
+
+def _basis(X, y, beta):
+    """Pick p linearly independent observations interpolated by `beta`, or None."""
+    p = X.shape[1]
+    residuals = y - X @ beta
+    scale = _TOL * max(1.0, np.abs(y).max())
+    zero = np.flatnonzero(np.abs(residuals) <= scale * 1e3)
+    if len(zero) < p:
+        return None
+    _, R, pivots = qr(X[zero].T, pivoting=True, mode='economic')
+    if abs(R[p - 1, p - 1]) <= _TOL * abs(R[0, 0]):
+        return None
+    return zero[pivots[:p]]
+
+
+def _line_search(steps, gains, slope):
+    """
+    Index of the kink at which a convex piecewise linear path stops descending.
+
+    The slope starts at `slope` < 0 and increases by `gains[i]` at `steps[i]`.
+    The crossing is usually among the nearest kinks, so those are partitioned
+    out first and the full sort is only needed when it lies further away.
+    """
+    head = min(len(steps), 64)
+    while True:
+        if head < len(steps):
+            nearest = np.argpartition(steps, head - 1)[:head]
+        else:
+            nearest = np.arange(len(steps))
+        order = nearest[np.argsort(steps[nearest], kind='stable')]
+        crossed = np.searchsorted(slope + np.cumsum(gains[order]), 0.0)
+        if crossed < head or head == len(steps):
+            return order[min(crossed, head - 1)]
+        head = min(len(steps), 8 * head)
+
+
+def _simplex(X, y, tau, h, max_pivots):
+    """
+    Move from the vertex interpolating the observations `h` to the optimum at `tau`.
+
+    Each pivot frees one basic observation in the steepest descent direction
+    of the check loss and walks along it to the kink where the directional
+    derivative turns nonnegative, whose observation enters the basis.
+
+    Returns:
+    --------
+    beta, h, pivots : numpy.ndarray, numpy.ndarray, int
+        The solution, its basis and the number of pivots, or None when the
+        basis is singular or the pivoting cycles.
+    """
+    n, p = X.shape
+    h = h.copy()
+    nonbasic = np.ones(n, dtype=bool)
+    nonbasic[h] = False
+    visited = set()
+    scale = _TOL * max(1.0, np.abs(y).max())
+
+    for pivots in range(max_pivots + 1):
+        try:
+            Xh_inv = np.linalg.inv(X[h])
+        except np.linalg.LinAlgError:
+            return None
+        beta = Xh_inv @ y[h]
+        residuals = y - X @ beta
+        residuals[h] = 0.0
+        psi = np.where(residuals < -scale, tau - 1, tau)
+        psi[h] = 0.0
+        xi = (psi @ X) @ Xh_inv
+
+        # Directional derivatives of freeing basic observation j upwards or downwards
+        slopes = np.concatenate([(1 - tau) - xi, tau + xi])
+        best = int(np.argmin(slopes))
+        if slopes[best] >= -_TOL:
+            return beta, h, pivots
+        key = frozenset(h.tolist())
+        if key in visited or pivots == max_pivots:
+            return None
+        visited.add(key)
+
+        j, sign = best % p, (1.0 if best < p else -1.0)
+        direction = sign * Xh_inv[:, j]
+        xd = X @ direction
+        crossing = nonbasic & (((residuals >= -scale) & (xd > scale)) | ((residuals < -scale) & (xd < -scale)))
+        candidates = np.flatnonzero(crossing)
+        if len(candidates) == 0:
+            return None
+        steps = np.maximum(residuals[candidates] / xd[candidates], 0.0)
+        entering = candidates[_line_search(steps, np.abs(xd[candidates]), slopes[best])]
+
+        nonbasic[h[j]] = True
+        nonbasic[entering] = False
+        h[j] = entering
+    return None
+
+
+def _process(X, y, taus, h=None, max_pivots=None):
+    """Solve the sorted grid `taus`, warm-starting each quantile at the previous basis."""
+    n, p = X.shape
+    max_pivots = 50 * p if max_pivots is None else max_pivots
+    coef = np.empty((len(taus), p))
+    pivots = fallbacks = 0
+
+    for i, tau in enumerate(taus):
+        solution = _simplex(X, y, tau, h, max_pivots) if h is not None else None
+        if solution is None:
+            # First quantile, singular start or cycling: solve from scratch
+            beta = _linprog_fit(X, y, tau)
+            fallbacks += 1
+            h = _basis(X, y, beta)
+            solution = _simplex(X, y, tau, h, max_pivots) if h is not None else None
+            if solution is None:
+                coef[i] = beta
+                h = None
+                continue
+        coef[i], h, used = solution
+        pivots += used
+    return coef, pivots, fallbacks
+
+
+def quantile_regression_process(y, X, taus, weights=None, se=False, iters=100, batch_size=50,
+                                boot_weights='multinomial', alp=0.05, seed=None, rng=None, max_pivots=None):
+    """
+    Estimate linear quantile regressions over a whole grid of quantiles.
+
+    The first quantile is solved as a linear program (HiGHS dual simplex). Every
+    following quantile starts from the optimal basis of its neighbour, i.e.
+    the p observations interpolated by the previous fit, and reaches its own
+    optimum with a few simplex pivots, so the full grid costs a small multiple
+    of a single fit.
+
+    Parameters:
+    -----------
+    y : array-like
+        The outcome, shape (n,).
+    X : array-like or pandas.DataFrame
+        The design matrix including the intercept, shape (n, p).
+    taus : array-like
+        The quantiles to estimate.
+    weights : array-like, optional
+        Nonnegative observation weights.
+    se : bool, optional (default=False)
+        Compute bootstrap standard errors and percentile confidence intervals.
+    iters : int, optional (default=100)
+        The number of bootstrap replicates.
+    batch_size : int, optional (default=50)
+        The number of replicate weight vectors drawn at once.
+    boot_weights : str, optional (default='multinomial')
+        The kind of bootstrap weights, see `pyqte.bootstrap.bootstrap_weights`.
+    alp : float, optional (default=0.05)
+        The significance level of the confidence intervals.
+    seed : int, optional
+        The root seed of the bootstrap. Replicate b is drawn from its own
+        stream, see `pyqte.bootstrap.replicate_rng`.
+    rng : numpy.random.Generator, optional
+        The random number generator drawing the root seed when `seed` is None.
+    max_pivots : int, optional
+        The number of pivots per quantile before falling back to the linear
+        program (default 50 * p).
+
+    Returns:
+    --------
+    results : dict
+        'coef' (a tau x covariates DataFrame), 'taus', and the solver counts
+        'pivots' and 'fallbacks'. With `se`, also 'coef.se', 'coef.lower' and
+        'coef.upper' (same shape as 'coef') and the replicate estimates 'draws'
+        of shape (iters, len(taus), p).
+    """
+    names = list(X.columns) if isinstance(X, pd.DataFrame) else None
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    taus = np.asarray(taus, dtype=float)
+    if np.any((taus <= 0) | (taus >= 1)):
+        raise ValueError("`taus` must lie strictly between 0 and 1.")
+    if weights is not None:
+        # The check loss is positively homogeneous: w * rho(r) = rho(w * r)
+        weights = np.asarray(weights, dtype=float)
+        X, y = X * weights[:, None], y * weights
+
+    order = np.argsort(taus)
+    coef, pivots, fallbacks = _process(X, y, taus[order], max_pivots=max_pivots)
+    coef[order] = coef.copy()
+    frame = lambda values: pd.DataFrame(values, index=pd.Index(taus, name='tau'), columns=names)
+    results = {'taus': taus, 'coef': frame(coef), 'pivots': pivots, 'fallbacks': fallbacks}
+    if not se:
+        return results
+
+    seed = root_seed(seed, rng)
+    start = _basis(X, y, coef[order[0]])
+    draws = np.empty((iters, len(taus), X.shape[1]))
+    for first in range(0, iters, batch_size):
+        W = replicate_weights(seed, first, min(batch_size, iters - first), len(y), boot_weights)
+        for b, w in enumerate(W):
+            draw, used, fell = _process(X * w[:, None], y * w, taus[order], h=start, max_pivots=max_pivots)
+            draws[first + b][order] = draw
+            pivots += used
+            fallbacks += fell
+
+    std_err = draws.std(axis=0, ddof=1)
+    lower, upper = np.quantile(draws, [alp / 2, 1 - alp / 2], axis=0)
+    results.update({'coef.se': frame(std_err), 'coef.lower': frame(lower), 'coef.upper': frame(upper),
+                    'draws': draws, 'pivots': pivots, 'fallbacks': fallbacks})
+    return results
@@ -0,0 +1,220 @@
+# results.py
+
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow serialization is optional
+    pa = None
+
+# Array fields, in the order of the Arrow columns
+_ARRAYS = ('probs', 'estimate', 'se', 'lower', 'upper', 'band_lower', 'band_upper')
+_GROUP_PREFIX = 'group:'
+
+
+def _array(value):
+    return None if value is None else np.asarray(value, dtype=float)
+
+
+class EstimationResult:
+    """
+    The results of a fit held in plain NumPy arrays.
+
+    Unlike the R result objects and `info` dictionaries of the estimators, a
+    result pickles cheaply, so it can be returned from worker processes, and
+    is stored without pickle as `.npz` or as an Arrow table.
+
+    Parameters:
+    -----------
+    estimator : str
+        The name of the estimator class.
+    probs : numpy.ndarray or None
+        The quantiles, shape (k,), or None for a single average effect.
+    estimate : numpy.ndarray
+        The estimates, shape (k,), or (groups * k,) laid out group by group.
+    se, lower, upper : numpy.ndarray, optional
+        The standard errors and pointwise confidence bounds.
+    band_lower, band_upper : numpy.ndarray, optional
+        The uniform confidence band.
+    band_crit : float, optional
+        The critical value of the uniform band.
+    iters : int, optional
+        The number of bootstrap replicates used.
+    draws : numpy.ndarray, optional
+        The bootstrap replicates, shape (iters, len(estimate)).
+    groups : pandas.DataFrame, optional
+        The group labels of a fit with `by`.
+    timings : dict, optional
+        The per-phase timings of the fit.
+    """
+
+    __slots__ = ('estimator', 'probs', 'estimate', 'se', 'lower', 'upper', 'band_lower', 'band_upper',
+                 'band_crit', 'iters', 'draws', 'groups', 'timings')
+
+    def __init__(self, estimator, probs, estimate, se=None, lower=None, upper=None, band_lower=None,
+                 band_upper=None, band_crit=None, iters=None, draws=None, groups=None, timings=None):
+        self.estimator = estimator
+        self.probs = _array(probs)
+        self.estimate = _array(estimate)
+        self.se = _array(se)
+        self.lower = _array(lower)
+        self.upper = _array(upper)
+        self.band_lower = _array(band_lower)
+        self.band_upper = _array(band_upper)
+        self.band_crit = None if band_crit is None else float(band_crit)
+        self.iters = None if iters is None else int(iters)
+        self.draws = _array(draws)
+        self.groups = groups
+        self.timings = timings
+
+    @classmethod
+    def from_info(cls, estimator, info, draws=None):
+        """
+        Collect the results stored in an estimator's `info`.
+
+        Parameters:
+        -----------
+        estimator : str
+            The name of the estimator class.
+        info : dict
+            The `info` of a fitted estimator.
+        draws : numpy.ndarray, optional
+            The bootstrap replicates to keep.
+
+        Returns:
+        --------
+        result : EstimationResult
+        """
+        if 'qte' not in info:
+            # SpATT estimates a single average effect
+            se = info.get('ate.se')
+            return cls(estimator, None, [info['ate']], se=None if se is None else [se], iters=info.get('iters'),
+                       draws=draws, timings=info.get('timings'))
+        return cls(estimator, info['probs'], np.ravel(info['qte']), se=info.get('qte.se'),
+                   lower=info.get('qte.lower'), upper=info.get('qte.upper'),
+                   band_lower=info.get('qte.band.lower'), band_upper=info.get('qte.band.upper'),
+                   band_crit=info.get('band.crit'), iters=info.get('iters'), draws=draws,
+                   groups=info.get('groups'), timings=info.get('timings'))
+
+    def __repr__(self):
+        size = 1 if self.probs is None else len(self.probs)
+        groups = '' if self.groups is None else f", groups={len(self.groups)}"
+        return f"EstimationResult({self.estimator}, quantiles={size}{groups})"
+
+    def _rows(self):
+        """The group labels and quantiles of every estimate, as columns."""
+        columns = {}
+        if self.groups is not None:
+            for name in self.groups.columns:
+                columns[name] = np.repeat(self.groups[name].to_numpy(), len(self.probs))
+        if self.probs is not None:
+            repeats = 1 if self.groups is None else len(self.groups)
+            columns['Quantile'] = np.tile(self.probs, repeats)
+        return columns
+
+    def to_frame(self, name='QTE'):
+        """
+        Return the results as a DataFrame, one row per group and quantile.
+
+        Parameters:
+        -----------
+        name : str, optional (default='QTE')
+            The name of the estimate column, also prefixing the bound columns.
+        """
+        data = self._rows()
+        data[name] = self.estimate
+        for suffix, values in [('Std. Error', self.se), ('Lower Bound', self.lower), ('Upper Bound', self.upper),
+                               ('Uniform Lower Bound', self.band_lower),
+                               ('Uniform Upper Bound', self.band_upper)]:
+            if values is not None:
+                data[f'{name} {suffix}'] = values
+        return pd.DataFrame(data)
+
+    def to_npz(self, file, compressed=False):
+        """
+        Write the result to a `.npz` archive (no pickled objects).
+
+        Parameters:
+        -----------
+        file : str or file-like
+            The destination.
+        compressed : bool, optional (default=False)
+            Use `numpy.savez_compressed`.
+        """
+        arrays = {'estimator': np.array(self.estimator)}
+        for field in _ARRAYS + ('draws',):
+            value = getattr(self, field)
+            if value is not None:
+                arrays[field] = value
+        if self.band_crit is not None:
+            arrays['band_crit'] = np.array(self.band_crit)
+        if self.iters is not None:
+            arrays['iters'] = np.array(self.iters)
+        if self.timings is not None:
+            arrays['timings'] = np.array(json.dumps(self.timings, default=float))
+        if self.groups is not None:
+            for name in self.groups.columns:
+                column = self.groups[name]
+                arrays[_GROUP_PREFIX + str(name)] = (column.to_numpy() if pd.api.types.is_numeric_dtype(column)
+                                                     else column.astype(str).to_numpy(dtype=str))
+        (np.savez_compressed if compressed else np.savez)(file, **arrays)
+
+    @classmethod
+    def from_npz(cls, file):
+        """Read a result written by `to_npz`."""
+        with np.load(file, allow_pickle=False) as archive:
+            fields = {key: archive[key] for key in archive.files}
+        groups = {key[len(_GROUP_PREFIX):]: fields.pop(key) for key in list(fields) if key.startswith(_GROUP_PREFIX)}
+        return cls(str(fields.pop('estimator')), fields.pop('probs', None), fields.pop('estimate'),
+                   se=fields.get('se'), lower=fields.get('lower'), upper=fields.get('upper'),
+                   band_lower=fields.get('band_lower'), band_upper=fields.get('band_upper'),
+                   band_crit=fields.get('band_crit'), iters=fields.get('iters'), draws=fields.get('draws'),
+                   groups=pd.DataFrame(groups) if groups else None,
+                   timings=json.loads(str(fields['timings'])) if 'timings' in fields else None)
+
+    def to_arrow(self):
+        """
+        Return the result as a `pyarrow.Table`, one row per group and quantile.
+
+        The replicates are stored as a fixed-size list column, and the scalar
+        fields in the schema metadata. Requires pyarrow.
+        """
+        if pa is None:
+            raise ImportError("Arrow serialization requires pyarrow.")
+        columns = {name if name == 'Quantile' else _GROUP_PREFIX + str(name): values
+                   for name, values in self._rows().items()}
+        for field in _ARRAYS[1:]:
+            value = getattr(self, field)
+            if value is not None:
+                columns[field] = value
+        table = pa.table(columns)
+        if self.draws is not None:
+            flat = pa.array(np.ascontiguousarray(self.draws.T).ravel())
+            table = table.append_column('draws', pa.FixedSizeListArray.from_arrays(flat, self.draws.shape[0]))
+        metadata = {'estimator': self.estimator, 'band_crit': self.band_crit, 'iters': self.iters,
+                    'timings': self.timings, 'quantiles': None if self.probs is None else len(self.probs)}
+        return table.replace_schema_metadata({'pyqte': json.dumps(metadata, default=float)})
+
+    @classmethod
+    def from_arrow(cls, table):
+        """Rebuild a result from the table of `to_arrow`."""
+        metadata = json.loads(table.schema.metadata[b'pyqte'])
+        columns = {name: table.column(name) for name in table.column_names}
+        get = lambda name: columns[name].to_numpy() if name in columns else None
+        probs = groups = draws = None
+        if metadata['quantiles'] is not None:
+            probs = get('Quantile')[:metadata['quantiles']]
+        names = [name for name in table.column_names if name.startswith(_GROUP_PREFIX)]
+        if names:
+            step = metadata['quantiles'] or 1
+            groups = pd.DataFrame({name[len(_GROUP_PREFIX):]: columns[name].to_numpy()[::step] for name in names})
+        if 'draws' in columns:
+            values = columns['draws'].combine_chunks().flatten().to_numpy()
+            draws = values.reshape(table.num_rows, -1).T
+        return cls(metadata['estimator'], probs, get('estimate'), se=get('se'), lower=get('lower'),
+                   upper=get('upper'), band_lower=get('band_lower'), band_upper=get('band_upper'),
+                   band_crit=metadata['band_crit'], iters=metadata['iters'], draws=draws, groups=groups,
+                   timings=metadata['timings'])
@@ -1,8 +1,15 @@
 import pandas as pd
+import numpy as np
 import rpy2.robjects as ro
 from rpy2.robjects import pandas2ri
 from rpy2.robjects.packages import importr
 from rpy2.robjects import Formula
+from .helper_functions import set_r_seed
+from .timing import FitTimer
+from .validation import validate_data
+from .native import build_problem, check_engine
+from .bootstrap import fit_native, integer_seeds, replay_draws
+from .results import EstimationResult
 
 # Activate the automatic conversion of pandas DataFrames to R data.frames
 pandas2ri.activate()
@@ -13,13 +20,16 @@ qte = importr('qte')
 class SpATTEstimator:
     def __init__(self, formula, data, t, tmin1, tname, xformla=None, w=None, panel=False, idname=None, 
                  iters=100, alp=0.05, method="logit", se=True, 
-                 retEachIter=False, seedvec=None, pl=False, cores=2):
-        self.formula = Formula(formula)
-        self.data = pandas2ri.py2rpy(data)
+                 retEachIter=False, seedvec=None, pl=False, cores=2,
+                 engine='r', adaptive=False, adaptive_tol=0.01, batch_size=50,
+                 n_jobs=1, boot_weights='multinomial',
+                 low_memory=False, memory_budget_mb=None, seed=None, draws_path=None):
+        self.formula = formula
+        self.data = data
         self.t = t
         self.tmin1 = tmin1
         self.tname = tname
-        self.xformla = Formula(xformla) if xformla else None
+        self.xformla = xformla
         self.w = ro.FloatVector(w) if w is not None else None
         self.panel = panel
         self.idname = idname
@@ -31,12 +41,59 @@ class SpATTEstimator:
         self.seedvec = ro.FloatVector(seedvec) if seedvec is not None else None
         self.pl = pl
         self.cores = cores
+        check_engine(engine, adaptive, boot_weights, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, draws_path=draws_path)
+        self.engine = engine
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
         self.result = None
+        self.info = {}
+        self._problem = None
 
     def fit(self):
         """
         Estimate the Spatial Average Treatment on the Treated (SpATT) effect.
         """
+        timer = FitTimer('SpATTEstimator')
+        rows = len(self.data)
+
+        # Fail on unusable data before converting it to R or preparing the native problem
+        with timer.phase('validate', rows=rows):
+            validate_data('spatt', self.data, self.formula, xformla=self.xformla, t=self.t, tmin1=self.tmin1,
+                          tname=self.tname, idname=self.idname, panel=self.panel, weights=self.w,
+                          balanced=self.engine == 'r', engine=self.engine)
+
+        if self.engine == 'native':
+            with timer.phase('prepare', rows=rows):
+                weights = np.asarray(self.w, dtype=float) if self.w is not None else None
+                problem = build_problem('spatt', self.data, self.formula, [0.5], xformla=self.xformla,
+                                        t=self.t, tmin1=self.tmin1, tname=self.tname, idname=self.idname,
+                                        panel=self.panel, method=self.method, weights=weights,
+                                        low_memory=self.low_memory)
+            self._problem = problem
+            native = fit_native(problem, se=self.se, iters=self.iters, alp=self.alp, adaptive=self.adaptive,
+                                adaptive_tol=self.adaptive_tol, batch_size=self.batch_size, n_jobs=self.n_jobs,
+                                boot_weights=self.boot_weights,
+                                memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                                draws_path=self.draws_path, timer=timer)
+            self.info = {'ate': native['qte'][0], 'ate.se': native['qte.se'][0] if self.se else None,
+                         'iters': native.get('iters'), 'converged': native.get('converged')}
+            for key in ('batch_size', 'boot_seed', 'draws_path', 'draws_digest'):
+                if key in native:
+                    self.info[key] = native[key]
+            self.info['timings'] = timer.finish()
+            return
+
+        with timer.phase('py2rpy', rows=rows):
+            r_data = pandas2ri.py2rpy(self.data)
+
         additional_args = {
             't': self.t,
             'tmin1': self.tmin1,
@@ -51,7 +108,7 @@ class SpATTEstimator:
         }
 
         if self.xformla:
-            additional_args['xformla'] = self.xformla
+            additional_args['xformla'] = Formula(self.xformla)
         
         if self.w is not None:
             additional_args['w'] = self.w
@@ -61,22 +118,43 @@ class SpATTEstimator:
         
         if self.seedvec is not None:
             additional_args['seedvec'] = self.seedvec
+        elif self.seed is not None and self.se:
+            # One seed per bootstrap iteration, independent of `pl` and `cores`
+            additional_args['seedvec'] = ro.FloatVector(integer_seeds(self.seed, self.iters))
 
         if self.panel:
             additional_args['panel'] = self.panel
 
-        self.result = qte.spatt(
-            formla=self.formula,
-            data=self.data,
-            **additional_args
-        )
+        if self.seed is not None:
+            set_r_seed(self.seed)
+        with timer.phase('r_call', rows=rows):
+            self.result = qte.spatt(
+                formla=Formula(self.formula),
+                data=r_data,
+                **additional_args
+            )
+        self.info['ate'] = self.result.rx2('ate')[0]
+        self.info['timings'] = timer.finish()
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates of a native fit, recomputed
+            from its seeds.
+        """
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('SpATTEstimator', self.info, replicates)
 
     def summary(self):
         """
         Print a summary of the SpATT estimation result.
         """
-        if self.result is None:
+        if 'ate' not in self.info:
             raise ValueError("Model has not been fitted yet. Call `fit()` before calling `summary()`.")
         
-        ate = self.result.rx2('ate')[0]  # Extract the ATE
+        ate = self.info['ate']  # The extracted ATE
         print(f"Average Treatment Effect: {ate:.2f}")
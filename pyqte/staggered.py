@@ -0,0 +1,197 @@
+# staggered.py
+
+import copy
+
+import numpy as np
+from .timing import FitTimer
+from .validation import validate_staggered
+from .native import build_staggered_problem, check_engine, grouped_results
+from .bootstrap import fit_native, replay_draws, requery_native
+from .results import EstimationResult
+from .plot import save_plot
+
+
+class StaggeredEstimator:
+    """
+    Quantile treatment effects on the treated under staggered adoption.
+
+    Units adopting the treatment in the same period form a cohort. For every
+    cohort and period, a two-period estimator compares the cohort with the
+    comparison units between that period and the period before adoption
+    (group-time effects, including the pre-treatment periods as placebo
+    checks). The cell effects are then averaged by event time (periods since
+    adoption) and over all post-treatment cells (overall QTT), weighting each
+    cell by the size of its cohort. All of them are evaluated on the same
+    bootstrap replicates of the units, so their standard errors, bands and
+    `to_result(draws=True)` are consistent with each other.
+
+    The estimator only runs on the native engine.
+
+    Parameters:
+    -----------
+    formula : str
+        The formula 'outcome ~ treatment', with a treatment that switches from
+        0 to 1 at adoption and stays 1.
+    data : pandas.DataFrame
+        The panel in long format.
+    tname : str
+        The period column.
+    idname : str
+        The unit id column.
+    probs : array-like, optional (default=[0.05, 0.95, 0.05])
+        The quantiles, or [start, stop, step] when three values are given.
+    estimator : str, optional (default='cic')
+        The estimator of every cell: 'cic', 'qdid' or 'mdid'.
+    control_group : str, optional (default='nevertreated')
+        Compare the cohorts with the never-treated units, or with
+        'notyettreated' units (the never treated and the cohorts adopting
+        later than both the period and the cohort).
+    weights : array-like, optional
+        Sampling weights of the rows; a unit carries the weight of its first row.
+    se, iters, alp, adaptive, adaptive_tol, batch_size, n_jobs, boot_weights, uniform, low_memory,
+    memory_budget_mb, seed, draws_path :
+        As in the other estimator classes.
+    """
+
+    def __init__(self, formula, data, tname, idname, probs=[0.05, 0.95, 0.05], estimator='cic',
+                 control_group='nevertreated', weights=None, se=True, iters=100, alp=0.05, adaptive=False,
+                 adaptive_tol=0.01, batch_size=50, n_jobs=1, boot_weights='multinomial', uniform=False,
+                 low_memory=False, memory_budget_mb=None, seed=None, draws_path=None):
+        self.formula = formula
+        self.data = data
+        self.tname = tname
+        self.idname = idname
+        if isinstance(probs, list) and len(probs) == 3:
+            self.probs = np.arange(probs[0], probs[1] + probs[2], probs[2])
+        else:
+            self.probs = np.asarray(probs, dtype=float)
+        if estimator not in ('cic', 'qdid', 'mdid'):
+            raise ValueError(f"`estimator` must be one of ('cic', 'qdid', 'mdid'), not '{estimator}'.")
+        if control_group not in ('nevertreated', 'notyettreated'):
+            raise ValueError(f"`control_group` must be 'nevertreated' or 'notyettreated', not '{control_group}'.")
+        self.estimator = estimator
+        self.control_group = control_group
+        self.weights = weights
+        self.se = se
+        self.iters = iters
+        self.alp = alp
+        check_engine('native', adaptive, boot_weights, uniform, low_memory=low_memory,
+                     memory_budget_mb=memory_budget_mb, draws_path=draws_path)
+        self.engine = 'native'
+        self.adaptive = adaptive
+        self.adaptive_tol = adaptive_tol
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+        self.boot_weights = boot_weights
+        self.uniform = uniform
+        self.low_memory = low_memory
+        self.memory_budget_mb = memory_budget_mb
+        self.seed = seed
+        self.draws_path = draws_path
+        self.info = {}
+        self._problem = None
+
+    def fit(self):
+        """Estimate the group-time effects and their event-time and overall aggregates."""
+        timer = FitTimer('StaggeredEstimator')
+        rows = len(self.data)
+
+        with timer.phase('validate', rows=rows):
+            validate_staggered(self.data, self.formula, self.tname, self.idname, weights=self.weights,
+                               control_group=self.control_group)
+
+        with timer.phase('prepare', rows=rows):
+            problem = build_staggered_problem(self.estimator, self.data, self.formula, self.probs, self.tname,
+                                              self.idname, control_group=self.control_group,
+                                              weights=self.weights, low_memory=self.low_memory)
+        self._problem = problem
+        self.info = fit_native(problem, se=self.se, iters=self.iters, alp=self.alp, adaptive=self.adaptive,
+                               adaptive_tol=self.adaptive_tol, batch_size=self.batch_size, n_jobs=self.n_jobs,
+                               boot_weights=self.boot_weights, uniform=self.uniform,
+                               memory_budget_mb=self.memory_budget_mb, seed=self.seed,
+                               draws_path=self.draws_path, timer=timer)
+        self.info['timings'] = timer.finish()
+
+    def _check_fitted(self):
+        if not self.info:
+            raise ValueError("Model has not been fitted yet. Call `fit()` first.")
+
+    def get_results(self):
+        """
+        Create a pandas DataFrame with every estimate.
+
+        One row per quantile of every group-time cell, event time and of the
+        overall effect, told apart by the 'Aggregation' column.
+        """
+        self._check_fitted()
+        return grouped_results(self.info, 'QTE')
+
+    def group_time(self):
+        """The group-time effects, one row per cohort, period and quantile."""
+        results = self.get_results()
+        return results[results['Aggregation'] == 'group-time'].reset_index(drop=True)
+
+    def event_study(self):
+        """The effects averaged by event time (periods since adoption, negative before it)."""
+        results = self.get_results()
+        return (results[results['Aggregation'] == 'event-time'].drop(columns=['Cohort', 'Period'])
+                .reset_index(drop=True))
+
+    def overall(self):
+        """The overall QTT: the average of the post-treatment cells weighted by cohort size."""
+        results = self.get_results()
+        return (results[results['Aggregation'] == 'overall'].drop(columns=['Cohort', 'Period', 'Event Time'])
+                .reset_index(drop=True))
+
+    def summary(self):
+        self._check_fitted()
+        summary = self.event_study()
+        print(summary)
+        print(self.overall())
+        return summary
+
+    def plot(self, path):
+        """
+        Save the curves of every cell and aggregate to image files.
+
+        Parameters:
+        -----------
+        path : str
+            The file name (PNG, SVG, PDF, ...); the labels of each cell or
+            aggregate are appended to it, see `save_plot`.
+        """
+        return save_plot(self.to_result(), path, name='QTE', title='Staggered Adoption Quantile Effects')
+
+    def at(self, probs):
+        """
+        Re-evaluate the fit at new quantiles without refitting.
+
+        Parameters:
+        -----------
+        probs : array-like
+            The new quantiles.
+
+        Returns:
+        --------
+        estimator : StaggeredEstimator
+            A copy of the estimator whose results are evaluated at `probs`.
+        """
+        self._check_fitted()
+        requeried = copy.copy(self)
+        requeried.info = requery_native(self._problem, self.info, probs, alp=self.alp, n_jobs=self.n_jobs,
+                                        boot_weights=self.boot_weights, uniform=self.uniform)
+        requeried.probs = requeried.info['probs']
+        return requeried
+
+    def to_result(self, draws=False):
+        """
+        Return the results as a compact, serializable `EstimationResult`.
+
+        Parameters:
+        -----------
+        draws : bool, optional (default=False)
+            Also keep the bootstrap replicates, recomputed from their seeds.
+        """
+        self._check_fitted()
+        replicates = replay_draws(self._problem, self.info, self.n_jobs, self.boot_weights) if draws else None
+        return EstimationResult.from_info('StaggeredEstimator', self.info, replicates)
@@ -0,0 +1,138 @@
+# timing.py
+
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Module-level configuration shared by every estimator
+_config = {'enabled': True, 'track_memory': False}
+_hooks = []
+# The number of phases running on each thread, so that fits nested in a phase are not timed twice
+_active = threading.local()
+
+
+def configure_timing(enabled=True, track_memory=False):
+    """
+    Configure the per-phase instrumentation recorded on every fit.
+
+    Parameters:
+    -----------
+    enabled : bool, optional (default=True)
+        Record wall time and row counts for each phase. When False the
+        phases are not measured at all and `info['timings']` is empty.
+    track_memory : bool, optional (default=False)
+        Also record the peak Python memory allocated in each phase with
+        `tracemalloc`, which is only on while a phase runs. This slows
+        allocation-heavy code down, so it is off by default. `peak_mb` only
+        counts the allocations made through Python's allocators (including
+        NumPy arrays), not the memory used by embedded R, e.g. in the
+        'r_call' phase; the 'max_rss_mb' of the total covers the whole process.
+    """
+    _config['enabled'] = bool(enabled)
+    _config['track_memory'] = bool(track_memory)
+
+
+def add_timing_hook(hook):
+    """
+    Register a callback receiving the timings of every fit.
+
+    Parameters:
+    -----------
+    hook : callable
+        Called as `hook(estimator_name, timings)` once a fit finishes, where
+        `timings` is the dictionary stored in `info['timings']`.
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_timing_hook(hook):
+    """Unregister a callback previously passed to `add_timing_hook`."""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class FitTimer:
+    """
+    Collect wall time, peak memory and row counts for the phases of a fit.
+
+    A timer created while a phase of another timer runs on the same thread
+    (e.g. the point fits of `JointEstimator` in its 'prepare' phase) is
+    disabled: the nested fit counts toward the enclosing phase, does not
+    reset its memory peak and does not notify the hooks.
+
+    Parameters:
+    -----------
+    name : str
+        The name of the estimator, passed on to the timing hooks.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.enabled = _config['enabled'] and not getattr(_active, 'depth', 0)
+        self.track_memory = self.enabled and _config['track_memory']
+        self.timings = {}
+        self._start = time.perf_counter() if self.enabled else None
+
+    @contextmanager
+    def phase(self, name, rows=None):
+        """Measure the enclosed block as the phase `name`."""
+        if not self.enabled:
+            yield
+            return
+
+        # Tracing only runs inside the phase, so a fit raising in it does not leave it on
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            elif hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+; before, the peak since tracing started
+                tracemalloc.reset_peak()
+        start = time.perf_counter()
+        _active.depth = getattr(_active, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            _active.depth -= 1
+            record = {'wall_s': time.perf_counter() - start, 'rows': rows}
+            if self.track_memory:
+                record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+                if started_tracing:
+                    tracemalloc.stop()
+            # Repeated phases (e.g. bootstrap batches) accumulate
+            if name in self.timings:
+                previous = self.timings[name]
+                previous['wall_s'] += record['wall_s']
+                previous['calls'] += 1
+                if self.track_memory:
+                    previous['peak_mb'] = max(previous['peak_mb'], record['peak_mb'])
+            else:
+                record['calls'] = 1
+                self.timings[name] = record
+
+    def finish(self):
+        """Close the timer, notify the hooks and return the timings."""
+        if not self.enabled:
+            return {}
+
+        self.timings['total'] = {
+            'wall_s': time.perf_counter() - self._start,
+            'max_rss_mb': _max_rss_mb()
+        }
+        for hook in list(_hooks):
+            hook(self.name, self.timings)
+        return self.timings
@@ -1,12 +1,60 @@
 # utils.py
 
+import numpy as np
+from .bootstrap import iter_replicates
+
 def calculate_quantiles(data, probs):
     # Implementação completa para calcular quantis
     pass
 
-def bootstrap_estimation(data, func, iters=100):
-    # Implementação completa da função de bootstrap
-    pass
+def _take(data, indices):
+    return data.iloc[indices] if hasattr(data, 'iloc') else np.asarray(data)[indices]
+
+
+def bootstrap_estimation(data, func, iters=100, batch_size=50, weighted=False, seed=None, strata=None):
+    """
+    Bootstrap a user statistic without materializing all the resamples.
+
+    Replicates are generated lazily in batches (see
+    `pyqte.bootstrap.iter_replicates`), so memory stays at O(n + batch_size * n)
+    instead of one copy of the data per replicate.
+
+    Parameters:
+    -----------
+    data : pandas.DataFrame or array-like
+        The sample, one resampling unit per row.
+    func : callable
+        With `weighted=False`, `func(sample)` receives one resampled copy of
+        `data` at a time and returns a scalar or an array. With
+        `weighted=True`, `func(data, W)` receives the original data and a
+        (batch, n) matrix of frequency weights, and returns one estimate per
+        row of `W`, which avoids copying the data altogether.
+    iters : int, optional (default=100)
+        The number of replicates.
+    batch_size : int, optional (default=50)
+        The number of replicates drawn at once.
+    weighted : bool, optional (default=False)
+        Pass frequency weights instead of resampled copies.
+    seed : int, optional
+        The root seed. Both modes draw the same resamples for the same seed.
+    strata : array-like, optional
+        Integer stratum codes; every stratum is resampled separately.
+
+    Returns:
+    --------
+    estimates : numpy.ndarray
+        The (iters, ...) bootstrap estimates.
+    """
+    n = len(data)
+    strata = None if strata is None else np.asarray(strata)
+    estimates = []
+    output = 'weights' if weighted else 'indices'
+    for batch in iter_replicates(n, iters, batch_size, output=output, seed=seed, strata=strata):
+        if weighted:
+            estimates.extend(np.asarray(func(data, batch)))
+        else:
+            estimates.extend(np.asarray(func(_take(data, indices))) for indices in batch)
+    return np.array(estimates)
 
 def propensity_score_matching(data, treatment, covariates):
     # Implementação completa para Propensity Score Matching
@@ -0,0 +1,333 @@
+# validation.py
+
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from .native import parse_formula, parse_xformla
+
+# The estimators whose outcome is compared across two (or three) periods
+PERIOD_KINDS = ('cic', 'qdid', 'mdid', 'panel_qtet', 'ddid2', 'spatt')
+
+# Panel estimators reading the treatment of each unit in period `t` only
+_WIDE_KINDS = ('panel_qtet', 'ddid2', 'spatt')
+
+# Tokens of an R formula: numbers and strings (skipped), backquoted and plain names, the latter
+# followed by '(' when they call a function
+_R_TOKEN = re.compile(r"(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?L?)|(?P<string>'[^']*'|\"[^\"]*\")"
+                      r"|`(?P<quoted>[^`]+)`|(?P<name>[A-Za-z.][A-Za-z0-9._]*)(?P<call>\s*\()?")
+_R_CONSTANTS = {'TRUE', 'FALSE', 'T', 'F', 'NULL', 'NA', 'NaN', 'Inf', 'pi', '.'}
+
+ValidationProblem = namedtuple('ValidationProblem', ['check', 'column', 'message'])
+
+
+class DataValidationError(ValueError):
+    """
+    Raised by `validate_data` when the data cannot be used by an estimator.
+
+    Attributes:
+    -----------
+    kind : str
+        The estimator kind, e.g. 'cic'.
+    problems : list of ValidationProblem
+        Every problem found, as `(check, column, message)` tuples. `check` is
+        one of 'argument', 'missing_column', 'dtype', 'missing_values',
+        'missing_period', 'empty_group', 'duplicate_id', 'unbalanced_panel',
+        'treatment_reversal' or 'weights'; `column` is None for problems not tied to a column.
+    """
+
+    def __init__(self, kind, problems):
+        self.kind = kind
+        self.problems = list(problems)
+        lines = '\n'.join(f"- [{p.check}] {p.message}" for p in self.problems)
+        super().__init__(f"The data cannot be used by the '{kind}' estimator:\n{lines}")
+
+    def checks(self):
+        """Return the names of the failed checks, in the order they were found."""
+        return [p.check for p in self.problems]
+
+
+def r_variables(xformla):
+    """
+    Return the variable names of an R covariate formula.
+
+    The R engine passes `xformla` to R, which accepts terms such as
+    'I(age^2)', 'log(age)' or 'poly(age, 2)' that the native formula parser
+    rejects. The columns are the names that are not called as functions,
+    numbers, strings or R constants.
+
+    Parameters:
+    -----------
+    xformla : str
+        The covariate formula, e.g. '~ age + I(age^2)'.
+
+    Returns:
+    --------
+    covariates : list of str
+        The names of the columns used by the formula, in order.
+    """
+    names = []
+    for token in _R_TOKEN.finditer(str(xformla)):
+        name = token.group('quoted') or (None if token.group('call') else token.group('name'))
+        if name and name not in _R_CONSTANTS and name not in names:
+            names.append(name)
+    return names
+
+
+def _columns(kind, formula, xformla, tname, idname, panel, by, problems, engine='native'):
+    """Return the outcome, treatment and the columns each role requires."""
+    outcome, treatment = parse_formula(formula)
+    roles = {outcome: 'outcome', treatment: 'treatment'}
+    if xformla:
+        for name in (r_variables(xformla) if engine == 'r' else parse_xformla(xformla)):
+            roles.setdefault(name, 'covariate')
+    if kind in PERIOD_KINDS:
+        if tname is None:
+            problems.append(ValidationProblem('argument', None, "`tname` is required."))
+        else:
+            roles.setdefault(tname, 'time')
+    if _is_panel(kind, panel):
+        if idname is None:
+            problems.append(ValidationProblem('argument', None, "`idname` is required for panel estimators."))
+        else:
+            roles.setdefault(idname, 'id')
+    for name in [] if by is None else [by] if isinstance(by, str) else list(by):
+        roles.setdefault(name, 'group')
+    return outcome, treatment, roles
+
+
+def _is_panel(kind, panel):
+    """Whether an estimator kind follows units over periods (PanelQTET always does)."""
+    return kind == 'panel_qtet' or (kind in PERIOD_KINDS and bool(panel))
+
+
+def _is_r_object(data):
+    """Whether `data` is already an R object, e.g. a data frame from `prepare_r_data`."""
+    return type(data).__module__.split('.')[0] == 'rpy2'
+
+
+def validate_data(kind, data, formula, xformla=None, t=None, tmin1=None, tmin2=None, tname=None,
+                  idname=None, panel=False, weights=None, by=None, balanced=True, engine='native'):
+    """
+    Check that the data can be used by an estimator before any work is done.
+
+    The columns used by the estimator are projected once, and period
+    presence, missing values, column dtypes, treated and control group sizes
+    and panel balance are checked with vectorized operations over them. All
+    problems are collected and reported together, so a fit fails in
+    milliseconds rather than inside R or after the bootstrap.
+
+    Parameters:
+    -----------
+    kind : str
+        One of 'qte', 'qtet', 'cic', 'qdid', 'mdid', 'panel_qtet', 'ddid2' or 'spatt'.
+    data : pandas.DataFrame
+        The dataset, in long format for the panel estimators. An R data
+        frame (e.g. from `prepare_r_data`) is passed on to R unchecked, as
+        the R engine always did; the native engine rejects it.
+    formula : str
+        The formula 'outcome ~ treatment'.
+    xformla, t, tmin1, tmin2, tname, idname, panel, weights, by :
+        As in the corresponding estimator class.
+    balanced : bool, optional (default=True)
+        Require every unit of a panel to be observed in all periods. The
+        native engine drops the other units, so it only requires some units
+        to be observed in all periods.
+    engine : str, optional (default='native')
+        The engine of the estimator. With 'r', `xformla` may use any R
+        formula syntax, and only the columns it names are checked (see
+        `r_variables`).
+
+    Raises:
+    -------
+    DataValidationError
+        Listing every problem found.
+    """
+    if _is_r_object(data):
+        return
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError("`data` must be a pandas DataFrame or, with engine='r', an R data frame.")
+    problems = []
+    outcome, treatment, roles = _columns(kind, formula, xformla, tname, idname, panel, by, problems, engine)
+    missing = [name for name in roles if name not in data.columns]
+    problems += [ValidationProblem('missing_column', name, f"The {roles[name]} column '{name}' is not in the data.")
+                 for name in missing]
+    if problems:
+        raise DataValidationError(kind, problems)
+
+    # Project the columns once; every check below works on this frame
+    frame = data[list(roles)]
+    periods = []
+    if kind in PERIOD_KINDS:
+        periods = [t, tmin1] + ([tmin2] if kind == 'panel_qtet' else [])
+        present = frame[tname].isin(periods).to_numpy()
+        observed = pd.unique(frame[tname].to_numpy()[present])
+        for name, period in zip(['t', 'tmin1', 'tmin2'], periods):
+            if period is None:
+                problems.append(ValidationProblem('argument', None, f"`{name}` is required."))
+            elif not np.isin(period, observed):
+                problems.append(ValidationProblem('missing_period', tname,
+                                                  f"Period {name}={period!r} does not occur in '{tname}'."))
+        frame = frame[present]
+
+    if weights is not None:
+        w = np.asarray(weights, dtype=float)
+        if w.shape != (len(data),):
+            problems.append(ValidationProblem('weights', None, f"`weights` has shape {w.shape}, "
+                                                               f"but the data has {len(data)} rows."))
+        elif not np.all(np.isfinite(w)) or np.any(w < 0):
+            problems.append(ValidationProblem('weights', None, "`weights` must be finite and non-negative."))
+
+    for name in (outcome, treatment):
+        if not (pd.api.types.is_numeric_dtype(frame[name]) or pd.api.types.is_bool_dtype(frame[name])):
+            problems.append(ValidationProblem('dtype', name, f"The {roles[name]} column '{name}' must be numeric, "
+                                                             f"not {frame[name].dtype}."))
+    nans = frame.isna().sum()
+    for name, count in nans[nans > 0].items():
+        problems.append(ValidationProblem('missing_values', name, f"The {roles[name]} column '{name}' has "
+                                                                  f"{count} missing values."))
+    if any(p.check == 'dtype' for p in problems):
+        raise DataValidationError(kind, problems)
+
+    d = frame[treatment].to_numpy(dtype=float)
+    if not np.all(np.isin(d[~np.isnan(d)], (0.0, 1.0))):
+        problems.append(ValidationProblem('dtype', treatment,
+                                          f"The treatment column '{treatment}' must only contain 0 and 1."))
+
+    # A missing period already explains why no unit is observed in all periods
+    if _is_panel(kind, panel) and idname is not None and 'missing_period' not in [p.check for p in problems]:
+        problems += _panel_problems(frame, tname, idname, len(periods), balanced)
+
+    problems += _group_problems(kind, frame, treatment, d, t, tname, panel, by)
+    if problems:
+        raise DataValidationError(kind, problems)
+
+
+def _panel_problems(frame, tname, idname, n_periods, balanced):
+    problems = []
+    # One count per (unit, period) cell, from integer codes rather than a groupby
+    unit = pd.factorize(frame[idname])[0]
+    period = pd.factorize(frame[tname])[0]
+    # Missing ids are reported as missing values
+    unit, period = unit[unit >= 0], period[unit >= 0]
+    n_units = unit.max() + 1 if len(unit) else 0
+    cells = np.bincount(unit * n_periods + period, minlength=n_units * n_periods)
+    duplicated = int(np.sum(np.maximum(cells - 1, 0)))
+    if duplicated:
+        problems.append(ValidationProblem('duplicate_id', idname, f"{duplicated} rows repeat an '{idname}' "
+                                                                  f"within a period."))
+    counts = (cells > 0).reshape(n_units, n_periods).sum(axis=1)
+    unbalanced = int(np.sum(counts < n_periods))
+    if unbalanced and (balanced or unbalanced == len(counts)):
+        problems.append(ValidationProblem('unbalanced_panel', idname,
+                                          f"{unbalanced} of {len(counts)} units are not observed in all "
+                                          f"{n_periods} periods."))
+    return problems
+
+
+def _group_problems(kind, frame, treatment, d, t, tname, panel, by):
+    """Require treated and control observations in every cell the estimator compares."""
+    keys = [] if by is None else [by] if isinstance(by, str) else list(by)
+    if kind in _WIDE_KINDS and _is_panel(kind, panel):
+        # The treatment of a unit is read in period t
+        mask = (frame[tname] == t).to_numpy()
+        frame, d = frame[mask], d[mask]
+    elif kind in PERIOD_KINDS:
+        keys = keys + [tname]
+    treated = pd.Series(d == 1, index=frame.index, name=treatment)
+    if keys:
+        counts = treated.groupby([frame[key] for key in keys], sort=True).agg(['sum', 'size'])
+    else:
+        counts = pd.DataFrame({'sum': [treated.sum()], 'size': [len(treated)]}, index=['all'])
+    problems = []
+    for label, row in counts.iterrows():
+        cell = '' if not keys else f" in cell {dict(zip(keys, label if isinstance(label, tuple) else (label,)))}"
+        n_treated, n_control = int(row['sum']), int(row['size'] - row['sum'])
+        if n_treated == 0 or n_control == 0:
+            problems.append(ValidationProblem('empty_group', treatment, f"There are {n_treated} treated and "
+                                                                        f"{n_control} control observations{cell}."))
+    if not len(counts):
+        problems.append(ValidationProblem('empty_group', treatment, "There are no observations to compare."))
+    return problems
+
+
+def validate_staggered(data, formula, tname, idname, weights=None, control_group='nevertreated'):
+    """
+    Check that a panel can be used by `StaggeredEstimator`.
+
+    Besides the checks of `validate_data`, the treatment of every unit must
+    switch on at most once and stay on, and there must be a cohort adopting
+    after the first period and, with `control_group='nevertreated'`, units
+    that are never treated.
+
+    Parameters:
+    -----------
+    data : pandas.DataFrame
+        The panel in long format.
+    formula, tname, idname, weights, control_group :
+        As in `StaggeredEstimator`.
+
+    Raises:
+    -------
+    DataValidationError
+        Listing every problem found.
+    """
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError("`data` must be a pandas DataFrame.")
+    kind = 'staggered'
+    outcome, treatment = parse_formula(formula)
+    roles = {outcome: 'outcome', treatment: 'treatment'}
+    roles.setdefault(tname, 'time')
+    roles.setdefault(idname, 'id')
+    problems = [ValidationProblem('missing_column', name, f"The {roles[name]} column '{name}' is not in the data.")
+                for name in roles if name not in data.columns]
+    if problems:
+        raise DataValidationError(kind, problems)
+
+    frame = data[list(roles)]
+    if weights is not None:
+        w = np.asarray(weights, dtype=float)
+        if w.shape != (len(data),):
+            problems.append(ValidationProblem('weights', None, f"`weights` has shape {w.shape}, "
+                                                               f"but the data has {len(data)} rows."))
+        elif not np.all(np.isfinite(w)) or np.any(w < 0):
+            problems.append(ValidationProblem('weights', None, "`weights` must be finite and non-negative."))
+    for name in (outcome, treatment):
+        if not (pd.api.types.is_numeric_dtype(frame[name]) or pd.api.types.is_bool_dtype(frame[name])):
+            problems.append(ValidationProblem('dtype', name, f"The {roles[name]} column '{name}' must be numeric, "
+                                                             f"not {frame[name].dtype}."))
+    nans = frame.isna().sum()
+    for name, count in nans[nans > 0].items():
+        problems.append(ValidationProblem('missing_values', name, f"The {roles[name]} column '{name}' has "
+                                                                  f"{count} missing values."))
+    if problems:
+        raise DataValidationError(kind, problems)
+
+    d = frame[treatment].to_numpy(dtype=float)
+    if not np.all(np.isin(d, (0.0, 1.0))):
+        problems.append(ValidationProblem('dtype', treatment,
+                                          f"The treatment column '{treatment}' must only contain 0 and 1."))
+    periods = np.sort(pd.unique(frame[tname]))
+    problems += _panel_problems(frame, tname, idname, len(periods), balanced=False)
+
+    # Within a unit, ordered by period, the treatment may only go from 0 to 1
+    unit = pd.factorize(frame[idname])[0]
+    period = np.searchsorted(periods, frame[tname].to_numpy())
+    order = np.lexsort((period, unit))
+    unit, period, d = unit[order], period[order], d[order]
+    reversed_units = np.unique(unit[1:][(unit[1:] == unit[:-1]) & (d[1:] < d[:-1])])
+    if len(reversed_units):
+        problems.append(ValidationProblem('treatment_reversal', treatment,
+                                          f"The treatment of {len(reversed_units)} units switches back from 1 "
+                                          f"to 0; staggered adoption requires it to stay on."))
+    first = np.full(unit.max() + 1 if len(unit) else 0, len(periods))
+    np.minimum.at(first, unit[d == 1], period[d == 1])
+    if not np.any((first > 0) & (first < len(periods))):
+        problems.append(ValidationProblem('empty_group', treatment, "No units adopt the treatment after the "
+                                                                    "first period."))
+    if control_group == 'nevertreated' and not np.any(first == len(periods)):
+        problems.append(ValidationProblem('empty_group', treatment, "There are no never-treated units; use "
+                                                                    "control_group='notyettreated'."))
+    if problems:
+        raise DataValidationError(kind, problems)
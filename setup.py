@@ -19,6 +19,9 @@ setup(
         "statsmodels",
         "rpy2"
     ],
+    entry_points={
+        'console_scripts': ['pyqte=pyqte.cli:main'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.bootstrap import (bootstrap_draws, bootstrap_weights, budget_batch_size, fit_native, iter_replicates,
+                             load_draws, multinomial_weights, replay_draws, requery_native)
+from pyqte.native import build_problem
+from pyqte.qte import QTEEstimator
+
+class TestBootstrap(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        treat = np.repeat([0, 1], 300)
+        self.df = pd.DataFrame({'re': rng.normal(size=600) + treat, 'treat': treat})
+        self.problem = build_problem('qte', self.df, 're ~ treat', [0.25, 0.5, 0.75])
+
+    def test_multinomial_weights(self):
+        W = multinomial_weights(np.random.default_rng(1), 50, 7)
+        self.assertEqual(W.shape, (7, 50))
+        np.testing.assert_array_equal(W.sum(axis=1), np.full(7, 50))
+        # Stratified draws keep the size of every stratum
+        strata = np.arange(50) % 4
+        W = multinomial_weights(np.random.default_rng(1), 50, 7, strata=strata)
+        for s in range(4):
+            np.testing.assert_array_equal(W[:, strata == s].sum(axis=1), np.full(7, np.sum(strata == s)))
+
+    def test_iter_replicates(self):
+        weights = np.vstack(list(iter_replicates(30, iters=11, batch_size=4, seed=5)))
+        indices = np.vstack(list(iter_replicates(30, iters=11, batch_size=5, output='indices', seed=5)))
+        self.assertEqual(weights.shape, (11, 30))
+        # Indices and weights of one seed describe the same resamples, in any batch layout
+        np.testing.assert_array_equal(weights, [np.bincount(row, minlength=30) for row in indices])
+        with self.assertRaises(ValueError):
+            next(iter_replicates(30, output='indices', boot_weights='exponential'))
+
+    def test_fixed_iterations(self):
+        draws, converged = bootstrap_draws(self.problem, iters=120, batch_size=50,
+                                           rng=np.random.default_rng(2))
+        self.assertEqual(draws.shape, (120, 3))
+        self.assertIsNone(converged)
+
+    def test_adaptive_stops_early(self):
+        draws, converged = bootstrap_draws(self.problem, iters=5000, batch_size=100,
+                                           rng=np.random.default_rng(3), adaptive=True, tol=0.2)
+        self.assertTrue(converged)
+        self.assertLess(len(draws), 5000)
+
+    def test_fit_native(self):
+        info = fit_native(self.problem, iters=60, rng=np.random.default_rng(4))
+        self.assertEqual(info['iters'], 60)
+        self.assertTrue(np.all(info['qte.lower'] <= info['qte']))
+        self.assertTrue(np.all(info['qte.upper'] >= info['qte']))
+        no_se = fit_native(self.problem, se=False)
+        self.assertIsNone(no_se['qte.se'])
+
+    def test_multiplier_weights(self):
+        rng = np.random.default_rng(5)
+        W = bootstrap_weights(rng, 40, 6, 'exponential')
+        self.assertEqual(W.shape, (6, 40))
+        self.assertTrue(np.all(W > 0))
+        W = bootstrap_weights(rng, 40, 6, 'dirichlet')
+        np.testing.assert_allclose(W.sum(axis=1), np.full(6, 40.0))
+        with self.assertRaises(ValueError):
+            bootstrap_weights(rng, 40, 6, 'poisson')
+
+    def test_low_memory(self):
+        compact = build_problem('qte', self.df, 're ~ treat', [0.25, 0.5, 0.75], low_memory=True)
+        # 600 observations of 4-byte weights, three copies per replicate
+        self.assertEqual(budget_batch_size(compact, 50, 7200 * 10 / 2**20), 10)
+        self.assertEqual(budget_batch_size(compact, 50, None), 50)
+        info = fit_native(compact, iters=40, memory_budget_mb=7200 * 10 / 2**20, rng=np.random.default_rng(7))
+        self.assertEqual(info['batch_size'], 10)
+        self.assertEqual(info['precision']['dtype'], 'float32')
+        self.assertLess(info['precision']['replicate_max_abs_diff'], 1e-6)
+        reference = fit_native(self.problem, iters=40, batch_size=10, rng=np.random.default_rng(7))
+        np.testing.assert_allclose(info['qte.se'], reference['qte.se'], atol=1e-6)
+
+    def test_uniform_band(self):
+        info = fit_native(self.problem, iters=200, boot_weights='dirichlet', uniform=True,
+                          rng=np.random.default_rng(6))
+        # The sup-t band is at least as wide as the pointwise interval
+        self.assertGreaterEqual(info['band.crit'], 1.96)
+        self.assertTrue(np.all(info['qte.band.lower'] <= info['qte.lower']))
+        self.assertTrue(np.all(info['qte.band.upper'] >= info['qte.upper']))
+
+    def test_refit_replaces_results(self):
+        est = QTEEstimator('re ~ treat', data=self.df, probs=[0.25, 0.5, 0.75], se=True, iters=200, adaptive=True,
+                           adaptive_tol=0.5, uniform=True, engine='native', seed=1)
+        est.fit()
+        self.assertIn('QTE Uniform Lower Bound', est.get_results().columns)
+        est.uniform, est.adaptive, est.iters = False, False, 30
+        est.fit()
+        # Nothing of the adaptive, uniform fit is left over
+        self.assertNotIn('qte.band.lower', est.info)
+        self.assertNotIn('QTE Uniform Lower Bound', est.get_results().columns)
+        self.assertEqual((est.info['iters'], est.info['converged']), (30, None))
+
+    def test_requery_matches_refit(self):
+        info = fit_native(self.problem, iters=45, batch_size=20, uniform=True, rng=np.random.default_rng(8))
+        self.assertIn('boot_seed', info)
+        probs = np.arange(0.01, 1.0, 0.01)
+        requeried = requery_native(self.problem, info, probs, uniform=True)
+        refit = fit_native(build_problem('qte', self.df, 're ~ treat', probs), iters=45, batch_size=20,
+                           uniform=True, rng=np.random.default_rng(8))
+        for key in ('qte', 'qte.se', 'qte.lower', 'qte.band.upper'):
+            np.testing.assert_array_equal(requeried[key], refit[key])
+        # The fitted problem keeps its own quantiles
+        self.assertEqual(len(self.problem.probs), 3)
+
+    def test_draws_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'draws.npy')
+            info = fit_native(self.problem, iters=70, batch_size=20, uniform=True, seed=9, draws_path=path)
+            in_memory = fit_native(self.problem, iters=70, batch_size=20, uniform=True, seed=9)
+            for key in ('qte.se', 'qte.band.lower'):
+                np.testing.assert_array_equal(info[key], in_memory[key])
+            draws = replay_draws(self.problem, info)
+            self.assertIsInstance(draws, np.memmap)
+            np.testing.assert_array_equal(draws, replay_draws(self.problem, in_memory))
+            del draws
+            # Another fit overwriting the file with as many replicates is not mistaken for this one
+            fit_native(self.problem, iters=70, batch_size=20, seed=10, draws_path=path)
+            replayed = replay_draws(self.problem, info)
+            self.assertNotIsInstance(replayed, np.memmap)
+            np.testing.assert_allclose(np.std(replayed, axis=0, ddof=1), info['qte.se'])
+            # An adaptive run keeps only the replicates it used
+            draws, _ = bootstrap_draws(self.problem, iters=5000, batch_size=100, adaptive=True, tol=0.2, seed=3,
+                                       draws_path=path)
+            self.assertEqual(load_draws(path).shape, (len(draws), 3))
+            self.assertLess(len(draws), 5000)
+            del draws
+            with self.assertRaises(ValueError):
+                bootstrap_draws(self.problem, iters=0, seed=3, draws_path=path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.cli import expand_spec, load_spec, main, run_spec
+from pyqte.results import EstimationResult
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        treat = np.repeat([0, 1], 100)
+        self.directory = tempfile.mkdtemp()
+        pd.DataFrame({'re': rng.normal(size=200) + treat, 'treat': treat}).to_csv(
+            os.path.join(self.directory, 'cross.csv'), index=False)
+        self.spec = {
+            'datasets': {'cross': {'path': 'cross.csv'}},
+            'runs': [{'name': 'qte', 'estimator': 'QTEEstimator', 'dataset': 'cross',
+                      'params': {'formula': 're ~ treat', 'probs': [0.25, 0.75, 0.25], 'engine': 'native'},
+                      'grid': {'se': [False, True], 'iters': [20, 30]}}]
+        }
+        self.spec_path = os.path.join(self.directory, 'spec.json')
+        with open(self.spec_path, 'w') as handle:
+            json.dump(self.spec, handle)
+
+    def test_expand_spec(self):
+        jobs = expand_spec(load_spec(self.spec_path))
+        self.assertEqual(len(jobs), 4)
+        self.assertEqual(len({job['id'] for job in jobs}), 4)
+        # Ids only depend on the job, not on its position in the spec
+        self.assertEqual([job['id'] for job in jobs], [job['id'] for job in expand_spec(load_spec(self.spec_path))])
+        self.assertEqual(jobs[3]['params']['iters'], 30)
+        with self.assertRaises(ValueError):
+            expand_spec({'datasets': {}, 'runs': [{'estimator': 'QTEEstimator', 'dataset': 'missing'}]})
+
+    def test_run_and_resume(self):
+        output = os.path.join(self.directory, 'results')
+        self.assertEqual(main(['run', self.spec_path, '--output', output]), 0)
+        jobs = expand_spec(load_spec(self.spec_path))
+        result = EstimationResult.from_npz(os.path.join(output, jobs[3]['id'] + '.npz'))
+        self.assertEqual(result.iters, 30)
+
+        # Finished jobs are skipped, removed ones run again, in worker processes
+        os.remove(os.path.join(output, jobs[0]['id'] + '.npz'))
+        summary = run_spec(load_spec(self.spec_path), output, n_jobs=2)
+        self.assertEqual(summary, {'done': 1, 'skipped': 3, 'failed': 0})
+        with open(os.path.join(output, 'manifest.jsonl')) as handle:
+            records = [json.loads(line) for line in handle]
+        self.assertEqual(len(records), 5)
+
+        # Failures are recorded without stopping the batch
+        spec = load_spec(self.spec_path)
+        spec['runs'][0]['params']['formula'] = 'missing ~ treat'
+        summary = run_spec(spec, output)
+        self.assertEqual(summary['failed'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import threading
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.daemon import DaemonClient, DaemonError, EstimationDaemon, decode_frame, encode_frame
+from pyqte.qte import QTEEstimator
+from pyqte.qtet import QTETEstimator
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        treat = np.repeat([0, 1], 150)
+        self.data = pd.DataFrame({'re': rng.normal(size=300) + treat, 'treat': treat})
+        self.params = {'formula': 're ~ treat', 'probs': [0.1, 0.25, 0.5, 0.75, 0.9], 'se': True, 'iters': 20,
+                       'engine': 'native', 'seed': 3}
+        self.path = os.path.join(tempfile.mkdtemp(), 'pyqte.sock')
+        self.daemon = EstimationDaemon(self.path, preload=False)
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        while not os.path.exists(self.path):
+            self.thread.join(0.01)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+
+    def test_frame_round_trip(self):
+        data = pd.DataFrame({'x': [1.5, np.nan, 3.0], 'n': np.arange(3), 'b': [True, False, True],
+                             'name': ['a', None, 'c'], 'group': pd.Categorical(['u', 'v', 'u']),
+                             'date': pd.to_datetime(['2020-01-01', '2021-06-30', '2022-12-31'])})
+        pd.testing.assert_frame_equal(decode_frame(*encode_frame(data)), data)
+
+    def test_fit(self):
+        local = QTEEstimator(data=self.data, **self.params)
+        local.fit()
+        with DaemonClient(self.path) as first, DaemonClient(self.path) as second:
+            result = first.fit('QTEEstimator', self.data, **self.params)
+            again = second.fit('QTEEstimator', self.data.copy(), **self.params)
+            status = first.ping()
+        np.testing.assert_allclose(result.estimate, local.info['qte'])
+        np.testing.assert_allclose(result.se, local.info['qte.se'])
+        np.testing.assert_array_equal(again.estimate, result.estimate)
+        # The second client found the data already loaded
+        self.assertEqual((status['fits'], len(status['datasets'])), (2, 1))
+
+    def test_errors(self):
+        with DaemonClient(self.path) as client:
+            with self.assertRaises(DaemonError) as caught:
+                client.fit('QTEEstimator', self.data, formula='re ~ missing', engine='native')
+            self.assertEqual(caught.exception.error_type, 'DataValidationError')
+            weighted = client.fit('QTETEstimator', self.data, weights=np.ones(300), **dict(self.params, se=False))
+        self.assertEqual(len(weighted.estimate), 5)
+
+    def test_concurrent_fits_with_covariates(self):
+        # More datasets than the design matrix and propensity caches hold, fitted from several clients at once
+        rng = np.random.default_rng(1)
+        datasets = [self.data.assign(age=rng.normal(size=300)) for _ in range(10)]
+        params = dict(self.params, xformla='~ age', se=False)
+        results, errors = {}, []
+
+        def fit(index):
+            try:
+                with DaemonClient(self.path) as client:
+                    for data in datasets[index:] + datasets[:index]:
+                        results.setdefault(id(data), []).append(client.fit('QTETEstimator', data, **params).estimate)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=fit, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for data in datasets:
+            local = QTETEstimator(data=data, **params)
+            local.fit()
+            for estimate in results[id(data)]:
+                np.testing.assert_allclose(estimate, local.info['qte'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+import numpy as np
+from pyqte.density import kde_at, quantile_variance
+
+class TestDensity(unittest.TestCase):
+
+    def setUp(self):
+        self.y = np.sort(np.random.default_rng(0).normal(size=20000))
+        self.x = np.array([-1.0, 0.0, 1.5])
+
+    def test_binned_matches_direct(self):
+        direct = kde_at(self.y, self.x, binned=False)
+        binned = kde_at(self.y, self.x, binned=True)
+        np.testing.assert_allclose(binned, direct, rtol=1e-3)
+        np.testing.assert_allclose(direct, np.exp(-self.x ** 2 / 2) / np.sqrt(2 * np.pi), atol=0.02)
+
+    def test_quantile_variance(self):
+        probs = np.array([0.5])
+        variance = quantile_variance(self.y, np.ones(len(self.y)), np.array([0.0]), probs)
+        # Median of a standard normal: 0.25 / (n * phi(0)^2)
+        np.testing.assert_allclose(variance, 0.25 / (len(self.y) * 0.3989 ** 2), rtol=0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from pyqte import formula
+from pyqte.formula import clear_design_cache, design_matrix, parse_formula
+
+class TestFormula(unittest.TestCase):
+
+    def setUp(self):
+        clear_design_cache()
+        self.data = pd.DataFrame({
+            'age': [20.0, 30.0, 40.0, 50.0],
+            'region': ['n', 's', 'e', 'n'],
+            'married': [1, 0, 1, 1]
+        })
+
+    def test_parse(self):
+        parsed = parse_formula('re ~ treat')
+        self.assertEqual(parsed.outcome, 're')
+        self.assertEqual(parsed.variables, ['treat'])
+        parsed = parse_formula('~ age*C(region) - 1')
+        self.assertFalse(parsed.intercept)
+        self.assertEqual(len(parsed.terms), 3)
+        self.assertTrue(parsed.terms[1][0].categorical)
+        with self.assertRaises(ValueError):
+            parse_formula('~ log(age)')
+
+    def test_factors_and_interactions(self):
+        design = design_matrix(self.data, '~ age + C(region) + age:married')
+        self.assertEqual(design.columns, ['Intercept', 'age', 'C(region)[n]', 'C(region)[s]', 'age:married'])
+        np.testing.assert_array_equal(design.X[:, 2], [1, 0, 0, 1])
+        np.testing.assert_array_equal(design.X[:, 4], [20, 0, 40, 50])
+        # Without an intercept the first factor keeps all its levels
+        self.assertEqual(design_matrix(self.data, '~ region - 1').columns, ['region[e]', 'region[n]', 'region[s]'])
+
+    def test_cache_and_sparse(self):
+        first = design_matrix(self.data, '~ age + C(region)')
+        self.assertIs(design_matrix(self.data.copy(), '~ age + C(region)'), first)
+        changed = self.data.assign(age=self.data['age'] + 1)
+        self.assertIsNot(design_matrix(changed, '~ age + C(region)'), first)
+        many = pd.DataFrame({'x': np.arange(200.0), 'cell': np.arange(200) % 60})
+        X = design_matrix(many, '~ x + C(cell)').X
+        self.assertTrue(sparse.issparse(X))
+        self.assertEqual(X.shape, (200, 61))
+
+    def test_cache_is_thread_safe(self):
+        # A cache pausing between the lookup of a key and its move, so that other threads evict it meanwhile
+        class SlowCache(OrderedDict):
+            def move_to_end(self, key, last=True):
+                time.sleep(0.001)
+                super().move_to_end(key, last)
+
+        datasets = [self.data.assign(age=self.data['age'] + i) for i in range(10)]
+        errors = []
+
+        def lookup():
+            try:
+                for _ in range(5):
+                    for data in datasets:
+                        design_matrix(data, '~ age + C(region)')
+            except Exception as error:
+                errors.append(error)
+
+        cache, formula._cache = formula._cache, SlowCache()
+        try:
+            threads = [threading.Thread(target=lookup) for _ in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            formula._cache = cache
+        self.assertEqual(errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 import pandas as pd
 from pyqte.helper_functions import (
     prepare_r_data,
@@ -73,6 +74,21 @@ class TestHelperFunctions(unittest.TestCase):
             self.assertIn('coefficients', results[q])
             self.assertIn('confidence_intervals', results[q])
 
+    def test_quantile_regression_results_match_statsmodels(self):
+        rng = np.random.default_rng(0)
+        x = rng.normal(size=300)
+        X = pd.DataFrame({'const': 1.0, 'x': x})
+        model = QuantReg(1 + 2 * x + rng.standard_t(3, size=300), X)
+        results = generate_quantile_regression_results(model, [0.1, 0.5, 0.9], iters=30, seed=1)
+        for q, result in results.items():
+            fitted = model.fit(q=q)
+            # statsmodels solves by iteratively reweighted least squares, the process exactly
+            np.testing.assert_allclose(result['coefficients'], fitted.params, atol=0.02)
+            self.assertEqual(list(result['coefficients'].index), ['const', 'x'])
+            intervals = result['confidence_intervals']
+            self.assertEqual(intervals.shape, fitted.conf_int().shape)
+            self.assertTrue(np.all((intervals[0] <= result['coefficients']) & (result['coefficients'] <= intervals[1])))
+
 if __name__ == '__main__':
     unittest.main()
 
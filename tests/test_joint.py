@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.cic import CiCEstimator
+from pyqte.qdid import QDiDEstimator
+from pyqte.mdid import MDiDEstimator
+from pyqte.joint import JointEstimator
+from pyqte.timing import add_timing_hook, configure_timing, remove_timing_hook
+
+class TestJointBootstrap(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 400
+        treat = np.repeat([0, 1], n // 2)
+        ids = np.arange(n)
+        self.panel = pd.concat([pd.DataFrame({'id': ids, 'year': year, 'treat': treat,
+                                              're': rng.normal(size=n) + shift * treat})
+                                for year, shift in [(1975, 0.0), (1978, 1.0)]], ignore_index=True)
+        self.kwargs = dict(t=1978, tmin1=1975, tname='year', idname='id', panel=True, engine='native',
+                           probs=[0.1, 0.25, 0.5, 0.75, 0.9], iters=60, seed=5)
+
+    def estimators(self):
+        return [cls('re ~ treat', self.panel, **self.kwargs)
+                for cls in (CiCEstimator, QDiDEstimator, MDiDEstimator)]
+
+    def test_shared_replicates(self):
+        joint = JointEstimator(self.estimators(), iters=60, seed=5)
+        joint.fit()
+        self.assertEqual(joint.draws.shape, (60, 15))
+        # Each estimator gets the replicates of its own fit with the same seed
+        for estimator in self.estimators():
+            estimator.fit()
+            own = joint.estimators[type(estimator).__name__.replace('Estimator', '')]
+            np.testing.assert_allclose(own.info['qte'], estimator.info['qte'])
+            np.testing.assert_allclose(own.info['qte.se'], estimator.info['qte.se'])
+
+        diff = joint.difference('CiC', 'QDiD')
+        np.testing.assert_allclose(diff['Difference'], joint.estimators['CiC'].info['qte']
+                                   - joint.estimators['QDiD'].info['qte'])
+        np.testing.assert_allclose(diff['Std. Error'], np.std(joint.draws[:, :5] - joint.draws[:, 5:10], axis=0,
+                                                              ddof=1))
+        self.assertEqual(list(joint.get_results()['Estimator'].unique()), ['CiC', 'QDiD', 'MDiD'])
+
+        parallel = JointEstimator(self.estimators(), iters=60, seed=5, batch_size=7, n_jobs=2)
+        parallel.fit()
+        # The cell means of MDiD may differ in the last bit between batch sizes
+        np.testing.assert_allclose(parallel.draws, joint.draws, rtol=1e-12)
+
+    def test_units_must_match(self):
+        cic, qdid, _ = self.estimators()
+        qdid.data = self.panel[self.panel['id'] != 3]
+        with self.assertRaises(ValueError):
+            JointEstimator([cic, qdid]).fit()
+        r_engine = CiCEstimator('re ~ treat', self.panel, t=1978, tmin1=1975, tname='year')
+        with self.assertRaises(ValueError):
+            JointEstimator([r_engine])
+
+    def test_joint_options_replace_the_estimators(self):
+        joint = JointEstimator(self.estimators()[:2], iters=60, seed=5, boot_weights='exponential', uniform=True)
+        joint.fit()
+        cic = joint.estimators['CiC']
+        self.assertEqual(cic.boot_weights, 'exponential')
+        # Replaying gives back the joint replicates, not multinomial ones
+        np.testing.assert_allclose(cic.to_result(draws=True).draws, joint.draws[:, :5], rtol=1e-12)
+        requeried = cic.at(self.kwargs['probs'])
+        np.testing.assert_allclose(requeried.info['qte.se'], cic.info['qte.se'], rtol=1e-12)
+        self.assertIn('qte.band.lower', requeried.info)
+
+    def test_timings(self):
+        received = []
+        hook = lambda name, timings: received.append(name)
+        configure_timing(track_memory=True)
+        add_timing_hook(hook)
+        try:
+            alone = self.estimators()[0]
+            alone.fit()
+            joint = JointEstimator(self.estimators(), iters=20, seed=5)
+            joint.fit()
+        finally:
+            remove_timing_hook(hook)
+            configure_timing(enabled=True, track_memory=False)
+        # The point fits are timed within the joint 'prepare' phase, without timings or hooks of their own
+        self.assertEqual(received, ['CiCEstimator', 'JointEstimator'])
+        self.assertGreaterEqual(joint.info['timings']['prepare']['peak_mb'],
+                                0.9 * alone.info['timings']['prepare']['peak_mb'])
+
+if __name__ == '__main__':
+    unittest.main()
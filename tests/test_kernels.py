@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+from pyqte import kernels
+
+class TestKernels(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.y = np.sort(np.round(rng.normal(size=500), 1))
+        self.W = rng.integers(0, 3, size=(12, 500)).astype(np.float32)
+        self.W[3] = 0
+        self.probs = rng.uniform(size=(12, 9))
+        self.probs[5, 0] = np.nan
+        self.x = rng.normal(size=(12, 9))
+
+    def tearDown(self):
+        kernels.configure_kernels()
+
+    def _evaluate(self):
+        return (kernels.weighted_quantiles(self.y, self.W, self.probs), kernels.weighted_cdf(self.y, self.W, self.x),
+                kernels.weighted_ranks(self.y, self.W))
+
+    def test_ranks_are_the_cdf_at_the_outcomes(self):
+        kernels.configure_kernels(enabled=False)
+        quantiles, cdf, ranks = self._evaluate()
+        np.testing.assert_array_equal(ranks, kernels.weighted_cdf(self.y, self.W, np.tile(self.y, (12, 1))))
+        self.assertTrue(np.all(np.isnan(quantiles[3])))
+        # The smallest outcome whose ECDF reaches p
+        row = np.cumsum(self.W[0], dtype=np.float64) / self.W[0].sum(dtype=np.float64)
+        self.assertEqual(quantiles[0, 0], self.y[np.argmax(row >= self.probs[0, 0] * (1 - kernels.TARGET_EPS))])
+
+    @unittest.skipIf(kernels.numba is None, "numba is not installed")
+    def test_compiled_kernels_match_numpy(self):
+        kernels.configure_kernels(enabled=False)
+        reference = self._evaluate()
+        kernels.MIN_PARALLEL_SIZE, size = 0, kernels.MIN_PARALLEL_SIZE
+        try:
+            for n_threads in (1, 3):
+                kernels.configure_kernels(enabled=True, n_threads=n_threads)
+                for result, expected in zip(self._evaluate(), reference):
+                    np.testing.assert_array_equal(result, expected)
+        finally:
+            kernels.MIN_PARALLEL_SIZE = size
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.bootstrap import count_weights
+from pyqte.native import BinnedProblem, build_problem, cell_quantiles, fit_logit, grouped_results, parse_formula, parse_xformla
+
+class TestNativeEngine(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 400
+        treat = np.repeat([0, 1], n // 2)
+        self.cross = pd.DataFrame({
+            're': rng.normal(size=n) + treat,
+            'treat': treat,
+            'age': rng.normal(size=n)
+        })
+        ids = np.arange(n)
+        panel = []
+        for year, shift in [(1974, 0.0), (1975, 0.5), (1978, 1.0)]:
+            panel.append(pd.DataFrame({
+                'id': ids,
+                'year': year,
+                'treat': treat,
+                're': rng.normal(size=n) + shift + (year == 1978) * treat
+            }))
+        self.panel = pd.concat(panel, ignore_index=True)
+        self.probs = np.array([0.1, 0.25, 0.5, 0.75, 0.9])
+
+    def test_parse_formula(self):
+        self.assertEqual(parse_formula('re78 ~ treat'), ('re78', 'treat'))
+        self.assertEqual(parse_xformla('~ age + education'), ['age', 'education'])
+
+    def test_cell_quantiles_matches_type_1(self):
+        y = np.sort(np.random.default_rng(1).normal(size=37))
+        q = cell_quantiles(y, np.ones((1, len(y))), self.probs)[0]
+        np.testing.assert_allclose(q, np.quantile(y, self.probs, method='inverted_cdf'))
+
+    def test_frequency_weights_equal_repeated_rows(self):
+        y = np.array([1.0, 2.0, 3.0, 4.0])
+        w = np.array([[2.0, 0.0, 1.0, 3.0]])
+        q = cell_quantiles(y, w, self.probs)[0]
+        expanded = np.repeat(y, w[0].astype(int))
+        np.testing.assert_allclose(q, np.quantile(expanded, self.probs, method='inverted_cdf'))
+
+    def test_qte_without_covariates(self):
+        problem = build_problem('qte', self.cross, 're ~ treat', self.probs)
+        y = self.cross['re']
+        expected = (np.quantile(y[self.cross['treat'] == 1], self.probs, method='inverted_cdf')
+                    - np.quantile(y[self.cross['treat'] == 0], self.probs, method='inverted_cdf'))
+        np.testing.assert_allclose(problem.estimate(), expected)
+
+    def test_qdid(self):
+        problem = build_problem('qdid', self.panel, 're ~ treat', self.probs, t=1978, tmin1=1975, tname='year')
+        q = lambda year, d: np.quantile(self.panel['re'][(self.panel['year'] == year) & (self.panel['treat'] == d)],
+                                        self.probs, method='inverted_cdf')
+        expected = q(1978, 1) - (q(1975, 1) + q(1978, 0) - q(1975, 0))
+        np.testing.assert_allclose(problem.estimate(), expected)
+
+    def test_estimators_return_one_value_per_quantile(self):
+        for kind in ('cic', 'mdid', 'ddid2', 'panel_qtet'):
+            problem = build_problem(kind, self.panel, 're ~ treat', self.probs, t=1978, tmin1=1975,
+                                    tmin2=1974, tname='year', idname='id', panel=kind in ('ddid2', 'panel_qtet'))
+            estimate = problem.estimate()
+            self.assertEqual(estimate.shape, self.probs.shape)
+            self.assertTrue(np.all(np.isfinite(estimate)))
+            # The treatment effect is one at every quantile
+            self.assertLess(np.max(np.abs(estimate - 1.0)), 0.6)
+
+    def test_spatt_panel(self):
+        problem = build_problem('spatt', self.panel, 're ~ treat', [0.5], t=1978, tmin1=1975, tname='year',
+                                idname='id', panel=True)
+        wide = self.panel.pivot(index='id', columns='year', values='re')
+        dy = wide[1978] - wide[1975]
+        treat = self.panel[self.panel['year'] == 1978].set_index('id')['treat']
+        expected = dy[treat == 1].mean() - dy[treat == 0].mean()
+        self.assertAlmostEqual(problem.estimate()[0], expected)
+
+    def test_logit(self):
+        X = np.column_stack([np.ones(len(self.cross)), self.cross['age']])
+        beta = fit_logit(X, self.cross['treat'].to_numpy(dtype=float))
+        self.assertEqual(beta.shape, (2,))
+        self.assertTrue(np.all(np.isfinite(beta)))
+
+    def test_covariates_unsupported_for_cic(self):
+        with self.assertRaises(NotImplementedError):
+            build_problem('cic', self.panel, 're ~ treat', self.probs, xformla='~ age', t=1978, tmin1=1975,
+                          tname='year')
+
+    def test_panel_cluster_weights(self):
+        kwargs = dict(t=1978, tmin1=1975, tname='year')
+        panel = build_problem('qdid', self.panel, 're ~ treat', self.probs, idname='id', panel=True, **kwargs)
+        cross = build_problem('qdid', self.panel, 're ~ treat', self.probs, **kwargs)
+        # The ids are the resampling units, and the point estimate is unchanged
+        self.assertEqual(panel.n, 400)
+        np.testing.assert_allclose(panel.estimate(), cross.estimate())
+        # Drawing an id twice counts both of its periods twice
+        counts = np.random.default_rng(2).integers(0, 3, size=(1, 400)).astype(float)
+        subset = self.panel[self.panel['year'].isin([1975, 1978])]
+        np.testing.assert_allclose(panel.statistic(counts),
+                                   cross.statistic(counts[:, subset['id'].to_numpy()]))
+        with self.assertRaises(NotImplementedError):
+            panel.analytic_se()
+
+    def test_low_memory_is_exact_for_counts(self):
+        W = np.random.default_rng(3).multinomial(400, np.full(400, 1 / 400), size=4).astype(float)
+        data = self.panel.assign(re=self.panel['re'].round(1))
+        for kind in ('cic', 'qdid', 'mdid'):
+            kwargs = dict(t=1978, tmin1=1975, tname='year')
+            full = build_problem(kind, data, 're ~ treat', self.probs, idname='id', panel=True, **kwargs)
+            compact = build_problem(kind, data, 're ~ treat', self.probs, idname='id', panel=True,
+                                    low_memory=True, **kwargs)
+            # Tied outcomes are stored once per cell
+            self.assertLess(len(compact.c11.y), len(full.c11.y))
+            np.testing.assert_allclose(compact.statistic(W), full.statistic(W), atol=1e-6)
+        qtet = build_problem('qtet', self.cross, 're ~ treat', self.probs, xformla='~ age', low_memory=True)
+        self.assertEqual(qtet.dtype, np.float32)
+        np.testing.assert_allclose(qtet.estimate(),
+                                   build_problem('qtet', self.cross, 're ~ treat', self.probs, xformla='~ age').estimate())
+
+    def test_analytic_se(self):
+        for kind, kwargs in [('qte', {}), ('qtet', {'xformla': '~ age'})]:
+            se = build_problem(kind, self.cross, 're ~ treat', self.probs, **kwargs).analytic_se()
+            # Two arms of 200 unit-variance draws: the median SE is about 0.125
+            self.assertEqual(se.shape, (5,))
+            self.assertTrue(np.all((se > 0.08) & (se < 0.3)))
+        qdid = build_problem('qdid', self.panel, 're ~ treat', self.probs, t=1978, tmin1=1975, tname='year')
+        self.assertTrue(np.all(np.isfinite(qdid.analytic_se())))
+        with self.assertRaises(NotImplementedError):
+            build_problem('mdid', self.panel, 're ~ treat', self.probs, t=1978, tmin1=1975,
+                          tname='year').analytic_se()
+
+    def test_grouped_matches_separate_fits(self):
+        data = self.panel.assign(region=self.panel['id'] % 3, re=self.panel['re'].round(1))
+        W = np.random.default_rng(4).exponential(size=(3, len(data)))
+        for kind in ('qte', 'cic', 'qdid', 'mdid'):
+            kwargs = {} if kind == 'qte' else dict(t=1978, tmin1=1975, tname='year')
+            subset = data if kind == 'qte' else data[data['year'].isin([1978, 1975])]
+            grouped = build_problem(kind, subset, 're ~ treat', self.probs, by='region', **kwargs)
+            self.assertEqual(len(grouped.labels), 3)
+            draws = grouped.statistic(W[:, :len(subset)]).reshape(3, 3, -1)
+            for g in range(3):
+                rows = (subset['region'] == g).to_numpy()
+                alone = build_problem(kind, subset[rows], 're ~ treat', self.probs, **kwargs)
+                np.testing.assert_allclose(draws[:, g], alone.statistic(W[:, :len(subset)][:, rows]), atol=1e-9)
+        info = {'groups': grouped.labels, 'probs': self.probs, 'qte': grouped.estimate(), 'qte.lower': None}
+        results = grouped_results(info)
+        self.assertEqual(list(results.columns), ['region', 'Quantile', 'QTE'])
+        self.assertEqual(len(results), 15)
+        with self.assertRaises(NotImplementedError):
+            build_problem('qte', self.cross.assign(g=0), 're ~ treat', self.probs, xformla='~ age', by='g')
+
+    def test_binned_problem(self):
+        data = self.panel.assign(re=self.panel['re'].round(2))
+        for kind in ('qte', 'cic', 'qdid', 'mdid'):
+            kwargs = {} if kind == 'qte' else dict(t=1978, tmin1=1975, tname='year', idname='id', panel=True)
+            frame = self.cross if kind == 'qte' else data
+            exact = build_problem(kind, frame, 're ~ treat', self.probs, **kwargs)
+            # As many bins as distinct values: every cell is exact
+            np.testing.assert_allclose(BinnedProblem(exact, 1000).estimate(), exact.estimate(), atol=1e-9)
+            coarse = BinnedProblem(exact, 8)
+            self.assertLess(len(coarse.counts), exact.n)
+            self.assertEqual(coarse.counts.sum(), exact.n)
+            self.assertTrue(np.all(np.abs(coarse.estimate() - exact.estimate()) <= coarse.error_bounds() + 1e-9))
+        with self.assertRaises(NotImplementedError):
+            build_problem('qtet', self.cross, 're ~ treat', self.probs, xformla='~ age', bins=10)
+
+    def test_count_weights(self):
+        counts = np.array([3.0, 1.0, 6.0])
+        W = count_weights(0, 0, 4000, counts)
+        self.assertTrue(np.all(W.sum(axis=1) == 10))
+        # A category draws the weights of its units: mean count, multinomial variance
+        np.testing.assert_allclose(W.mean(axis=0), counts, rtol=0.05)
+        np.testing.assert_allclose(W.var(axis=0), counts * (1 - counts / 10), rtol=0.1)
+        exp = count_weights(0, 0, 4000, counts, kind='exponential')
+        np.testing.assert_allclose(exp.var(axis=0), counts, rtol=0.1)
+        np.testing.assert_array_equal(count_weights(0, 2, 2, counts), W[2:4])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.bootstrap import bootstrap_draws
+from pyqte.native import build_problem
+from pyqte.parallel import SharedMemoryPool
+
+class TestSharedMemoryBootstrap(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        treat = np.repeat([0, 1], 200)
+        df = pd.DataFrame({'re': rng.normal(size=400) + treat, 'treat': treat, 'age': rng.normal(size=400)})
+        self.problem = build_problem('qte', df, 're ~ treat', [0.25, 0.5, 0.75])
+        self.covariates = build_problem('qtet', df, 're ~ treat', [0.25, 0.5, 0.75], xformla='~ age')
+
+    def test_same_draws_as_serial(self):
+        serial, _ = bootstrap_draws(self.problem, iters=40, batch_size=10, rng=np.random.default_rng(1))
+        parallel, _ = bootstrap_draws(self.problem, iters=40, batch_size=10, rng=np.random.default_rng(1),
+                                      n_jobs=2)
+        np.testing.assert_array_equal(serial, parallel)
+
+    def test_draws_do_not_depend_on_layout(self):
+        for problem in (self.problem, self.covariates):
+            reference, _ = bootstrap_draws(problem, iters=30, batch_size=30, seed=11)
+            for batch_size, n_jobs in [(1, 1), (7, 1), (4, 2), (30, 3)]:
+                draws, _ = bootstrap_draws(problem, iters=30, batch_size=batch_size, n_jobs=n_jobs, seed=11)
+                np.testing.assert_array_equal(draws, reference)
+        # Adaptive stopping points are checked batch by batch, whatever the number of workers
+        serial, _ = bootstrap_draws(self.problem, iters=2000, batch_size=20, adaptive=True, tol=0.3, seed=12)
+        parallel, _ = bootstrap_draws(self.problem, iters=2000, batch_size=20, adaptive=True, tol=0.3, seed=12,
+                                      n_jobs=3)
+        np.testing.assert_array_equal(serial, parallel)
+
+    def test_blocks_are_released(self):
+        with SharedMemoryPool(self.problem, 2) as pool:
+            self.assertGreater(len(pool._blocks), 0)
+            draws = pool.map([(1, 0, 5, 'multinomial'), (1, 5, 5, 'multinomial')])
+        self.assertEqual(pool._blocks, [])
+        self.assertEqual([d.shape for d in draws], [(5, 3), (5, 3)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+import numpy as np
+from pyqte.parity import r_available, run_parity, synthetic_data
+
+class TestParityHarness(unittest.TestCase):
+
+    def test_native_report(self):
+        report = run_parity(cases=['qte', 'cic', 'spatt'], sizes=(300,), iters=10, use_r=False)
+        self.assertEqual(list(report['data'].unique()), ['lalonde', 'synthetic-300'])
+        self.assertEqual(set(report['status']), {'r_skipped'})
+        self.assertTrue((report['native_s'] > 0).all())
+        self.assertEqual(report.loc[report['data'] == 'synthetic-300', 'rows'].tolist(), [300, 900, 900])
+
+    def test_synthetic_data(self):
+        data = synthetic_data(200, seed=1)
+        self.assertEqual(len(data['panel']), 600)
+        np.testing.assert_array_equal(data['cross']['re78'], data['panel'].loc[data['panel']['year'] == 1978, 're'])
+
+    @unittest.skipUnless(r_available(), "R and the qte package are not installed")
+    def test_engines_agree(self):
+        report = run_parity(sizes=(1000,), iters=200)
+        self.assertEqual(set(report['status']), {'ok'}, report[report['status'] != 'ok'].to_string())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from pyqte.plot import PlotRenderer, export_plots, save_plot
+from pyqte.results import EstimationResult
+
+class TestPlotExport(unittest.TestCase):
+
+    def setUp(self):
+        probs = np.array([0.25, 0.5, 0.75])
+        self.results = [EstimationResult('QTEEstimator', probs, [i, i + 1.0, i + 2.0], lower=[i - 1.0] * 3,
+                                         upper=[i + 3.0] * 3) for i in range(4)]
+        self.directory = tempfile.mkdtemp()
+
+    def test_export_serial_and_parallel(self):
+        serial = export_plots(self.results, self.directory, formats=('png', 'svg'))
+        self.assertEqual(len(serial), 8)
+        self.assertTrue(all(os.path.getsize(path) > 0 for path in serial))
+        parallel = export_plots(self.results, os.path.join(self.directory, 'parallel'), n_jobs=2)
+        self.assertEqual([os.path.basename(path) for path in parallel],
+                         [f'QTEEstimator_{i}.png' for i in range(4)])
+        # Nothing is left open in pyplot
+        self.assertEqual(plt.get_fignums(), [])
+
+    def test_groups_and_single_effects(self):
+        grouped = EstimationResult('QTEEstimator', [0.5], [1.0, 2.0], groups=pd.DataFrame({'region': ['n', 's']}))
+        paths = save_plot(grouped, os.path.join(self.directory, 'grouped.pdf'))
+        self.assertEqual([os.path.basename(path) for path in paths], ['grouped_region=n.pdf', 'grouped_region=s.pdf'])
+        with PlotRenderer() as renderer:
+            with self.assertRaises(ValueError):
+                renderer.render(EstimationResult('SpATTEstimator', None, [1.0]), os.path.join(self.directory, 'a.png'))
+
+if __name__ == '__main__':
+    unittest.main()
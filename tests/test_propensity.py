@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.native import build_problem
+from pyqte.propensity import clear_propensity_cache, fit_logit, logit_scores, propensity_model
+
+class TestPropensityCache(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 300
+        age = rng.normal(size=n)
+        treat = (rng.uniform(size=n) < 1 / (1 + np.exp(-age))).astype(int)
+        ids = np.arange(n)
+        self.panel = pd.concat([pd.DataFrame({'id': ids, 'year': year, 'treat': treat, 'age': age,
+                                              're': rng.normal(size=n) + shift})
+                                for year, shift in [(1975, 0.0), (1978, 1.0)]], ignore_index=True)
+        clear_propensity_cache()
+
+    def test_shared_between_estimators(self):
+        kwargs = dict(xformla='~ age', t=1978, tmin1=1975, tname='year', idname='id', panel=True)
+        ddid2 = build_problem('ddid2', self.panel, 're ~ treat', [0.25, 0.5, 0.75], **kwargs)
+        spatt = build_problem('spatt', self.panel, 're ~ treat', [0.5], **kwargs)
+        self.assertIs(ddid2.propensity, spatt.propensity)
+        clear_propensity_cache()
+        spatt = build_problem('spatt', self.panel, 're ~ treat', [0.5], **kwargs)
+        self.assertIsNot(ddid2.propensity, spatt.propensity)
+
+    def test_warm_started_refit(self):
+        units = self.panel[self.panel['year'] == 1978]
+        model = propensity_model(units, '~ age', 'treat')
+        self.assertIs(model.refit_scores(np.ones(len(units))), model.scores)
+        w = np.bincount(np.random.default_rng(1).integers(0, len(units), len(units)), minlength=len(units))
+        X = np.column_stack([np.ones(len(units)), units['age']])
+        cold = logit_scores(X, fit_logit(X, units['treat'].to_numpy(dtype=float), w.astype(float)))
+        np.testing.assert_allclose(model.refit_scores(w.astype(float)), cold, atol=1e-8)
+        with self.assertRaises(NotImplementedError):
+            propensity_model(units, '~ age', 'treat', method='semiparametric')
+
+if __name__ == '__main__':
+    unittest.main()
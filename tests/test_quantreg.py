@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.quantreg import quantile_regression_process, _linprog_fit
+
+class TestQuantileRegressionProcess(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 500
+        self.X = pd.DataFrame({'const': 1.0, 'x1': rng.normal(size=n), 'x2': rng.uniform(size=n)})
+        self.y = self.X.to_numpy() @ np.array([1.0, 2.0, -1.0]) + rng.standard_t(3, size=n)
+        self.taus = np.arange(0.05, 1.0, 0.05)
+
+    def loss(self, beta, tau):
+        r = self.y - self.X.to_numpy() @ beta
+        return np.sum(r * (tau - (r < 0)))
+
+    def test_matches_linear_program(self):
+        results = quantile_regression_process(self.y, self.X, self.taus)
+        self.assertEqual(results['coef'].shape, (len(self.taus), 3))
+        self.assertEqual(list(results['coef'].columns), ['const', 'x1', 'x2'])
+        # Only the first quantile needs the linear program
+        self.assertEqual(results['fallbacks'], 1)
+        for tau, beta in results['coef'].iterrows():
+            optimum = self.loss(_linprog_fit(self.X.to_numpy(), self.y, tau), tau)
+            self.assertAlmostEqual(self.loss(beta.to_numpy(), tau), optimum, places=6)
+
+    def test_unsorted_taus(self):
+        taus = [0.9, 0.1, 0.5]
+        coef = quantile_regression_process(self.y, self.X, taus)['coef']
+        np.testing.assert_allclose(coef.index, taus)
+        sorted_coef = quantile_regression_process(self.y, self.X, sorted(taus))['coef']
+        np.testing.assert_allclose(coef.loc[0.5], sorted_coef.loc[0.5])
+        with self.assertRaises(ValueError):
+            quantile_regression_process(self.y, self.X, [0.0, 0.5])
+
+    def test_bootstrap(self):
+        results = quantile_regression_process(self.y, self.X, [0.25, 0.5, 0.75], se=True, iters=40,
+                                              batch_size=15, rng=np.random.default_rng(1))
+        self.assertEqual(results['draws'].shape, (40, 3, 3))
+        self.assertTrue(np.all(results['coef.se'].to_numpy() > 0))
+        self.assertTrue(np.all(results['coef.lower'] <= results['coef.upper']))
+
+if __name__ == '__main__':
+    unittest.main()
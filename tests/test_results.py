@@ -0,0 +1,48 @@
+import io
+import pickle
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.bootstrap import fit_native, replay_draws
+from pyqte.native import build_problem
+from pyqte.results import EstimationResult, pa
+
+class TestEstimationResult(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        treat = np.repeat([0, 1], 200)
+        self.df = pd.DataFrame({'re': rng.normal(size=400) + treat, 'treat': treat, 'region': np.tile(['a', 'b'], 200)})
+        self.problem = build_problem('qte', self.df, 're ~ treat', [0.25, 0.5, 0.75], by='region')
+        self.info = fit_native(self.problem, iters=30, batch_size=10, uniform=True, rng=np.random.default_rng(1))
+        self.info['timings'] = {'total': {'wall_s': 0.5}}
+        self.result = EstimationResult.from_info('QTEEstimator', self.info, replay_draws(self.problem, self.info))
+
+    def assert_same(self, other):
+        for field in ('probs', 'estimate', 'se', 'lower', 'upper', 'band_lower', 'band_upper', 'draws'):
+            np.testing.assert_array_equal(getattr(other, field), getattr(self.result, field))
+        self.assertEqual(other.band_crit, self.result.band_crit)
+        self.assertEqual(other.iters, 30)
+        self.assertEqual(other.timings, self.result.timings)
+        pd.testing.assert_frame_equal(other.to_frame(), self.result.to_frame())
+
+    def test_fields_and_frame(self):
+        self.assertFalse(hasattr(self.result, '__dict__'))
+        self.assertEqual(self.result.draws.shape, (30, 6))
+        frame = self.result.to_frame()
+        self.assertEqual(list(frame.columns[:3]), ['region', 'Quantile', 'QTE'])
+        self.assertEqual(len(frame), 6)
+
+    def test_npz_and_pickle(self):
+        buffer = io.BytesIO()
+        self.result.to_npz(buffer)
+        buffer.seek(0)
+        self.assert_same(EstimationResult.from_npz(buffer))
+        self.assert_same(pickle.loads(pickle.dumps(self.result)))
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_arrow(self):
+        self.assert_same(EstimationResult.from_arrow(self.result.to_arrow()))
+
+if __name__ == '__main__':
+    unittest.main()
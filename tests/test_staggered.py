@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.native import build_problem
+from pyqte.staggered import StaggeredEstimator
+from pyqte.validation import DataValidationError
+
+def staggered_panel(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    cohort = rng.choice([2001, 2002, 0], n)
+    frames = []
+    for year in [2000, 2001, 2002, 2003]:
+        treat = ((cohort > 0) & (year >= cohort)).astype(float)
+        frames.append(pd.DataFrame({'id': np.arange(n), 'year': year, 'cohort': cohort, 'treat': treat,
+                                    're': rng.normal(size=n) + treat + 0.2 * (year - 2000)}))
+    return pd.concat(frames, ignore_index=True)
+
+class TestStaggeredEstimator(unittest.TestCase):
+
+    def setUp(self):
+        self.data = staggered_panel()
+        self.probs = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+    def test_cells_match_two_period_estimators(self):
+        for kind in ('cic', 'qdid', 'mdid'):
+            model = StaggeredEstimator('re ~ treat', self.data, 'year', 'id', probs=self.probs, estimator=kind,
+                                       se=False)
+            model.fit()
+            cells = model.group_time()
+            for cohort, year in [(2001, 2003), (2002, 2002), (2002, 2000)]:
+                subset = self.data[self.data['cohort'].isin([cohort, 0])].assign(
+                    d=lambda df: (df['cohort'] == cohort).astype(float))
+                expected = build_problem(kind, subset, 're ~ d', self.probs, t=year, tmin1=cohort - 1,
+                                         tname='year', idname='id', panel=True).estimate()
+                cell = cells[(cells['Cohort'] == cohort) & (cells['Period'] == year)]
+                np.testing.assert_allclose(cell['QTE'], expected, atol=1e-12)
+
+    def test_shared_bootstrap(self):
+        model = StaggeredEstimator('re ~ treat', self.data, 'year', 'id', probs=self.probs,
+                                   control_group='notyettreated', iters=30, seed=2)
+        model.fit()
+        self.assertEqual(sorted(model.event_study()['Event Time'].unique()), [-2, 0, 1, 2])
+        overall = model.overall()
+        self.assertEqual(len(overall), 5)
+        self.assertTrue(np.all(overall['QTE'] > 0.5))
+        # The aggregates are drawn on the replicates of the cells
+        draws = model.to_result(draws=True).draws
+        self.assertEqual(draws.shape, (30, len(model.info['groups']) * 5))
+        np.testing.assert_allclose(np.std(draws, axis=0, ddof=1), model.info['qte.se'])
+
+    def test_validation(self):
+        # A treated unit switching back, and no never-treated units
+        data = self.data[self.data['cohort'] > 0].copy()
+        data.loc[(data['id'] == data['id'].iloc[0]) & (data['year'] == 2003), 'treat'] = 0.0
+        with self.assertRaises(DataValidationError) as caught:
+            StaggeredEstimator('re ~ treat', data, 'year', 'id', probs=self.probs).fit()
+        self.assertEqual(caught.exception.checks(), ['treatment_reversal', 'empty_group'])
+
+if __name__ == '__main__':
+    unittest.main()
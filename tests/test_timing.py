@@ -0,0 +1,84 @@
+import tracemalloc
+import unittest
+from pyqte.timing import FitTimer, configure_timing, add_timing_hook, remove_timing_hook
+
+class TestFitTimer(unittest.TestCase):
+
+    def tearDown(self):
+        configure_timing(enabled=True, track_memory=False)
+
+    def test_phases_are_recorded(self):
+        timer = FitTimer('Dummy')
+        with timer.phase('py2rpy', rows=10):
+            sum(range(1000))
+        with timer.phase('bootstrap', rows=10):
+            pass
+        with timer.phase('bootstrap', rows=10):
+            pass
+        timings = timer.finish()
+        self.assertIn('py2rpy', timings)
+        self.assertIn('total', timings)
+        self.assertEqual(timings['py2rpy']['rows'], 10)
+        self.assertEqual(timings['bootstrap']['calls'], 2)
+        self.assertGreaterEqual(timings['py2rpy']['wall_s'], 0.0)
+
+    def test_memory_tracking(self):
+        configure_timing(track_memory=True)
+        timer = FitTimer('Dummy')
+        with timer.phase('alloc'):
+            block = [0] * 100000
+        timings = timer.finish()
+        self.assertGreater(timings['alloc']['peak_mb'], 0.5)
+        del block
+        # A phase raising, as a failed validation does, stops tracing too
+        timer = FitTimer('Dummy')
+        with self.assertRaises(ValueError):
+            with timer.phase('validate'):
+                raise ValueError("invalid data")
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_hook_receives_timings(self):
+        received = []
+        hook = lambda name, timings: received.append((name, timings))
+        add_timing_hook(hook)
+        try:
+            timer = FitTimer('Dummy')
+            with timer.phase('r_call'):
+                pass
+            timer.finish()
+        finally:
+            remove_timing_hook(hook)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0][0], 'Dummy')
+        self.assertIn('r_call', received[0][1])
+
+    def test_nested_timers_are_disabled(self):
+        configure_timing(track_memory=True)
+        received = []
+        hook = lambda name, timings: received.append(name)
+        add_timing_hook(hook)
+        try:
+            outer = FitTimer('Outer')
+            with outer.phase('prepare'):
+                block = [0] * 100000
+                inner = FitTimer('Inner')
+                with inner.phase('alloc'):
+                    pass
+                self.assertEqual(inner.finish(), {})
+            timings = outer.finish()
+        finally:
+            remove_timing_hook(hook)
+        # The inner phase did not reset the peak of the enclosing one
+        self.assertGreater(timings['prepare']['peak_mb'], 0.5)
+        self.assertEqual(received, ['Outer'])
+        del block
+
+    def test_disabled(self):
+        configure_timing(enabled=False)
+        timer = FitTimer('Dummy')
+        with timer.phase('r_call'):
+            pass
+        self.assertEqual(timer.finish(), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.utils import bootstrap_estimation
+
+class TestBootstrapEstimation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({'re': rng.normal(size=120), 'treat': np.repeat([0, 1], 60)})
+
+    def test_resampled_and_weighted_modes_agree(self):
+        resampled = bootstrap_estimation(self.df, lambda sample: sample['re'].mean(), iters=40, batch_size=7,
+                                         seed=3)
+        weighted = bootstrap_estimation(self.df, lambda data, W: W @ data['re'].to_numpy() / W.sum(axis=1),
+                                        iters=40, batch_size=16, weighted=True, seed=3)
+        self.assertEqual(resampled.shape, (40,))
+        np.testing.assert_allclose(resampled, weighted)
+        # The spread of the replicates matches the standard error of the mean
+        self.assertAlmostEqual(resampled.std(), self.df['re'].std() / np.sqrt(120), delta=0.04)
+
+    def test_strata_and_arrays(self):
+        counts = bootstrap_estimation(self.df['treat'].to_numpy(), lambda sample: sample.sum(), iters=10,
+                                      strata=self.df['treat'].to_numpy())
+        np.testing.assert_array_equal(counts, np.full(10, 60))
+
+if __name__ == '__main__':
+    unittest.main()
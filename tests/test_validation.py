@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+import pandas as pd
+from pyqte.cic import CiCEstimator
+from pyqte.helper_functions import prepare_r_data
+from pyqte.parity import r_available, synthetic_data
+from pyqte.qtet import QTETEstimator
+from pyqte.validation import DataValidationError, r_variables, validate_data
+
+class TestDataValidation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 100
+        treat = np.repeat([0, 1], n // 2)
+        ids = np.arange(n)
+        self.panel = pd.concat([pd.DataFrame({'id': ids, 'year': year, 'treat': treat,
+                                              're': rng.normal(size=n) + shift})
+                                for year, shift in [(1974, 0.0), (1975, 0.0), (1978, 1.0)]], ignore_index=True)
+        self.kwargs = dict(t=1978, tmin1=1975, tname='year', idname='id', panel=True)
+
+    def test_valid_data(self):
+        validate_data('cic', self.panel, 're ~ treat', **self.kwargs)
+        validate_data('panel_qtet', self.panel, 're ~ treat', tmin2=1974, **self.kwargs)
+        validate_data('qtet', self.panel, 're ~ treat', weights=np.ones(len(self.panel)))
+        # R data frames go to the R engine unchecked, as before validation existed
+        validate_data('cic', prepare_r_data(self.panel), 're ~ treat', balanced=True, **self.kwargs)
+        with self.assertRaises(TypeError):
+            validate_data('qte', self.panel.to_dict(), 're ~ treat')
+
+    def test_problems_are_collected(self):
+        df = self.panel.copy()
+        df.loc[203, 're'] = np.nan  # 1974 is not used by QDiD, so its outcomes may be missing
+        df.loc[3, 're'] = np.nan
+        df = df.drop(index=df.index[(df['year'] == 1975) & (df['id'] == 7)])
+        with self.assertRaises(DataValidationError) as raised:
+            validate_data('qdid', df, 're ~ treat', **self.kwargs)
+        self.assertEqual(raised.exception.checks(), ['missing_values', 'unbalanced_panel'])
+        # The native engine drops the unbalanced ids itself
+        with self.assertRaises(DataValidationError) as raised:
+            validate_data('qdid', df, 're ~ treat', balanced=False, **self.kwargs)
+        self.assertEqual(raised.exception.checks(), ['missing_values'])
+
+        with self.assertRaises(DataValidationError) as raised:
+            validate_data('panel_qtet', self.panel.assign(treat=0), 're ~ treat', tmin2=1973, **self.kwargs)
+        self.assertEqual(raised.exception.checks(), ['missing_period', 'empty_group'])
+        with self.assertRaises(DataValidationError) as raised:
+            validate_data('mdid', self.panel, 'earnings ~ treat', xformla='~ age', **self.kwargs)
+        self.assertEqual([p.column for p in raised.exception.problems], ['earnings', 'age'])
+        with self.assertRaises(DataValidationError) as raised:
+            validate_data('cic', pd.concat([self.panel, self.panel.tail(2)]), 're ~ treat', **self.kwargs)
+        self.assertEqual(raised.exception.checks(), ['duplicate_id'])
+        with self.assertRaises(DataValidationError) as raised:
+            validate_data('qte', self.panel.assign(treat=self.panel['treat'] * 2), 're ~ treat')
+        self.assertEqual(raised.exception.checks(), ['dtype', 'empty_group'])
+
+    def test_r_formula_syntax(self):
+        self.assertEqual(r_variables('~ age + I(age^2) + log(income) + poly(`years in school`, 2) + x:T'),
+                         ['age', 'income', 'years in school', 'x'])
+        self.assertEqual(r_variables('~ factor(region) * exp(1.5e-3 * age) + offset(w)'), ['region', 'age', 'w'])
+        data = self.panel.assign(age=np.arange(len(self.panel)) % 40 + 20.0)
+        validate_data('cic', data, 're ~ treat', xformla='~ age + I(age^2)', engine='r', **self.kwargs)
+        with self.assertRaises(ValueError):
+            validate_data('cic', data, 're ~ treat', xformla='~ age + I(age^2)', **self.kwargs)
+        with self.assertRaises(DataValidationError) as raised:
+            validate_data('cic', data, 're ~ treat', xformla='~ age + log(income)', engine='r', **self.kwargs)
+        self.assertEqual([p.column for p in raised.exception.problems], ['income'])
+
+    @unittest.skipUnless(r_available(), "R and the qte package are not installed")
+    def test_r_engine_accepts_r_formulas(self):
+        data = synthetic_data(300, seed=2)['cross']
+        est = QTETEstimator('re78 ~ treat', data, probs=[0.25, 0.5, 0.75], se=False, xformla='~ age + I(age^2)',
+                            engine='r')
+        est.fit()
+        self.assertEqual(len(est.info['qte']), 3)
+
+    def test_estimators_validate_before_fitting(self):
+        est = CiCEstimator('re ~ treat', self.panel, t=1979, tmin1=1975, tname='year', engine='native')
+        with self.assertRaises(DataValidationError):
+            est.fit()
+        self.assertIsNone(est._problem)
+        self.assertIsInstance(DataValidationError('cic', []), ValueError)
+
+if __name__ == '__main__':
+    unittest.main()